@@ -2,9 +2,11 @@ from langchain_community.tools import DuckDuckGoSearchRun
 from langchain.agents import initialize_agent, AgentType
 from langchain_groq import ChatGroq
 import config
+from metrics import span, timed
 import json
 import random
 import re
+import threading
 
 class AIServices:
     def __init__(self):
@@ -25,6 +27,11 @@ class AIServices:
             raise Exception("Groq API key is required. Please set GROQ_API_KEY in your environment.")
         
         self.llm = self.groq_llm
+        self.model_name = "llama3-8b-8192"
+        
+        # Token usage across all LLM calls made through _invoke
+        self.usage = {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+        self._usage_lock = threading.Lock()
         
         self.search_tool = DuckDuckGoSearchRun()
         self.agent = initialize_agent(
@@ -56,12 +63,38 @@ class AIServices:
                 groq_api_key=config.GROQ_API_KEY
             )
             self.llm = self.groq_llm
+            self.model_name = model_name
             print(f"Switched to Groq model: {model_name}")
             return True
         except Exception as e:
             print(f"Failed to switch to {model_name}: {e}")
             return False
 
+    def _invoke(self, prompt):
+        """Call the LLM and add the response's token counts to self.usage"""
+        with span("llm.invoke", model=self.model_name) as record:
+            response = self.llm.invoke(prompt)
+            usage = getattr(response, "usage_metadata", None) or {}
+            if not usage:
+                token_usage = (getattr(response, "response_metadata", None) or {}).get("token_usage", {})
+                usage = {
+                    "input_tokens": token_usage.get("prompt_tokens", 0),
+                    "output_tokens": token_usage.get("completion_tokens", 0)
+                }
+            record["input_tokens"] = usage.get("input_tokens", 0) or 0
+            record["output_tokens"] = usage.get("output_tokens", 0) or 0
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["input_tokens"] += usage.get("input_tokens", 0) or 0
+            self.usage["output_tokens"] += usage.get("output_tokens", 0) or 0
+        return response
+
+    def usage_snapshot(self):
+        """Copy of the token usage counters, e.g. to diff around a batch"""
+        with self._usage_lock:
+            return dict(self.usage)
+
+    @timed("llm")
     def chunk_text(self, text, max_chunk_size=3000):
         """Split text into chunks that fit within Groq's token limits"""
         # More conservative estimation: 1 token ≈ 3 characters for safety
@@ -106,6 +139,7 @@ class AIServices:
         
         return final_chunks
 
+    @timed("llm")
     def generate_summary(self, transcript):
         """Generate a structured, blog-style summary from transcript using Groq with chunking"""
         try:
@@ -149,7 +183,7 @@ class AIServices:
             """
 
             if len(chunks) == 1:
-                response = self.llm.invoke(summary_prompt)
+                response = self._invoke(summary_prompt)
                 return response.content
             else:
                 # If chunking is needed, process chunks and then combine
@@ -160,7 +194,7 @@ class AIServices:
                     {chunk}
                     Focus on main ideas, key points, and examples.
                     """
-                    response = self.llm.invoke(chunk_prompt)
+                    response = self._invoke(chunk_prompt)
                     chunk_summaries.append(response.content)
                 
                 combined_summary = "\n\n".join(chunk_summaries)
@@ -174,7 +208,7 @@ class AIServices:
                 Use the same structured format as requested before (Overview, Topics with Key Points/Examples, Conclusion).
                 """
                 
-                response = self.llm.invoke(final_prompt)
+                response = self._invoke(final_prompt)
                 return response.content
             
         except Exception as e:
@@ -235,7 +269,7 @@ class AIServices:
                 }}
                 """
             
-            response = self.llm.invoke(prompt)
+            response = self._invoke(prompt)
             
             # Try to parse JSON response
             try:
@@ -294,7 +328,7 @@ class AIServices:
                 Return topics, one per line.
                 """
             
-            response = self.llm.invoke(prompt)
+            response = self._invoke(prompt)
             topics = [topic.strip() for topic in response.content.split('\n') if topic.strip()]
             return topics[:8]  # Limit to 8 topics
             
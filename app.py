@@ -1,13 +1,8 @@
 import streamlit as st
 import os
 from datetime import datetime
-from database import Database
-from s3_storage import S3Storage
-from transcription import TranscriptionService
-from ai_services import AIServices
-
-# Import PyTorch compatibility fix
-import utils
+from pipeline import VIDEO_STATUS_LABELS
+from services import get_services
 
 # Page configuration
 st.set_page_config(
@@ -17,17 +12,8 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize services
-@st.cache_resource
-def init_services():
-    return {
-        'db': Database(),
-        's3': S3Storage(),
-        'transcription': TranscriptionService(),
-        'ai': AIServices()
-    }
-
-services = init_services()
+# Shared services, built on first use
+services = get_services()
 
 # Main page
 def main():
@@ -54,21 +40,21 @@ def main():
     st.markdown("---")
     
     # Quick stats
+    stats = None
     try:
-        videos = services['db'].get_all_videos()
+        stats = services['db'].get_dashboard_stats()
         st.subheader("📊 Quick Stats")
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("Total Videos", len(videos))
+            st.metric("Total Videos", stats['total_videos'])
         
         with col2:
-            processed_videos = len([v for v in videos if v.get('status') == 'processed'])
-            st.metric("Processed Videos", processed_videos)
+            st.metric("Processed Videos", stats['processed_videos'])
         
         with col3:
-            if videos:
-                latest_video = videos[0]
+            if stats['latest_videos']:
+                latest_video = stats['latest_videos'][0]
                 st.metric("Latest Upload", latest_video['title'][:20] + "...")
             else:
                 st.metric("Latest Upload", "None")
@@ -93,11 +79,11 @@ def main():
     
     # Recent videos
     try:
-        if videos:
+        if stats and stats['latest_videos']:
             st.markdown("---")
             st.subheader("📺 Recent Videos")
             
-            for i, video in enumerate(videos[:3]):
+            for i, video in enumerate(stats['latest_videos']):
                 with st.container():
                     col1, col2, col3 = st.columns([3, 2, 1])
                     
@@ -107,7 +93,8 @@ def main():
                     
                     with col2:
                         status_color = "🟢" if video.get('status') == 'processed' else "🟡"
-                        st.write(f"{status_color} {video.get('status', 'uploaded').title()}")
+                        status = video.get('status', 'uploaded')
+                        st.write(f"{status_color} {VIDEO_STATUS_LABELS.get(status, status.title())}")
                     
                     with col3:
                         if st.button(f"Play", key=f"play_{i}"):
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Cold-start time of each Streamlit page
+
+Usage:
+    python benchmarks/cold_start.py [--pages app.py pages/play_video.py] [--ref HEAD~1]
+
+Each page runs once with Streamlit's AppTest, in a fresh interpreter, against
+the same local stand-ins as the ingestion benchmark: SQLite, moto S3 and a
+dummy Groq key. The first run of a page in a new server process pays for
+everything the page imports and every service it constructs. The report
+shows that time, the peak RSS, and which heavy libraries the page loaded.
+The play page is opened on a seeded video with a transcript.
+
+With --ref, the same measurement is also run on another git revision (checked
+out into a temporary worktree), to compare before and after a change.
+
+boto3 is loaded by the S3 stand-in before the page runs, so its import time
+is not included. Install the extra tools with
+`pip install -r benchmarks/requirements.txt`.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCHMARKS = os.path.join(ROOT, "benchmarks")
+
+DEFAULT_PAGES = ["app.py", "pages/videos_list.py", "pages/play_video.py", "pages/admin_metrics.py"]
+HEAVY_MODULES = ["torch", "whisper", "moviepy", "langchain", "langchain_groq", "pymongo", "numpy", "pandas"]
+
+
+def seed(tree):
+    """Store one video with a transcript in the SQLite database; prints its id"""
+    sys.path.insert(0, tree)
+    from database import create_database
+    import transcript
+
+    db = create_database()
+    video_id = db.save_video("Cold start", "cold_start.mp4", "s3://cold_start.mp4", duration=3600)
+    db.save_transcript(video_id, transcript.synthetic_transcript(900))
+    db.update_video_status(video_id, "processed")
+    print(video_id)
+
+
+def measure(tree, page, video_id):
+    """Run one page for the first time in this interpreter; prints a JSON result"""
+    import stand_ins
+
+    with stand_ins.mock_s3():
+        stand_ins.create_bucket()
+        from streamlit.testing.v1 import AppTest
+
+        sys.path.insert(0, tree)
+        os.chdir(tree)
+        before = set(sys.modules)
+        app = AppTest.from_file(os.path.join(tree, page), default_timeout=300)
+        app.session_state["selected_video_id"] = video_id
+        start = time.perf_counter()
+        app.run()
+        seconds = time.perf_counter() - start
+
+    loaded = set(sys.modules) - before
+    print(json.dumps({
+        "seconds": seconds,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "heavy_modules": [m for m in HEAVY_MODULES if m in loaded],
+        "errors": [e.value for e in app.exception],
+    }))
+
+
+def _child(mode, tree, work_dir, *args):
+    env = dict(os.environ, PYTHONPATH=BENCHMARKS)
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), f"--{mode}", tree, work_dir, *args],
+        capture_output=True, text=True, env=env, cwd=tree
+    )
+    if result.returncode != 0:
+        raise Exception(f"Cold start {mode} failed in {tree}: {result.stderr.strip()[-2000:]}")
+    return result.stdout.strip().splitlines()[-1]
+
+
+def run_tree(tree, pages):
+    """Cold-start every page of one source tree, each in a fresh interpreter"""
+    results = {}
+    for page in pages:
+        work_dir = tempfile.mkdtemp(prefix="cold_start_")
+        try:
+            video_id = _child("seed", tree, work_dir)
+            results[page] = json.loads(_child("measure", tree, work_dir, page, video_id))
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return results
+
+
+def run_ref(ref, pages):
+    """Cold-start the pages of another git revision from a temporary worktree"""
+    tree = tempfile.mkdtemp(prefix="cold_start_ref_")
+    subprocess.run(["git", "worktree", "add", "--detach", tree, ref], cwd=ROOT, check=True, capture_output=True)
+    try:
+        # Seeding needs the current transcript helpers
+        if not os.path.exists(os.path.join(tree, "transcript.py")):
+            shutil.copy(os.path.join(ROOT, "transcript.py"), tree)
+        return run_tree(tree, pages)
+    finally:
+        subprocess.run(["git", "worktree", "remove", "--force", tree], cwd=ROOT, capture_output=True)
+
+
+def print_results(current, reference=None, ref=None):
+    if reference:
+        print(f"{'page':<26} {ref + ' s':>12} {'now s':>9} {ref + ' RSS':>12} {'now RSS':>9}  heavy modules now")
+    else:
+        print(f"{'page':<26} {'seconds':>9} {'RSS MB':>9}  heavy modules")
+    for page, r in current.items():
+        modules = ", ".join(r["heavy_modules"]) or "-"
+        if reference and page in reference:
+            b = reference[page]
+            print(f"{page:<26} {b['seconds']:>12.2f} {r['seconds']:>9.2f} {b['peak_rss_mb']:>12.0f} "
+                  f"{r['peak_rss_mb']:>9.0f}  {modules}")
+        else:
+            print(f"{page:<26} {r['seconds']:>9.2f} {r['peak_rss_mb']:>9.0f}  {modules}")
+        for error in r["errors"]:
+            print(f"    ⚠️ {error}")
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ("--seed", "--measure"):
+        tree, work_dir = sys.argv[2], sys.argv[3]
+        import stand_ins
+        stand_ins.configure_environment(work_dir, db="sqlite", renditions=False)
+        if sys.argv[1] == "--seed":
+            seed(tree)
+        else:
+            measure(tree, sys.argv[4], sys.argv[5])
+        return
+
+    parser = argparse.ArgumentParser(description="Measure the cold-start time of each Streamlit page")
+    parser.add_argument("--pages", nargs="+", default=DEFAULT_PAGES)
+    parser.add_argument("--ref", help="Also measure this git revision, e.g. the commit before a change")
+    args = parser.parse_args()
+
+    reference = None
+    if args.ref:
+        print(f"⏱️ Measuring {args.ref}...")
+        reference = run_ref(args.ref, args.pages)
+    print("⏱️ Measuring the working tree...")
+    current = run_tree(ROOT, args.pages)
+    print_results(current, reference, args.ref)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Synthetic media for the ingestion benchmarks
+
+Videos are generated with ffmpeg's lavfi sources (a test pattern plus a sine
+tone), so no media has to be checked in. For a more realistic transcription
+load, a recorded speech clip can be looped to each duration instead of the
+tone. Generated files are cached by duration and source.
+"""
+
+import hashlib
+import os
+import subprocess
+
+DEFAULT_DURATIONS = (10, 60, 300)
+
+
+def _ffmpeg(args, what):
+    result = subprocess.run(["ffmpeg", "-loglevel", "error", "-y", *args], capture_output=True)
+    if result.returncode != 0:
+        raise Exception(f"Error {what}: {result.stderr.decode(errors='replace').strip()}")
+
+
+def synthetic_video(duration, media_dir, height=360, speech_clip=None):
+    """Path of an H.264/AAC MP4 of the given duration, generating it if needed
+
+    The audio track is a 440 Hz tone, or speech_clip looped to the duration.
+    """
+    os.makedirs(media_dir, exist_ok=True)
+    if speech_clip:
+        with open(speech_clip, "rb") as f:
+            source = "speech_" + hashlib.sha256(f.read()).hexdigest()[:12]
+    else:
+        source = "tone"
+    path = os.path.join(media_dir, f"{source}_{duration}s_{height}p.mp4")
+    if os.path.exists(path):
+        return path
+
+    width = height * 16 // 9 // 2 * 2
+    video_input = ["-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate=25:duration={duration}"]
+    if speech_clip:
+        audio_input = ["-stream_loop", "-1", "-i", speech_clip]
+    else:
+        audio_input = ["-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=44100:duration={duration}"]
+
+    # Write then rename, so an interrupted run never leaves a truncated fixture behind
+    tmp_path = path + ".tmp.mp4"
+    _ffmpeg([
+        *video_input, *audio_input,
+        "-map", "0:v:0", "-map", "1:a:0", "-t", str(duration),
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-c:a", "aac", "-b:a", "128k",
+        tmp_path
+    ], f"generating {duration}s benchmark video")
+    os.replace(tmp_path, path)
+    return path
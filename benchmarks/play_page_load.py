@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Play page data load: one joined query against separate lookups
+
+Usage:
+    python benchmarks/play_page_load.py [--db sqlite|mongo] [--videos 200]
+        [--segments 900] [--loads 500] [--round-trip-ms 0 1 5]
+
+Seeds a library of videos with transcripts and summaries, then loads random
+videos the way the play page does: get_video_with_content() (current), and
+get_video_by_id() + get_transcript() + get_summary() (before). The read
+cache is bypassed, so every load reaches the database.
+
+Local backends answer in microseconds, so --round-trip-ms adds a fixed
+delay per database call to show the effect of a networked MongoDB, where
+each call is one round trip. --db mongo measures a real server at MONGO_URI
+(in a throwaway database); mongomock cannot run the $lookup join.
+"""
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import stand_ins  # noqa: E402
+
+
+def seed(db, videos, segments):
+    """Store videos with a transcript and a summary each; returns their ids"""
+    import transcript
+
+    text = transcript.synthetic_transcript(segments)
+    video_ids = []
+    for i in range(videos):
+        video_id = db.save_video(f"Lecture {i}", f"lecture_{i}.mp4", f"s3://lecture_{i}.mp4", duration=segments * 4)
+        db.save_transcript(video_id, text)
+        db.save_summary(video_id, f"# Summary of lecture {i}\n\n" + "A key point of the lecture. " * 40)
+        db.update_video_status(video_id, "processed")
+        video_ids.append(video_id)
+    return video_ids
+
+
+def _separate(db, video_id):
+    video = db.get_video_by_id(video_id)
+    video["transcript_doc"] = db.get_transcript(video_id)
+    video["summary_doc"] = db.get_summary(video_id)
+    return video
+
+
+def _joined(db, video_id):
+    return db.get_video_with_content(video_id)
+
+
+def time_loads(db, video_ids, load, loads, round_trip):
+    """Per-load milliseconds for `loads` random videos"""
+    calls = [0]
+
+    class _RoundTrips:
+        def __getattr__(self, name):
+            method = getattr(db, name)
+
+            def call(*args, **kwargs):
+                calls[0] += 1
+                if round_trip:
+                    time.sleep(round_trip)
+                return method(*args, **kwargs)
+            return call
+
+    proxy = _RoundTrips()
+    rng = random.Random(0)
+    samples = []
+    for _ in range(loads):
+        video_id = rng.choice(video_ids)
+        start = time.perf_counter()
+        load(proxy, video_id)
+        samples.append((time.perf_counter() - start) * 1000)
+    return sorted(samples), calls[0] / loads
+
+
+def _quantile(values, q):
+    return values[min(int(q * len(values)), len(values) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the play page's database load")
+    parser.add_argument("--db", choices=["sqlite", "mongo"], default="sqlite")
+    parser.add_argument("--videos", type=int, default=200)
+    parser.add_argument("--segments", type=int, default=900, help="Transcript segments per video")
+    parser.add_argument("--loads", type=int, default=500)
+    parser.add_argument("--round-trip-ms", type=float, nargs="+", default=[0, 1, 5])
+    args = parser.parse_args()
+
+    work_dir = tempfile.mkdtemp(prefix="play_page_load_")
+    db = None
+    stand_ins.configure_environment(work_dir, renditions=False)
+    os.environ["METRICS_PATH"] = ""
+    if args.db == "mongo":
+        os.environ.update({"DATABASE_BACKEND": "mongo", "MONGO_DB": f"play_page_load_{os.getpid()}"})
+    try:
+        from database import create_database
+
+        db = create_database()
+        print(f"🌱 Seeding {args.videos} videos with {args.segments}-segment transcripts ({args.db})...")
+        video_ids = seed(db, args.videos, args.segments)
+
+        print(f"{'round trip':>11} {'method':<22} {'calls':>6} {'p50 ms':>9} {'p95 ms':>9}")
+        for round_trip_ms in args.round_trip_ms:
+            for method, load in (("3 lookups (before)", _separate), ("joined (now)", _joined)):
+                samples, calls = time_loads(db, video_ids, load, args.loads, round_trip_ms / 1000)
+                print(f"{round_trip_ms:>9.1f}ms {method:<22} {calls:>6.0f} "
+                      f"{_quantile(samples, 0.5):>9.2f} {_quantile(samples, 0.95):>9.2f}")
+    finally:
+        if args.db == "mongo" and getattr(db, "client", None):
+            db.client.drop_database(os.environ["MONGO_DB"])
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+End-to-end ingestion benchmark
+
+Usage:
+    python benchmarks/run_ingestion.py [--durations 10 60 300] [--db sqlite|mongomock]
+        [--whisper real|fake] [--no-renditions] [--speech-clip clip.wav]
+        [--baseline benchmarks/baseline.json] [--save-baseline] [--tolerance 0.2]
+
+Each synthetic video follows the same path as an upload from the videos list
+page. It is spooled, enqueued as an "ingest" job, claimed and run by
+worker.process_job. Storage is local: SQLite or mongomock, moto S3 and a
+fake LLM. Every case runs in a fresh process, so peak RSS is measured per
+video.
+
+Recorded per case:
+- wall time and its real-time factor (seconds per second of video)
+- peak RSS of the process and its ffmpeg children
+- block I/O
+- seconds and real-time factor per pipeline span (see metrics.py)
+
+Results are compared with the baseline file. A metric more than --tolerance
+above its baseline is reported as a regression, and the exit status is 1.
+Install the extra tools with `pip install -r benchmarks/requirements.txt`.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from fixtures import DEFAULT_DURATIONS, synthetic_video  # noqa: E402
+import stand_ins  # noqa: E402
+
+DEFAULT_BASELINE = os.path.join(ROOT, "benchmarks", "baseline.json")
+DEFAULT_MEDIA_DIR = os.path.join(ROOT, "benchmarks", ".media")
+
+# Spans shorter than this are too noisy to compare against a baseline
+MIN_COMPARED_SECONDS = 0.05
+
+
+def _usage():
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return {
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": max(own.ru_maxrss, children.ru_maxrss) / 1024,
+        # Block counts are in 512-byte units
+        "read_mb": (own.ru_inblock + children.ru_inblock) * 512 / 1024 / 1024,
+        "write_mb": (own.ru_oublock + children.ru_oublock) * 512 / 1024 / 1024,
+    }
+
+
+def run_case(video_path, duration, options):
+    """Ingest one video against local stand-ins; runs in its own process"""
+    work_dir = tempfile.mkdtemp(prefix="ingest_benchmark_")
+    stand_ins.configure_environment(work_dir, db=options["db"], renditions=options["renditions"])
+    if options["db"] == "mongomock":
+        stand_ins.use_mongomock()
+
+    try:
+        with stand_ins.mock_s3():
+            stand_ins.create_bucket()
+
+            import metrics
+            from database import create_database
+            from job_queue import create_job_queue
+            from pipeline import IngestionPipeline
+            from s3_storage import S3Storage
+            from transcode import TranscodeService
+            from transcription import TranscriptionService
+            from worker import process_job
+
+            transcription = TranscriptionService()
+            if options["whisper"] == "fake":
+                transcription.model = stand_ins.FakeWhisperModel(transcription)
+            else:
+                # Model loading is a one-off per worker, not part of ingesting a video
+                transcription._load_model()
+
+            db = create_database()
+            services = {
+                'db': db,
+                's3': S3Storage(),
+                'transcription': transcription,
+                'transcode': TranscodeService(),
+                'ai': stand_ins.FakeAI(call_latency=options["llm_latency"])
+            }
+            queue = create_job_queue(db)
+            pipeline = IngestionPipeline(services)
+
+            before = _usage()
+            start = time.perf_counter()
+
+            # Spool and enqueue as the upload form does, then run the job as a worker would
+            os.makedirs(os.environ["UPLOAD_SPOOL_DIR"], exist_ok=True)
+            spool_path = os.path.join(os.environ["UPLOAD_SPOOL_DIR"], os.path.basename(video_path))
+            shutil.copyfile(video_path, spool_path)
+            queue.enqueue("ingest", {
+                "title": f"Benchmark {duration}s",
+                "spool_path": spool_path,
+                "original_name": os.path.basename(video_path),
+                "digest": S3Storage.hash_file(spool_path)
+            })
+            job = queue.claim("benchmark")
+            process_job(queue, pipeline, job, "benchmark")
+
+            wall = time.perf_counter() - start
+            after = _usage()
+
+            finished = queue.list_jobs(limit=1)[0]
+            if finished["status"] != "done":
+                raise Exception(f"Ingestion failed: {finished.get('error')}")
+
+            spans = {
+                name: {"seconds": s["total_seconds"], "rtf": s["total_seconds"] / duration, "count": s["count"]}
+                for name, s in metrics.summarize(metrics.load_records()).items()
+            }
+            return {
+                "duration": duration,
+                "wall_seconds": wall,
+                "rtf": wall / duration,
+                "peak_rss_mb": after["peak_rss_mb"],
+                "read_mb": after["read_mb"] - before["read_mb"],
+                "write_mb": after["write_mb"] - before["write_mb"],
+                "spans": spans,
+            }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def _case_process(video_path, duration, options, results):
+    try:
+        results.put(("ok", run_case(video_path, duration, options)))
+    except Exception as e:
+        results.put(("error", str(e)))
+
+
+def run_isolated(video_path, duration, options):
+    """Run a case in a fresh interpreter so its peak RSS is its own"""
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_case_process, args=(video_path, duration, options, results))
+    process.start()
+    status, value = results.get()
+    process.join()
+    if status != "ok":
+        raise Exception(value)
+    return value
+
+
+def compare(results, baseline, tolerance):
+    """List regressions of results against baseline as (case, metric, base, now)"""
+    regressions = []
+    for case, result in results.items():
+        base = baseline.get(case)
+        if not base:
+            continue
+        checks = {metric: (base.get(metric), result[metric])
+                  for metric in ("wall_seconds", "peak_rss_mb", "write_mb")}
+        for name, span in result["spans"].items():
+            base_span = base.get("spans", {}).get(name)
+            if base_span and base_span["seconds"] >= MIN_COMPARED_SECONDS:
+                checks[f"span {name}"] = (base_span["seconds"], span["seconds"])
+        for metric, (before, now) in checks.items():
+            if before and now > before * (1 + tolerance):
+                regressions.append((case, metric, before, now))
+    return regressions
+
+
+def print_results(results):
+    print(f"{'case':<8} {'wall s':>9} {'RTF':>7} {'peak RSS MB':>12} {'read MB':>9} {'write MB':>9}")
+    for case, r in results.items():
+        print(f"{case:<8} {r['wall_seconds']:>9.2f} {r['rtf']:>7.3f} {r['peak_rss_mb']:>12.1f} "
+              f"{r['read_mb']:>9.1f} {r['write_mb']:>9.1f}")
+        stages = {name: s for name, s in r["spans"].items() if name.startswith("pipeline.")}
+        for name, s in sorted(stages.items(), key=lambda item: -item[1]["seconds"]):
+            print(f"    {name:<32} {s['seconds']:>8.2f}s  RTF {s['rtf']:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark end-to-end video ingestion")
+    parser.add_argument("--durations", type=int, nargs="+", default=list(DEFAULT_DURATIONS),
+                        help="Synthetic video lengths in seconds")
+    parser.add_argument("--db", choices=["sqlite", "mongomock"], default="sqlite")
+    parser.add_argument("--whisper", choices=["real", "fake"], default="real",
+                        help="'fake' decodes audio but skips the Whisper model")
+    parser.add_argument("--no-renditions", dest="renditions", action="store_false")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="Seconds per fake LLM call")
+    parser.add_argument("--speech-clip", help="Audio file looped as the soundtrack instead of a tone")
+    parser.add_argument("--media-dir", default=DEFAULT_MEDIA_DIR)
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown before flagging (0.2 = 20%%)")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    options = {"db": args.db, "whisper": args.whisper, "renditions": args.renditions,
+               "llm_latency": args.llm_latency}
+    results = {}
+    for duration in args.durations:
+        video_path = synthetic_video(duration, args.media_dir, speech_clip=args.speech_clip)
+        print(f"🎬 Benchmarking {duration}s video...")
+        results[f"{duration}s"] = run_isolated(video_path, duration, options)
+
+    print_results(results)
+    document = {"options": options, "cases": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"💾 Baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        print("ℹ️ No baseline yet; run with --save-baseline to create one")
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("options") != options:
+        print(f"⚠️  Baseline was recorded with different options: {baseline.get('options')}")
+
+    regressions = compare(results, baseline["cases"], args.tolerance)
+    if not regressions:
+        print(f"✅ No regressions beyond {args.tolerance:.0%} of the baseline")
+        return
+    for case, metric, before, now in regressions:
+        print(f"❌ {case} {metric}: {before:.2f} → {now:.2f} (+{(now / before - 1):.0%})")
+    sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,119 @@
+"""
+Local stand-ins for the external services used during ingestion
+
+- S3 is served in-process by moto.
+- MongoDB can be replaced by mongomock; the default is the SQLite backend.
+- The Groq LLM is replaced by FakeAI.
+- Whisper can optionally be replaced by FakeWhisperModel, which still decodes
+  the audio with ffmpeg but skips the model.
+
+configure_environment() must run before any application module is imported,
+because config reads its settings at import time.
+"""
+
+import os
+import threading
+import time
+
+BENCHMARK_BUCKET = "video-transcriber-benchmark"
+
+
+def configure_environment(work_dir, db="sqlite", renditions=True):
+    """Point the application config at local, disposable resources"""
+    os.environ.update({
+        "DATABASE_BACKEND": "mongo" if db == "mongomock" else "sqlite",
+        "SQLITE_PATH": os.path.join(work_dir, "benchmark.db"),
+        "MONGO_DB": "video_transcriber_benchmark",
+        "AWS_ACCESS_KEY_ID": "testing",
+        "AWS_SECRET_ACCESS_KEY": "testing",
+        "AWS_REGION": "us-east-1",
+        "S3_BUCKET_NAME": BENCHMARK_BUCKET,
+        "GROQ_API_KEY": "benchmark",
+        "UPLOAD_SPOOL_DIR": os.path.join(work_dir, "spool"),
+        "METRICS_PATH": os.path.join(work_dir, "metrics.jsonl"),
+        "ENABLE_RENDITIONS": "true" if renditions else "false",
+        "EMBEDDED_WORKERS": "0",
+    })
+
+
+def mock_s3():
+    """moto's in-process S3 as a context manager"""
+    try:
+        from moto import mock_aws  # moto >= 5
+        return mock_aws()
+    except ImportError:
+        from moto import mock_s3 as _mock_s3
+        return _mock_s3()
+
+
+def create_bucket():
+    import boto3
+    boto3.client("s3", region_name="us-east-1").create_bucket(Bucket=BENCHMARK_BUCKET)
+
+
+def use_mongomock():
+    """Route pymongo.MongoClient (and GridFS) to mongomock"""
+    import mongomock
+    import mongomock.gridfs
+    import pymongo
+    mongomock.gridfs.enable_gridfs_integration()
+    pymongo.MongoClient = mongomock.MongoClient
+
+
+class FakeAI:
+    """Stands in for AIServices in the ingestion pipeline
+
+    Sleeps for a fixed per-call latency plus a per-character cost, so summary
+    time scales with transcript length the way a hosted model does.
+    """
+
+    def __init__(self, call_latency=0.5, seconds_per_1k_chars=0.05):
+        self.model_name = "fake-llm"
+        self.call_latency = call_latency
+        self.seconds_per_1k_chars = seconds_per_1k_chars
+        self.usage = {"calls": 0, "input_tokens": 0, "output_tokens": 0}
+        self._usage_lock = threading.Lock()
+
+    def generate_summary(self, transcript):
+        time.sleep(self.call_latency + len(transcript) / 1000 * self.seconds_per_1k_chars)
+        summary = f"# Benchmark Summary\n\n## 🚀 Overview\nTranscript of {len(transcript)} characters.\n"
+        with self._usage_lock:
+            self.usage["calls"] += 1
+            self.usage["input_tokens"] += len(transcript) // 3
+            self.usage["output_tokens"] += len(summary) // 3
+        return summary
+
+    def usage_snapshot(self):
+        with self._usage_lock:
+            return dict(self.usage)
+
+
+class FakeWhisperModel:
+    """Whisper model stand-in: decodes the audio like Whisper does, then emits fixed segments"""
+
+    SEGMENT_SECONDS = 5
+
+    def __init__(self, transcription):
+        self.transcription = transcription
+
+    def transcribe(self, audio, word_timestamps=False, initial_prompt=None):
+        if isinstance(audio, str):
+            audio = self.transcription.decode_audio_url(audio)
+        from transcription import SAMPLE_RATE
+        duration = len(audio) / SAMPLE_RATE
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(start + self.SEGMENT_SECONDS, duration)
+            segment = {"start": start, "end": end, "text": f" Benchmark segment {len(segments) + 1}."}
+            if word_timestamps:
+                # Words spread evenly over the segment, as Whisper reports them
+                words = segment["text"].split()
+                step = (end - start) / len(words)
+                segment["words"] = [
+                    {"word": f" {word}", "start": start + i * step, "end": start + (i + 1) * step}
+                    for i, word in enumerate(words)
+                ]
+            segments.append(segment)
+            start = end
+        return {"segments": segments}
@@ -0,0 +1,195 @@
+"""
+In-process caching for the Video Transcriber application
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import config
+
+
+class TTLCache:
+    """Thread-safe LRU cache whose entries also expire after a fixed TTL"""
+
+    def __init__(self, maxsize=256, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, default=None):
+        """Return the cached value for key, or default if missing or expired"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            value, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        """Store value under key, evicting the least recently used entry if full"""
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and time.monotonic() < entry[1]
+
+    def stats(self):
+        """Get hit, miss and eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+
+class CachedDatabase:
+    """Read-through cache in front of Database
+
+    Writes made through the cache drop the affected entries at once. Workers and
+    batch tools write from other processes, so every entry also remembers the
+    video's revision when it was read, and is only served while the stored
+    revision still matches. Checking costs one primary-key lookup, far less than
+    the joined, decompressed reads it saves.
+    """
+
+    # Which cached reads each write makes stale for the affected video
+    INVALIDATES = {
+        "save_transcript": ("get_transcript", "get_video_with_content"),
+        "replace_transcript": ("get_transcript", "get_video_with_content"),
+        "save_summary": ("get_summary", "get_video_with_content"),
+        "save_mcq": ("get_mcqs",),
+        "update_video_status": ("get_video_by_id", "get_video_with_content"),
+        "set_audio_key": ("get_video_by_id", "get_video_with_content"),
+        "set_renditions": ("get_video_by_id", "get_video_with_content"),
+    }
+
+    def __init__(self, db, maxsize=None, ttl=None):
+        self.db = db
+        self.cache = TTLCache(
+            maxsize=maxsize or config.DB_CACHE_MAXSIZE,
+            ttl=ttl or config.DB_CACHE_TTL
+        )
+
+    def _cached_read(self, method, video_id, *args, **kwargs):
+        # Projections change the shape of the result, so they bypass the cache
+        if args or kwargs:
+            return getattr(self.db, method)(video_id, *args, **kwargs)
+
+        revision = self.db.get_video_revision(video_id)
+        if revision is None:
+            # No such video (or no database): nothing worth caching
+            return getattr(self.db, method)(video_id)
+
+        key = (method, str(video_id))
+        entry = self.cache.get(key)
+        if entry is not None and entry[0] == revision:
+            return entry[1]
+        value = getattr(self.db, method)(video_id)
+        if value is not None:
+            self.cache.set(key, (revision, value))
+        return value
+
+    def _invalidate(self, write, video_id):
+        for method in self.INVALIDATES[write]:
+            self.cache.delete((method, str(video_id)))
+
+    def get_video_by_id(self, video_id):
+        """Get video by ID"""
+        return self._cached_read("get_video_by_id", video_id)
+
+    def get_video_with_content(self, video_id, *args, **kwargs):
+        """Get a video joined with its transcript and summary"""
+        return self._cached_read("get_video_with_content", video_id, *args, **kwargs)
+
+    def get_transcript(self, video_id):
+        """Get transcript for a video"""
+        return self._cached_read("get_transcript", video_id)
+
+    def get_summary(self, video_id):
+        """Get summary for a video"""
+        return self._cached_read("get_summary", video_id)
+
+    def get_mcqs(self, video_id):
+        """Get all MCQs for a video"""
+        return self._cached_read("get_mcqs", video_id)
+
+    def save_transcript(self, video_id, transcript_data):
+        """Save transcript and drop cached reads that include it"""
+        result = self.db.save_transcript(video_id, transcript_data)
+        self._invalidate("save_transcript", video_id)
+        return result
+
+    def replace_transcript(self, video_id, transcript_data):
+        """Replace transcript and drop cached reads that include it"""
+        result = self.db.replace_transcript(video_id, transcript_data)
+        self._invalidate("replace_transcript", video_id)
+        return result
+
+    def save_summary(self, video_id, summary_data, model=None, label=None):
+        """Save summary and drop cached reads that include it"""
+        result = self.db.save_summary(video_id, summary_data, model=model, label=label)
+        self._invalidate("save_summary", video_id)
+        return result
+
+    def save_mcq(self, video_id, question_data):
+        """Save MCQ and drop the cached MCQ list"""
+        result = self.db.save_mcq(video_id, question_data)
+        self._invalidate("save_mcq", video_id)
+        return result
+
+    def update_video_status(self, video_id, status, unless=()):
+        """Update status and drop cached reads of the video document"""
+        result = self.db.update_video_status(video_id, status, unless=unless)
+        self._invalidate("update_video_status", video_id)
+        return result
+
+    def set_audio_key(self, video_id, audio_key):
+        """Record the audio derivative and drop cached reads of the video document"""
+        result = self.db.set_audio_key(video_id, audio_key)
+        self._invalidate("set_audio_key", video_id)
+        return result
+
+    def set_renditions(self, video_id, renditions):
+        """Record renditions and drop cached reads of the video document"""
+        result = self.db.set_renditions(video_id, renditions)
+        self._invalidate("set_renditions", video_id)
+        return result
+
+    def cache_stats(self):
+        """Get hit, miss and eviction counters for the read cache"""
+        return self.cache.stats()
+
+    def __getattr__(self, name):
+        # Everything not cached goes straight to the wrapped Database
+        return getattr(self.db, name)
@@ -0,0 +1,159 @@
+"""
+Transparent compression for large text payloads (transcripts, summaries)
+
+Small payloads are stored inline as plain strings. Payloads above
+TRANSCRIPT_COMPRESS_THRESHOLD are stored as a compressed binary field, and
+compressed payloads above TRANSCRIPT_GRIDFS_THRESHOLD are spilled to GridFS
+so the owning document stays well under MongoDB's 16 MB limit.
+"""
+
+import time
+import zlib
+
+import config
+
+# zstd is optional; fall back to zlib when it is not installed
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def default_codec():
+    return "zstd" if zstandard is not None else "zlib"
+
+
+def compress(data, codec=None):
+    """Compress bytes with the given codec (zstd or zlib)"""
+    codec = codec or default_codec()
+    if codec == "zstd":
+        if zstandard is None:
+            raise Exception("zstandard is not installed; cannot use zstd compression")
+        return zstandard.ZstdCompressor(level=10).compress(data)
+    if codec == "zlib":
+        return zlib.compress(data, 6)
+    raise Exception(f"Unknown compression codec: {codec}")
+
+
+def decompress(data, codec):
+    """Decompress bytes produced by compress()"""
+    if codec == "zstd":
+        if zstandard is None:
+            raise Exception("zstandard is not installed; cannot read zstd-compressed data")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == "zlib":
+        return zlib.decompress(data)
+    raise Exception(f"Unknown compression codec: {codec}")
+
+
+def encode_field(field, text, fs=None):
+    """Build the document fields used to store text under field"""
+    raw = text.encode("utf-8")
+    if len(raw) < config.TRANSCRIPT_COMPRESS_THRESHOLD:
+        return {field: text}
+
+    codec = default_codec()
+    blob = compress(raw, codec)
+    encoded = {
+        f"{field}_codec": codec,
+        f"{field}_raw_size": len(raw),
+        f"{field}_stored_size": len(blob),
+    }
+    if fs is not None and len(blob) >= config.TRANSCRIPT_GRIDFS_THRESHOLD:
+        encoded[f"{field}_gridfs_id"] = fs.put(blob)
+    else:
+        encoded[f"{field}_blob"] = blob
+    return encoded
+
+
+class LazyDocument(dict):
+    """Document whose compressed text field is only decoded on first access"""
+
+    def __init__(self, doc, field, fs=None):
+        super().__init__(doc)
+        self._field = field
+        self._fs = fs
+
+    def _is_encoded(self):
+        return f"{self._field}_codec" in self and not dict.__contains__(self, self._field)
+
+    def _materialize(self):
+        if not self._is_encoded():
+            return
+        codec = dict.__getitem__(self, f"{self._field}_codec")
+        if f"{self._field}_gridfs_id" in self:
+            if self._fs is None:
+                raise Exception(f"'{self._field}' is stored in GridFS but no GridFS handle is available")
+            blob = self._fs.get(dict.__getitem__(self, f"{self._field}_gridfs_id")).read()
+        else:
+            blob = bytes(dict.__getitem__(self, f"{self._field}_blob"))
+        dict.__setitem__(self, self._field, decompress(blob, codec).decode("utf-8"))
+
+    def __getitem__(self, key):
+        if key == self._field:
+            self._materialize()
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        if key == self._field:
+            self._materialize()
+        return super().get(key, default)
+
+    def __contains__(self, key):
+        if key == self._field and self._is_encoded():
+            return True
+        return super().__contains__(key)
+
+
+def expand_projection(projection, field):
+    """Add the encoded companion fields of field to an inclusion projection"""
+    if not projection or not projection.get(field):
+        return projection
+    expanded = dict(projection)
+    for suffix in ("codec", "blob", "gridfs_id", "raw_size", "stored_size"):
+        expanded[f"{field}_{suffix}"] = 1
+    return expanded
+
+
+def wrap_document(doc, field, fs=None):
+    """Wrap a fetched document so its text field decodes lazily"""
+    if doc is None:
+        return None
+    return LazyDocument(doc, field, fs)
+
+
+def storage_report(text, repeat=5):
+    """Compare raw and compressed sizes and timings for text with each available codec"""
+    raw = text.encode("utf-8")
+    codecs = ["zlib"] + (["zstd"] if zstandard is not None else [])
+    report = {"raw_bytes": len(raw), "codecs": {}}
+
+    for codec in codecs:
+        start = time.perf_counter()
+        for _ in range(repeat):
+            blob = compress(raw, codec)
+        compress_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        start = time.perf_counter()
+        for _ in range(repeat):
+            decompress(blob, codec)
+        decompress_ms = (time.perf_counter() - start) * 1000 / repeat
+
+        report["codecs"][codec] = {
+            "stored_bytes": len(blob),
+            "ratio": len(raw) / len(blob) if blob else 0.0,
+            "compress_ms": compress_ms,
+            "decompress_ms": decompress_ms,
+        }
+    return report
+
+
+if __name__ == "__main__":
+    import json
+    import sys
+
+    if len(sys.argv) != 2:
+        print("Usage: python compression.py <transcript.txt>")
+        sys.exit(1)
+    with open(sys.argv[1], encoding="utf-8") as f:
+        print(json.dumps(storage_report(f.read()), indent=2))
@@ -21,6 +21,7 @@
 # SUPPORTED_VIDEO_FORMATS = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv'] 
 
 import os
+import tempfile
 
 # Try to import streamlit for cloud secrets; OK if not running under Streamlit
 try:
@@ -35,6 +36,10 @@ def _get(key: str, default=None):
         return _SECRETS[key]
     return os.getenv(key, default)
 
+# Database backend: "mongo" (default) or "sqlite" for single-node deployments
+DATABASE_BACKEND = _get("DATABASE_BACKEND", "mongo")
+SQLITE_PATH = _get("SQLITE_PATH", "video_transcriber.db")
+
 # MongoDB Configuration
 MONGO_URI = _get("MONGO_URI", "mongodb://localhost:27017/")
 MONGO_DB = _get("MONGO_DB", "video_transcriber")
@@ -44,13 +49,80 @@ AWS_ACCESS_KEY_ID = _get("AWS_ACCESS_KEY_ID")
 AWS_SECRET_ACCESS_KEY = _get("AWS_SECRET_ACCESS_KEY")
 AWS_REGION = _get("AWS_REGION", "us-east-1")
 S3_BUCKET_NAME = _get("S3_BUCKET_NAME")
+# Multipart upload tuning: part size in bytes and parallel part uploads
+S3_MULTIPART_PART_SIZE = int(_get("S3_MULTIPART_PART_SIZE", 16 * 1024 * 1024))
+S3_MAX_CONCURRENCY = int(_get("S3_MAX_CONCURRENCY", 8))
+# Presigned URL lifetime and how long before expiry a cached URL is replaced (seconds)
+S3_PRESIGN_EXPIRY = int(_get("S3_PRESIGN_EXPIRY", 3600))
+S3_PRESIGN_SAFETY_MARGIN = int(_get("S3_PRESIGN_SAFETY_MARGIN", 300))
+S3_PRESIGN_CACHE_SIZE = int(_get("S3_PRESIGN_CACHE_SIZE", 1024))
+# Ranged-GET streaming of stored objects: bytes per request and chunks buffered ahead
+S3_STREAM_CHUNK_SIZE = int(_get("S3_STREAM_CHUNK_SIZE", 8 * 1024 * 1024))
+S3_STREAM_READ_AHEAD = int(_get("S3_STREAM_READ_AHEAD", 4))
+# Key uploads by SHA-256 and skip uploading files that are already stored
+S3_CONTENT_ADDRESSED = str(_get("S3_CONTENT_ADDRESSED", "false")).lower() in ("1", "true", "yes")
 
 # Groq Configuration (Required)
 GROQ_API_KEY = _get("GROQ_API_KEY")
 
+# Audio derivative kept next to each video for reprocessing: "opus" or "flac"
+AUDIO_DERIVATIVE_FORMAT = _get("AUDIO_DERIVATIVE_FORMAT", "opus")
+AUDIO_DERIVATIVE_BITRATE = _get("AUDIO_DERIVATIVE_BITRATE", "24k")  # opus only
+
+# Playback renditions: fast-start MP4 heights (comma separated) and HLS segment length
+ENABLE_RENDITIONS = str(_get("ENABLE_RENDITIONS", "true")).lower() in ("1", "true", "yes")
+RENDITION_HEIGHTS = _get("RENDITION_HEIGHTS", "360,720")
+HLS_SEGMENT_SECONDS = int(_get("HLS_SEGMENT_SECONDS", 6))
+# hls.js for adaptive playback, pinned to one release. With HLS_JS_INTEGRITY (its SRI hash) set, the
+# browser refuses a changed file and the player falls back to MP4
+HLS_JS_URL = _get("HLS_JS_URL", "https://cdn.jsdelivr.net/npm/hls.js@1.6.15/dist/hls.min.js")
+HLS_JS_INTEGRITY = _get("HLS_JS_INTEGRITY", "")
+
+# Background ingestion: uploads are spooled here and processed by worker processes
+UPLOAD_SPOOL_DIR = _get("UPLOAD_SPOOL_DIR", os.path.join(tempfile.gettempdir(), "video_transcriber_spool"))
+EMBEDDED_WORKERS = int(_get("EMBEDDED_WORKERS", 1))  # started by the app; 0 = run worker.py separately
+JOB_MAX_ATTEMPTS = int(_get("JOB_MAX_ATTEMPTS", 3))
+JOB_LEASE_SECONDS = int(_get("JOB_LEASE_SECONDS", 120))
+JOB_HEARTBEAT_SECONDS = int(_get("JOB_HEARTBEAT_SECONDS", 15))
+JOB_RETRY_BACKOFF = int(_get("JOB_RETRY_BACKOFF", 30))
+JOB_POLL_SECONDS = float(_get("JOB_POLL_SECONDS", 2))
+# Independent pipeline stages (e.g. S3 upload and Whisper) run concurrently up to this limit
+PIPELINE_MAX_PARALLEL_STAGES = int(_get("PIPELINE_MAX_PARALLEL_STAGES", 4))
+
+# Batch tools (ingest.py, reprocess.py): videos in flight, concurrent Whisper runs, concurrent LLM calls
+INGEST_WORKERS = int(_get("INGEST_WORKERS", 4))
+INGEST_TRANSCRIBE_CONCURRENCY = int(_get("INGEST_TRANSCRIBE_CONCURRENCY", 1))
+INGEST_LLM_CONCURRENCY = int(_get("INGEST_LLM_CONCURRENCY", 2))
+
+# Memory-aware ingestion: workers on this host only start a job while the reserved memory of running
+# jobs fits in MEMORY_BUDGET_MB (0 = no limit). JOB_MEMORY_ESTIMATE_MB overrides the computed per-job
+# estimate. Whisper transcribes long audio in windows of up to WHISPER_CHUNK_SECONDS (0 = whole file at
+# once), cut at the quietest moment near the window's end and overlapping by WHISPER_CHUNK_OVERLAP_SECONDS.
+MEMORY_BUDGET_MB = int(_get("MEMORY_BUDGET_MB", 0))
+JOB_MEMORY_ESTIMATE_MB = int(_get("JOB_MEMORY_ESTIMATE_MB", 0))
+WHISPER_CHUNK_SECONDS = int(_get("WHISPER_CHUNK_SECONDS", 0))
+WHISPER_CHUNK_OVERLAP_SECONDS = float(_get("WHISPER_CHUNK_OVERLAP_SECONDS", 2))
+
+# Timing spans are appended here as JSON lines (empty disables); the admin page reads the latest records
+METRICS_PATH = _get("METRICS_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "metrics.jsonl"))
+METRICS_MAX_RECORDS = int(_get("METRICS_MAX_RECORDS", 50000))
+# The file is rotated to METRICS_PATH.1 ... .N once it reaches METRICS_MAX_BYTES (0 = never)
+METRICS_MAX_BYTES = int(_get("METRICS_MAX_BYTES", 20 * 1024 * 1024))
+METRICS_BACKUPS = int(_get("METRICS_BACKUPS", 2))
+
 # App Configuration
 MAX_VIDEO_SIZE = 500 * 1024 * 1024  # 500MB
 SUPPORTED_VIDEO_FORMATS = ['.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv']
+VIDEO_LIST_PAGE_SIZE = int(_get("VIDEO_LIST_PAGE_SIZE", 20))
+
+# Read cache in front of the database (entries, seconds)
+DB_CACHE_MAXSIZE = int(_get("DB_CACHE_MAXSIZE", 256))
+DB_CACHE_TTL = int(_get("DB_CACHE_TTL", 300))
+
+# Transcript/summary payload storage (bytes): compress above the first
+# threshold, move the compressed payload to GridFS above the second
+TRANSCRIPT_COMPRESS_THRESHOLD = int(_get("TRANSCRIPT_COMPRESS_THRESHOLD", 64 * 1024))
+TRANSCRIPT_GRIDFS_THRESHOLD = int(_get("TRANSCRIPT_GRIDFS_THRESHOLD", 8 * 1024 * 1024))
 
 # Optional: validate required keys early (fail fast with clear message)
 _REQUIRED = {
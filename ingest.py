@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Bulk ingestion of video files without the Streamlit app
+
+Usage:
+    python ingest.py /path/to/lectures
+    python ingest.py manifest.csv [--workers 4] [--transcribe-concurrency 1] [--llm-concurrency 2]
+
+The source is either a directory, searched recursively for supported video
+files, or a manifest: a CSV file with a `path` column and an optional
+`title` column, or a text file with one path per line. Relative manifest
+paths are resolved against the manifest's directory.
+
+Every video goes through the same ingestion pipeline as uploads from the app.
+Videos already in the library are skipped when processed, and resumed when
+an earlier run stopped part way. A file matches a stored video by the
+SHA-256 of its contents. Videos stored before digests were recorded match
+on title together with the original file name. Files whose video is being
+processed by a worker right now are left alone.
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import config
+from job_queue import create_job_queue
+from memory import MemoryBudget
+from pipeline import IngestionPipeline
+from worker import build_services
+
+
+class _Limited:
+    """Proxy that caps how many calls to selected methods of a service run at once"""
+
+    def __init__(self, service, methods, limit):
+        self._service = service
+        self._methods = set(methods)
+        self._slots = threading.BoundedSemaphore(max(limit, 1))
+
+    def __getattr__(self, name):
+        attr = getattr(self._service, name)
+        if name not in self._methods:
+            return attr
+
+        def limited(*args, **kwargs):
+            with self._slots:
+                return attr(*args, **kwargs)
+        return limited
+
+
+# Upload names without content addressing: "<YYYYmmdd_HHMMSS>_<original name>"
+_TIMESTAMPED_NAME_RE = re.compile(r"^\d{8}_\d{6}_(.+)$")
+
+
+def _title_from_path(path):
+    return os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+
+
+def collect_items(source):
+    """List (path, title) pairs from a directory or a manifest file"""
+    formats = tuple(config.SUPPORTED_VIDEO_FORMATS)
+    if os.path.isdir(source):
+        items = []
+        for root, _, files in os.walk(source):
+            for name in sorted(files):
+                if name.lower().endswith(formats):
+                    path = os.path.join(root, name)
+                    items.append((path, _title_from_path(path)))
+        return sorted(items)
+
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, newline="") as f:
+        if source.lower().endswith(".csv"):
+            rows = [(row["path"], row.get("title")) for row in csv.DictReader(f)]
+        else:
+            rows = [(line.strip(), None) for line in f if line.strip() and not line.startswith("#")]
+
+    items = []
+    for path, title in rows:
+        path = path if os.path.isabs(path) else os.path.join(base, path)
+        items.append((path, title or _title_from_path(path)))
+    return items
+
+
+class BulkIngester:
+    """Runs many videos through the ingestion pipeline with bounded concurrency"""
+
+    def __init__(self, services, workers=None, transcribe_concurrency=None, llm_concurrency=None):
+        self.workers = workers or config.INGEST_WORKERS
+        services = dict(services)
+        services['transcription'] = _Limited(
+            services['transcription'], ("transcribe_audio", "transcribe_from_s3"),
+            transcribe_concurrency or config.INGEST_TRANSCRIBE_CONCURRENCY)
+        services['ai'] = _Limited(
+            services['ai'], ("generate_summary",),
+            llm_concurrency or config.INGEST_LLM_CONCURRENCY)
+        self.db = services['db']
+        self.s3 = services['s3']
+        self.jobs = create_job_queue(self.db)
+        self.pipeline = IngestionPipeline(services)
+        self.budget = MemoryBudget()
+        self._lock = threading.Lock()
+        # Digests taken by a file of this run, so duplicate files are ingested once
+        self._claimed = set()
+
+    def _existing_videos(self):
+        """Index the library by content digest, and older videos by (title, original file name)"""
+        by_digest, legacy = {}, {}
+        for video in self.db.get_all_videos():
+            if video.get('digest'):
+                by_digest.setdefault(video['digest'], video)
+                continue
+            name = video['filename']
+            match = _TIMESTAMPED_NAME_RE.match(name)
+            legacy.setdefault((video['title'], match.group(1) if match else name), video)
+        return by_digest, legacy
+
+    def _active_work(self):
+        """Video ids and upload digests of all jobs that are queued or running"""
+        video_ids, digests = set(), set()
+        for job in self.jobs.list_jobs(limit=None, statuses=["queued", "running"]):
+            video_id = job['payload'].get('video_id') or (job.get('state') or {}).get('video_id')
+            if video_id:
+                video_ids.add(str(video_id))
+            if job['payload'].get('digest'):
+                digests.add(job['payload']['digest'])
+        return video_ids, digests
+
+    def ingest_one(self, path, title, existing):
+        """Process one file; returns (outcome, duration_seconds)"""
+        by_digest, legacy, active_video_ids, active_digests = existing
+        digest = self.s3.hash_file(path)
+        match = by_digest.get(digest) or legacy.get((title, os.path.basename(path)))
+
+        if match and match.get('status') == 'processed':
+            return "skipped", 0.0
+        with self._lock:
+            if digest in self._claimed:
+                return "skipped", 0.0
+            self._claimed.add(digest)
+        if digest in active_digests or (match and str(match['_id']) in active_video_ids):
+            return "in_progress", 0.0
+
+        # Shares the host's memory budget with any background workers
+        owner = f"ingest-{os.getpid()}-{threading.get_ident()}"
+        reservation = self.budget.reserve(owner)
+        while reservation is None:
+            time.sleep(config.JOB_POLL_SECONDS)
+            reservation = self.budget.reserve(owner)
+        try:
+            if match:
+                video_id = self.pipeline.resume(str(match['_id']))
+                outcome = "resumed"
+            else:
+                video_id = self.pipeline.run(title, path, os.path.basename(path), digest=digest)
+                outcome = "ingested"
+        finally:
+            self.budget.release(reservation)
+
+        video = self.db.get_video_by_id(video_id)
+        return outcome, (video or {}).get('duration') or 0.0
+
+    def run(self, items):
+        """Ingest all items and print a throughput report; returns counts by outcome"""
+        # Load Whisper once up front rather than racing to load it in every worker thread
+        self.pipeline.transcription._load_model()
+        # Library and job queue are read once per run, not once per file
+        existing = (*self._existing_videos(), *self._active_work())
+
+        counts = {"ingested": 0, "resumed": 0, "skipped": 0, "in_progress": 0, "failed": 0}
+        audio_seconds = 0.0
+        start = time.perf_counter()
+        print(f"📦 Ingesting {len(items)} video(s) with {self.workers} worker(s)")
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            futures = {pool.submit(self.ingest_one, path, title, existing): (path, title)
+                       for path, title in items}
+            for future in as_completed(futures):
+                path, title = futures[future]
+                try:
+                    outcome, duration = future.result()
+                except Exception as e:
+                    outcome, duration = "failed", 0.0
+                    print(f"❌ {path}: {e}")
+                with self._lock:
+                    counts[outcome] += 1
+                    audio_seconds += duration
+                    finished = sum(counts.values())
+                if outcome != "failed":
+                    print(f"{'✅' if outcome in ('ingested', 'resumed') else '⏭️'} "
+                          f"[{finished}/{len(items)}] {outcome.replace('_', ' ')}: {title}")
+
+        self.report(counts, audio_seconds, time.perf_counter() - start)
+        return counts
+
+    def report(self, counts, audio_seconds, elapsed):
+        processed = counts["ingested"] + counts["resumed"]
+        hours = max(elapsed, 1e-9) / 3600
+        print(f"📊 {processed} processed ({counts['resumed']} resumed), {counts['skipped']} skipped, "
+              f"{counts['in_progress']} left to a running job, {counts['failed']} failed in {elapsed / 60:.1f} min")
+        print(f"   Throughput: {processed / hours:.1f} videos/hour, "
+              f"{audio_seconds / 3600 / hours:.2f} audio hours/hour")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk-ingest videos from a directory or manifest")
+    parser.add_argument("source", help="Directory of videos, CSV manifest (path[,title]) or list of paths")
+    parser.add_argument("--workers", type=int, help=f"Videos processed at once (default {config.INGEST_WORKERS})")
+    parser.add_argument("--transcribe-concurrency", type=int,
+                        help=f"Concurrent Whisper runs (default {config.INGEST_TRANSCRIBE_CONCURRENCY})")
+    parser.add_argument("--llm-concurrency", type=int,
+                        help=f"Concurrent summary requests (default {config.INGEST_LLM_CONCURRENCY})")
+    args = parser.parse_args()
+
+    items = collect_items(args.source)
+    if not items:
+        print(f"ℹ️ No videos found in {args.source}")
+        return
+
+    missing = [path for path, _ in items if not os.path.exists(path)]
+    if missing:
+        print(f"❌ {len(missing)} file(s) not found, e.g. {missing[0]}")
+        sys.exit(1)
+
+    ingester = BulkIngester(build_services(), args.workers, args.transcribe_concurrency, args.llm_concurrency)
+    counts = ingester.run(items)
+    sys.exit(1 if counts["failed"] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,285 @@
+"""
+Durable job queue for background video ingestion
+
+Jobs live in the application database (a `jobs` collection in MongoDB or a
+`jobs` table in SQLite), so they survive browser refreshes and server
+restarts. Workers claim jobs atomically and heartbeat while they run. A job
+whose heartbeat stops for JOB_LEASE_SECONDS is handed to another worker, and
+failed jobs are retried with exponential backoff up to JOB_MAX_ATTEMPTS.
+"""
+
+import json
+import secrets
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+import config
+from cache import CachedDatabase
+
+
+def _retry_delay(attempts):
+    return config.JOB_RETRY_BACKOFF * (2 ** max(attempts - 1, 0))
+
+
+class MongoJobQueue:
+    def __init__(self, db):
+        if not db.client:
+            raise Exception("MongoDB not connected. Please check your connection settings.")
+        self.jobs = db.db.jobs
+        self.jobs.create_index([("status", 1), ("run_after", 1)])
+        self.jobs.create_index([("created_at", -1)])
+        # A resume job names its video in the payload, an ingest job in its state once saved
+        self.jobs.create_index("payload.video_id", sparse=True)
+        self.jobs.create_index("state.video_id", sparse=True)
+
+    def _to_job(self, doc):
+        if doc is None:
+            return None
+        doc["_id"] = str(doc["_id"])
+        return doc
+
+    def enqueue(self, kind, payload, max_attempts=None):
+        """Add a job and return its id"""
+        now = datetime.now()
+        result = self.jobs.insert_one({
+            "kind": kind,
+            "payload": payload,
+            "state": {},
+            "status": "queued",
+            "attempts": 0,
+            "max_attempts": max_attempts or config.JOB_MAX_ATTEMPTS,
+            "run_after": now,
+            "worker_id": None,
+            "heartbeat_at": None,
+            "stage": "Queued",
+            "progress": 0,
+            "error": None,
+            "created_at": now,
+            "updated_at": now
+        })
+        return str(result.inserted_id)
+
+    def claim(self, worker_id):
+        """Atomically take the oldest runnable job, including ones whose worker died"""
+        now = datetime.now()
+        stale = now - timedelta(seconds=config.JOB_LEASE_SECONDS)
+        doc = self.jobs.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "run_after": {"$lte": now}},
+                {"status": "running", "heartbeat_at": {"$lt": stale}}
+            ]},
+            {"$set": {"status": "running", "worker_id": worker_id, "heartbeat_at": now, "updated_at": now},
+             "$inc": {"attempts": 1}},
+            sort=[("created_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        return self._to_job(doc)
+
+    def heartbeat(self, job_id, worker_id, stage=None, progress=None):
+        """Extend the lease on a running job and record its progress"""
+        update = {"heartbeat_at": datetime.now(), "updated_at": datetime.now()}
+        if stage is not None:
+            update["stage"] = stage
+        if progress is not None:
+            update["progress"] = progress
+        self.jobs.update_one({"_id": ObjectId(job_id), "worker_id": worker_id}, {"$set": update})
+
+    def save_state(self, job_id, key, value):
+        """Persist one stage output so a retry can skip that stage"""
+        self.jobs.update_one({"_id": ObjectId(job_id)}, {"$set": {f"state.{key}": value}})
+
+    def complete(self, job_id):
+        self.jobs.update_one(
+            {"_id": ObjectId(job_id)},
+            {"$set": {"status": "done", "progress": 100, "error": None, "updated_at": datetime.now()}}
+        )
+
+    def fail(self, job_id, error):
+        """Record a failure; returns True if the job will be retried"""
+        job = self.jobs.find_one({"_id": ObjectId(job_id)}, {"attempts": 1, "max_attempts": 1})
+        retry = job is not None and job["attempts"] < job["max_attempts"]
+        now = datetime.now()
+        update = {"error": str(error), "updated_at": now, "worker_id": None}
+        if retry:
+            update.update({"status": "queued", "run_after": now + timedelta(seconds=_retry_delay(job["attempts"]))})
+        else:
+            update["status"] = "failed"
+        self.jobs.update_one({"_id": ObjectId(job_id)}, {"$set": update})
+        return retry
+
+    def list_jobs(self, limit=20, statuses=None, video_ids=None):
+        """Most recent jobs, newest first; only jobs for video_ids if given, and all of them if limit is None"""
+        query = {"status": {"$in": list(statuses)}} if statuses else {}
+        if video_ids is not None:
+            video_ids = [str(video_id) for video_id in video_ids]
+            query["$or"] = [{"payload.video_id": {"$in": video_ids}}, {"state.video_id": {"$in": video_ids}}]
+        cursor = self.jobs.find(query).sort("created_at", -1)
+        if limit is not None:
+            cursor = cursor.limit(limit)
+        return [self._to_job(doc) for doc in cursor]
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT '{}',
+    status TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL,
+    run_after REAL NOT NULL,
+    worker_id TEXT,
+    heartbeat_at REAL,
+    stage TEXT,
+    progress INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_status_run_after ON jobs (status, run_after);
+CREATE INDEX IF NOT EXISTS idx_jobs_created_at ON jobs (created_at DESC);
+"""
+
+
+class SQLiteJobQueue:
+    def __init__(self, path):
+        # Own connection: workers are separate processes, and WAL lets them share the file
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(_SQLITE_SCHEMA)
+        # The heartbeat thread shares this connection with the worker loop
+        self._lock = threading.Lock()
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _to_job(self, row):
+        if row is None:
+            return None
+        job = dict(row)
+        job["_id"] = job.pop("id")
+        job["payload"] = json.loads(job["payload"])
+        job["state"] = json.loads(job["state"])
+        job["created_at"] = datetime.fromtimestamp(job["created_at"])
+        job["updated_at"] = datetime.fromtimestamp(job["updated_at"])
+        return job
+
+    def enqueue(self, kind, payload, max_attempts=None):
+        """Add a job and return its id"""
+        job_id = secrets.token_hex(12)
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, kind, payload, status, max_attempts, run_after, stage, created_at, updated_at) "
+            "VALUES (?, ?, ?, 'queued', ?, ?, 'Queued', ?, ?)",
+            (job_id, kind, json.dumps(payload), max_attempts or config.JOB_MAX_ATTEMPTS, now, now, now)
+        )
+        return job_id
+
+    def claim(self, worker_id):
+        """Atomically take the oldest runnable job, including ones whose worker died"""
+        with self._lock:
+            return self._claim_locked(worker_id, time.time())
+
+    def _claim_locked(self, worker_id, now):
+        # BEGIN IMMEDIATE takes the write lock up front, so two workers can't claim the same row
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = self.conn.execute(
+                "SELECT id FROM jobs WHERE (status = 'queued' AND run_after <= ?) "
+                "OR (status = 'running' AND heartbeat_at < ?) ORDER BY created_at LIMIT 1",
+                (now, now - config.JOB_LEASE_SECONDS)
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET status = 'running', worker_id = ?, heartbeat_at = ?, updated_at = ?, "
+                "attempts = attempts + 1 WHERE id = ?",
+                (worker_id, now, now, row["id"])
+            )
+            job = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+            self.conn.execute("COMMIT")
+            return self._to_job(job)
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+
+    def heartbeat(self, job_id, worker_id, stage=None, progress=None):
+        """Extend the lease on a running job and record its progress"""
+        now = time.time()
+        self._execute(
+            "UPDATE jobs SET heartbeat_at = ?, updated_at = ?, stage = COALESCE(?, stage), "
+            "progress = COALESCE(?, progress) WHERE id = ? AND worker_id = ?",
+            (now, now, stage, progress, job_id, worker_id)
+        )
+
+    def save_state(self, job_id, key, value):
+        """Persist one stage output so a retry can skip that stage"""
+        self._execute(
+            "UPDATE jobs SET state = json_set(state, ?, json(?)) WHERE id = ?",
+            (f"$.{key}", json.dumps(value), job_id)
+        )
+
+    def complete(self, job_id):
+        self._execute(
+            "UPDATE jobs SET status = 'done', progress = 100, error = NULL, updated_at = ? WHERE id = ?",
+            (time.time(), job_id)
+        )
+
+    def fail(self, job_id, error):
+        """Record a failure; returns True if the job will be retried"""
+        rows = self._execute("SELECT attempts, max_attempts FROM jobs WHERE id = ?", (job_id,))
+        row = rows[0] if rows else None
+        retry = row is not None and row["attempts"] < row["max_attempts"]
+        now = time.time()
+        if retry:
+            self._execute(
+                "UPDATE jobs SET status = 'queued', run_after = ?, error = ?, worker_id = NULL, updated_at = ? "
+                "WHERE id = ?",
+                (now + _retry_delay(row["attempts"]), str(error), now, job_id)
+            )
+        else:
+            self._execute(
+                "UPDATE jobs SET status = 'failed', error = ?, worker_id = NULL, updated_at = ? WHERE id = ?",
+                (str(error), now, job_id)
+            )
+        return retry
+
+    def list_jobs(self, limit=20, statuses=None, video_ids=None):
+        """Most recent jobs, newest first; only jobs for video_ids if given, and all of them if limit is None"""
+        clauses, params = [], []
+        if statuses:
+            statuses = list(statuses)
+            clauses.append(f"status IN ({', '.join('?' for _ in statuses)})")
+            params += statuses
+        if video_ids is not None:
+            video_ids = [str(video_id) for video_id in video_ids]
+            placeholders = ", ".join("?" for _ in video_ids)
+            clauses.append(f"(json_extract(payload, '$.video_id') IN ({placeholders}) "
+                           f"OR json_extract(state, '$.video_id') IN ({placeholders}))")
+            params += video_ids + video_ids
+        sql = "SELECT * FROM jobs"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY created_at DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            params.append(limit)
+        return [self._to_job(row) for row in self._execute(sql, params)]
+
+
+def create_job_queue(db):
+    """Create the job queue matching the database backend in use"""
+    if isinstance(db, CachedDatabase):
+        db = db.db
+    if config.DATABASE_BACKEND.lower() == "sqlite":
+        return SQLiteJobQueue(db.path)
+    return MongoJobQueue(db)
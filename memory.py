@@ -0,0 +1,184 @@
+"""
+Memory accounting for video ingestion
+
+MemoryBudget admits ingestion jobs on this host only while their reserved
+memory fits within MEMORY_BUDGET_MB. Every worker process holds a small
+reservation file for the job it is running, and checks and writes it under
+a file lock, so two workers cannot both take the last slot. Memory the
+container reports as available is checked too.
+
+RssSampler tracks the peak resident memory of the current process while a
+job runs, and current_rss() is recorded on every metrics span.
+"""
+
+import json
+import os
+import resource
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: reservations still work, just without the cross-process lock
+    fcntl = None
+
+import config
+
+MB = 1024 * 1024
+
+
+def current_rss():
+    """Resident memory of this process in bytes"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        # No /proc: fall back to the peak, which is the closest portable figure
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def _read_int(path):
+    try:
+        with open(path) as f:
+            value = f.read().strip()
+        return None if value == "max" else int(value)
+    except (OSError, ValueError):
+        return None
+
+
+def available_memory():
+    """Bytes still available to this container (cgroup limit), or to the host; None if unknown"""
+    for limit_path, usage_path in (
+        ("/sys/fs/cgroup/memory.max", "/sys/fs/cgroup/memory.current"),  # cgroup v2
+        ("/sys/fs/cgroup/memory/memory.limit_in_bytes", "/sys/fs/cgroup/memory/memory.usage_in_bytes"),  # v1
+    ):
+        limit, usage = _read_int(limit_path), _read_int(usage_path)
+        # cgroup v1 reports "no limit" as a huge number
+        if limit is not None and usage is not None and limit < 1 << 60:
+            return limit - usage
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def estimate_job_bytes():
+    """Working memory one ingestion job needs on top of the worker's loaded models
+
+    Covers the upload's multipart buffers, the S3 read-ahead of a streamed
+    re-transcription, one Whisper window (int16 and float32 samples plus the
+    mel spectrogram) and a fixed allowance for ffmpeg and encoders.
+    """
+    if config.JOB_MEMORY_ESTIMATE_MB:
+        return config.JOB_MEMORY_ESTIMATE_MB * MB
+    upload_buffers = config.S3_MULTIPART_PART_SIZE * config.S3_MAX_CONCURRENCY
+    stream_buffers = config.S3_STREAM_CHUNK_SIZE * (config.S3_STREAM_READ_AHEAD + 1)
+    window = config.WHISPER_CHUNK_SECONDS or 3600
+    whisper_window = window * 16000 * (2 + 4) + window * 100 * 80 * 4 * 2
+    return upload_buffers + stream_buffers + whisper_window + 256 * MB
+
+
+def _process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running, but as another user
+        return True
+    return True
+
+
+class MemoryBudget:
+    """Host-wide admission control for ingestion jobs by reserved memory"""
+
+    def __init__(self, budget_bytes=None, job_bytes=None, directory=None):
+        self.budget_bytes = config.MEMORY_BUDGET_MB * MB if budget_bytes is None else budget_bytes
+        self.job_bytes = job_bytes or estimate_job_bytes()
+        self.directory = directory or os.path.join(config.UPLOAD_SPOOL_DIR, ".memory")
+
+    @property
+    def enabled(self):
+        return self.budget_bytes > 0
+
+    def _reserved_bytes(self):
+        """Sum of live reservations, removing those left behind by dead processes"""
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                with open(path) as f:
+                    reservation = json.load(f)
+                alive = _process_alive(reservation["pid"])
+                reserved = int(reservation["bytes"])
+            except (OSError, ValueError, KeyError, TypeError):
+                # Unreadable or garbled
+                alive = False
+            if not alive:
+                try:
+                    os.unlink(path)
+                except OSError:
+                    pass
+                continue
+            total += reserved
+        return total
+
+    def reserve(self, owner):
+        """Reserve memory for one job; returns a reservation path, or None if it doesn't fit"""
+        if not self.enabled:
+            return ""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".lock"), "w") as lock:
+            if fcntl:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            if self._reserved_bytes() + self.job_bytes > self.budget_bytes:
+                return None
+            available = available_memory()
+            if available is not None and available < self.job_bytes:
+                return None
+            path = os.path.join(self.directory, f"{owner}.json")
+            with open(path, "w") as f:
+                json.dump({"pid": os.getpid(), "bytes": self.job_bytes, "since": time.time()}, f)
+            return path
+
+    def release(self, reservation):
+        if reservation and os.path.exists(reservation):
+            os.unlink(reservation)
+
+    def usage(self):
+        """Reserved and budgeted bytes, for status output"""
+        if not self.enabled:
+            return {"reserved": 0, "budget": 0}
+        os.makedirs(self.directory, exist_ok=True)
+        return {"reserved": self._reserved_bytes(), "budget": self.budget_bytes}
+
+
+class RssSampler:
+    """Samples this process's RSS in the background and keeps the peak"""
+
+    def __init__(self, interval=0.5):
+        self.interval = interval
+        self.start_bytes = 0
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self.start_bytes = self.peak_bytes = current_rss()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_bytes = max(self.peak_bytes, current_rss())
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak_bytes = max(self.peak_bytes, current_rss())
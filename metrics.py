@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+"""
+Timing spans for the processing pipeline, with JSONL and Prometheus export
+
+Code wraps work in `span(name)`; each finished span is appended as one JSON
+line to METRICS_PATH. The app, the workers and the batch tools all append to
+the same file, and the metrics admin page and this module's CLI aggregate it:
+
+    python metrics.py summary [--prefix whisper]
+    python metrics.py prometheus [-o metrics.prom]
+
+The Prometheus output is a text exposition file, suitable for the
+node_exporter textfile collector. It describes the latest METRICS_MAX_RECORDS
+spans, so every value is a gauge: counts and totals fall as old spans leave
+the window and must not be fed to rate().
+
+Once the file reaches METRICS_MAX_BYTES the writer that crossed the limit
+rotates it to METRICS_PATH.1, keeping METRICS_BACKUPS old files. Readers only
+read as far back from the end as the records they need.
+
+A span can carry `media_seconds` (the length of the audio or video it
+processed); summaries then also report the real-time factor, i.e. seconds of
+work per second of media. Every span also records the process's resident
+memory when it ends.
+"""
+
+import argparse
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import config
+from memory import MB, current_rss
+
+try:
+    import fcntl
+except ImportError:  # Windows: rotation still works, just without the cross-process lock
+    fcntl = None
+
+_write_lock = threading.Lock()
+_file = None
+_write_failed = False
+# Bytes read per step when reading the metrics file backwards
+_TAIL_BLOCK = 64 * 1024
+
+
+def _backup_paths(path):
+    return [f"{path}.{n}" for n in range(1, config.METRICS_BACKUPS + 1)]
+
+
+def _rotated_away(f, path):
+    """Whether another process has rotated the file f was opened on"""
+    try:
+        return os.stat(path).st_ino != os.fstat(f.fileno()).st_ino
+    except FileNotFoundError:
+        return True
+
+
+def _rotate(path):
+    """Shift path to path.1, path.1 to path.2 and so on, dropping the oldest"""
+    with open(path + ".lock", "w") as lock:
+        if fcntl:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another process may have rotated it while this one waited for the lock
+        if not os.path.exists(path) or os.path.getsize(path) < config.METRICS_MAX_BYTES:
+            return
+        backups = _backup_paths(path)
+        if not backups:
+            os.unlink(path)
+            return
+        for older, newer in reversed(list(zip(backups[1:], backups))):
+            if os.path.exists(newer):
+                os.replace(newer, older)
+        os.replace(path, backups[0])
+
+
+def _close_file():
+    global _file
+    if _file is not None:
+        try:
+            _file.close()
+        except OSError:
+            pass
+        _file = None
+
+
+def observe(record):
+    """Append one finished span record to the metrics file
+
+    Best effort: if the file can't be written, the record is dropped, so a
+    timed call never fails (or loses its own exception) because of metrics.
+    """
+    global _file, _write_failed
+    path = config.METRICS_PATH
+    if not path:
+        return
+    line = json.dumps(record, default=str) + "\n"
+    with _write_lock:
+        try:
+            if _file is not None and _rotated_away(_file, path):
+                _close_file()
+            if _file is None:
+                # Line-buffered append: each record reaches the file as a single write,
+                # so several processes can share it
+                _file = open(path, "a", buffering=1)
+            _file.write(line)
+            if config.METRICS_MAX_BYTES and _file.tell() >= config.METRICS_MAX_BYTES:
+                _close_file()
+                _rotate(path)
+        except OSError as e:
+            _close_file()
+            if not _write_failed:
+                _write_failed = True
+                print(f"⚠️  Cannot write metrics to {path}, dropping spans: {e}")
+
+
+@contextmanager
+def span(name, media_seconds=None, **fields):
+    """Time the enclosed block and record it under name
+
+    Yields the record dict, so the block can add fields it only learns while
+    running (bytes transferred, token counts, media_seconds).
+    """
+    record = {"name": name, "ts": time.time(), **fields}
+    if media_seconds:
+        record["media_seconds"] = media_seconds
+    start = time.perf_counter()
+    try:
+        yield record
+    except Exception:
+        record["error"] = True
+        raise
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        record["rss_mb"] = round(current_rss() / MB, 1)
+        observe(record)
+
+
+def timed(prefix):
+    """Decorator recording a span named '<prefix>.<function name>' per call"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(f"{prefix}.{fn.__name__}"):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def _tail_lines(path, limit):
+    """The last `limit` lines of a file, read backwards from its end"""
+    with open(path, "rb") as f:
+        position = f.seek(0, os.SEEK_END)
+        blocks, newlines = deque(), 0
+        while position > 0 and newlines <= limit:
+            size = min(_TAIL_BLOCK, position)
+            position -= size
+            f.seek(position)
+            block = f.read(size)
+            blocks.appendleft(block)
+            newlines += block.count(b"\n")
+    lines = b"".join(blocks).splitlines()
+    if position > 0:
+        # Starts part way through a line
+        lines = lines[1:]
+    return lines[-limit:] if limit else []
+
+
+def load_records(path=None, limit=None):
+    """Read the most recent `limit` span records, from the metrics file and its rotated backups"""
+    path = path or config.METRICS_PATH
+    if not path:
+        return []
+    limit = limit or config.METRICS_MAX_RECORDS
+    lines = []
+    for candidate in [path] + _backup_paths(path):
+        if len(lines) >= limit:
+            break
+        try:
+            lines = _tail_lines(candidate, limit - len(lines)) + lines
+        except FileNotFoundError:
+            # Not written yet, or rotated away while being read
+            continue
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            # A partially written last line from a live writer
+            continue
+    return records
+
+
+def _quantile(sorted_values, q):
+    if not sorted_values:
+        return None
+    index = min(int(q * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(records, prefix=None):
+    """Per-span count, total, p50/p95 seconds, p50/p95 real-time factor and p95 RSS"""
+    grouped = {}
+    for record in records:
+        if prefix and not record["name"].startswith(prefix):
+            continue
+        grouped.setdefault(record["name"], []).append(record)
+
+    stats = {}
+    for name, group in sorted(grouped.items()):
+        seconds = sorted(r["seconds"] for r in group)
+        rtf = sorted(r["seconds"] / r["media_seconds"] for r in group if r.get("media_seconds"))
+        rss = sorted(r["rss_mb"] for r in group if r.get("rss_mb") is not None)
+        stats[name] = {
+            "count": len(group),
+            "errors": sum(1 for r in group if r.get("error")),
+            "total_seconds": sum(seconds),
+            "p50_seconds": _quantile(seconds, 0.5),
+            "p95_seconds": _quantile(seconds, 0.95),
+            "p50_rtf": _quantile(rtf, 0.5),
+            "p95_rtf": _quantile(rtf, 0.95),
+            "p95_rss_mb": _quantile(rss, 0.95),
+        }
+    return stats
+
+
+def render_prometheus(stats):
+    """Render summarize() output in the Prometheus text exposition format
+
+    The stats cover a window of recent spans rather than everything since
+    startup, so all metrics are gauges, including the window's counts.
+    """
+    lines = [
+        "# HELP video_transcriber_span_seconds Duration of the latest pipeline spans",
+        "# TYPE video_transcriber_span_seconds gauge",
+    ]
+    for name, s in stats.items():
+        lines.append(f'video_transcriber_span_seconds{{span="{name}",quantile="0.5"}} {s["p50_seconds"]}')
+        lines.append(f'video_transcriber_span_seconds{{span="{name}",quantile="0.95"}} {s["p95_seconds"]}')
+
+    lines += [
+        "# HELP video_transcriber_span_window_count Spans in the window of latest spans",
+        "# TYPE video_transcriber_span_window_count gauge",
+    ]
+    lines += [f'video_transcriber_span_window_count{{span="{name}"}} {s["count"]}' for name, s in stats.items()]
+
+    lines += [
+        "# HELP video_transcriber_span_window_seconds Total duration of the spans in the window",
+        "# TYPE video_transcriber_span_window_seconds gauge",
+    ]
+    lines += [f'video_transcriber_span_window_seconds{{span="{name}"}} {s["total_seconds"]}'
+              for name, s in stats.items()]
+
+    lines += [
+        "# HELP video_transcriber_span_window_errors Spans in the window that raised an exception",
+        "# TYPE video_transcriber_span_window_errors gauge",
+    ]
+    lines += [f'video_transcriber_span_window_errors{{span="{name}"}} {s["errors"]}' for name, s in stats.items()]
+
+    lines += [
+        "# HELP video_transcriber_span_realtime_factor Span seconds per second of media processed",
+        "# TYPE video_transcriber_span_realtime_factor gauge",
+    ]
+    for name, s in stats.items():
+        if s["p50_rtf"] is not None:
+            lines.append(f'video_transcriber_span_realtime_factor{{span="{name}",quantile="0.5"}} {s["p50_rtf"]}')
+            lines.append(f'video_transcriber_span_realtime_factor{{span="{name}",quantile="0.95"}} {s["p95_rtf"]}')
+
+    lines += [
+        "# HELP video_transcriber_span_rss_bytes Process resident memory when the span ended",
+        "# TYPE video_transcriber_span_rss_bytes gauge",
+    ]
+    for name, s in stats.items():
+        if s["p95_rss_mb"] is not None:
+            lines.append(f'video_transcriber_span_rss_bytes{{span="{name}",quantile="0.95"}} {s["p95_rss_mb"] * MB:.0f}')
+    return "\n".join(lines) + "\n"
+
+
+def _format(value, digits=3):
+    return "-" if value is None else f"{value:.{digits}f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize or export pipeline timing spans")
+    parser.add_argument("--path", help=f"Metrics JSONL file (default {config.METRICS_PATH})")
+    commands = parser.add_subparsers(dest="command", required=True)
+    summary = commands.add_parser("summary", help="Print p50/p95 per span")
+    summary.add_argument("--prefix", help="Only spans whose name starts with this")
+    prometheus = commands.add_parser("prometheus", help="Write Prometheus text format")
+    prometheus.add_argument("-o", "--output", help="Output file (default stdout)")
+    args = parser.parse_args()
+
+    records = load_records(args.path)
+    if args.command == "summary":
+        stats = summarize(records, args.prefix)
+        print(f"{'span':<36} {'count':>7} {'p50 s':>9} {'p95 s':>9} {'p50 rtf':>8} {'p95 rtf':>8} {'p95 RSS MB':>11}")
+        for name, s in stats.items():
+            print(f"{name:<36} {s['count']:>7} {_format(s['p50_seconds']):>9} {_format(s['p95_seconds']):>9} "
+                  f"{_format(s['p50_rtf']):>8} {_format(s['p95_rtf']):>8} {_format(s['p95_rss_mb'], 0):>11}")
+    else:
+        text = render_prometheus(summarize(records))
+        if args.output:
+            # Write then rename, so a scraping collector never sees a half-written file
+            tmp_path = args.output + ".tmp"
+            with open(tmp_path, "w") as f:
+                f.write(text)
+            os.replace(tmp_path, args.output)
+        else:
+            print(text, end="")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+import streamlit as st
+import pandas as pd
+import metrics
+import config
+from services import get_services
+
+# Page configuration
+st.set_page_config(
+    page_title="Pipeline Metrics - Video Transcriber",
+    page_icon="📊",
+    layout="wide"
+)
+
+SPAN_GROUPS = {
+    "All": None,
+    "Pipeline stages": "pipeline.",
+    "Whisper": "whisper.",
+    "ffmpeg": "ffmpeg.",
+    "LLM": "llm.",
+    "S3": "s3.",
+    "MongoDB": "mongo.",
+    "SQLite": "sqlite.",
+    "Play page": "render.",
+    "Service startup": "services.",
+}
+
+@st.cache_data(ttl=10)
+def load_records():
+    return metrics.load_records()
+
+def stats_table(stats):
+    """One row per span, durations in seconds"""
+    rows = [{
+        "Span": name,
+        "Count": s["count"],
+        "Errors": s["errors"],
+        "p50 (s)": s["p50_seconds"],
+        "p95 (s)": s["p95_seconds"],
+        "Total (s)": s["total_seconds"],
+        "p50 RTF": s["p50_rtf"],
+        "p95 RTF": s["p95_rtf"],
+        "p95 RSS (MB)": s["p95_rss_mb"],
+    } for name, s in stats.items()]
+    return pd.DataFrame(rows).set_index("Span")
+
+def cache_stats_row(label, stats):
+    """Counters of one in-process cache as a row of metrics"""
+    st.caption(label)
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Hit rate", f"{stats['hit_rate']:.0%}")
+    col2.metric("Hits / misses", f"{stats['hits']} / {stats['misses']}")
+    col3.metric("Entries", f"{stats['size']} / {stats['maxsize']}")
+    col4.metric("Evictions", stats['evictions'])
+
+def display_cache_stats():
+    """Caches of this Streamlit server process, for services the pages have already started"""
+    services = get_services()
+    loaded = services.loaded()
+    if 'db' not in loaded and 's3' not in loaded:
+        return
+    st.markdown("#### 🗄️ Caches in this server")
+    if 'db' in loaded:
+        cache_stats_row("Database read cache", services['db'].cache_stats())
+    if 's3' in loaded:
+        stats = services['s3'].url_cache_stats()
+        cache_stats_row(f"Presigned URL cache · URLs signed: {stats['sign_calls']}", stats)
+
+def main():
+    st.title("📊 Pipeline Metrics")
+    st.caption(f"Latest {config.METRICS_MAX_RECORDS} spans from `{config.METRICS_PATH}`. "
+               "RTF is seconds of work per second of video or audio.")
+
+    display_cache_stats()
+
+    if not config.METRICS_PATH:
+        st.info("Metrics are disabled. Set METRICS_PATH to start recording spans.")
+        return
+
+    records = load_records()
+    if not records:
+        st.info("📝 No spans recorded yet. Process a video to see where the time goes.")
+        return
+
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        group = st.selectbox("Spans", list(SPAN_GROUPS))
+    with col2:
+        if st.button("🔄 Refresh"):
+            load_records.clear()
+            st.rerun()
+
+    stats = metrics.summarize(records, SPAN_GROUPS[group])
+    if not stats:
+        st.info("No spans recorded in this group yet.")
+        return
+
+    table = stats_table(stats)
+    st.dataframe(table, use_container_width=True)
+
+    st.markdown("#### p50 / p95 duration per span")
+    st.bar_chart(table[["p50 (s)", "p95 (s)"]])
+
+    st.download_button(
+        label="📥 Download Prometheus metrics",
+        data=metrics.render_prometheus(metrics.summarize(records)),
+        file_name="video_transcriber.prom",
+        mime="text/plain"
+    )
+
+if __name__ == "__main__":
+    main()
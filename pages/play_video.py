@@ -233,13 +233,12 @@
 
 import streamlit as st
 import json
-import re
+import time
 import streamlit.components.v1 as components
-from database import Database
-from s3_storage import S3Storage
-from ai_services import AIServices
-from bson import ObjectId
-import utils
+import config
+from metrics import span
+from services import get_services
+import transcript as transcript_view
 
 # Page config first
 st.set_page_config(
@@ -248,15 +247,8 @@ st.set_page_config(
     layout="wide"
 )
 
-@st.cache_resource
-def init_services():
-    return {
-        'db': Database(),
-        's3': S3Storage(),
-        'ai': AIServices()
-    }
-
-services = init_services()
+# Shared services, built on first use
+services = get_services()
 
 def get_video_data():
     video_id = st.session_state.get('selected_video_id')
@@ -264,7 +256,8 @@ def get_video_data():
         st.error("No video selected. Please go back to the videos list.")
         st.stop()
     try:
-        video = services['db'].get_video_by_id(video_id)
+        with span("render.video_data", video_id=video_id):
+            video = services['db'].get_video_with_content(video_id)
         if not video:
             st.error("Video not found.")
             st.stop()
@@ -273,51 +266,127 @@ def get_video_data():
         st.error(f"Error loading video: {e}")
         st.stop()
 
-def _time_str_to_seconds(time_str):
-    parts = list(map(int, time_str.split(':')))
-    if len(parts) == 3:
-        return parts[0] * 3600 + parts[1] * 60 + parts[2]
-    elif len(parts) == 2:
-        return parts[0] * 60 + parts[1]
-    return 0
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_transcript_view(video_id, transcript_version, _transcript_doc):
+    """Parse a transcript and encode its segments once per video and transcript version
+
+    The transcript document is left out of the cache key (leading underscore),
+    so a rerun neither hashes nor decompresses the transcript text.
+    """
+    with span("render.transcript", video_id=video_id) as record:
+        segments = transcript_view.parse_segments(_transcript_doc['transcript'])
+        segments_json = transcript_view.segments_json(segments)
+        record["segments"] = len(segments)
+    print(f"⏱️ Transcript prepared: {len(segments)} segments in {record['seconds'] * 1000:.1f} ms")
+    return segments_json
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def load_captions(video_filename, transcript_version, _transcript_doc):
+    """WebVTT text and the SRT object key for a transcript version
+
+    Caption files are generated once per transcript version and kept in S3;
+    later loads read the stored WebVTT back instead of regenerating it.
+    """
+    def build():
+        segments = transcript_view.parse_segments(_transcript_doc['transcript'])
+        return transcript_view.to_webvtt(segments), transcript_view.to_srt(segments)
+    return services['s3'].get_captions(video_filename, transcript_version, build)
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def load_search_index(video_id, transcript_version, _transcript_doc):
+    """Segments and decoded search index for a transcript version, shared read-only by all sessions
+
+    The index is built at ingestion; videos ingested before that, or whose
+    stored index belongs to an older transcript, get one built and stored here.
+    """
+    with span("render.search_index", video_id=video_id):
+        segments = transcript_view.parse_segments(_transcript_doc['transcript'])
+        stored = services['db'].get_transcript_index(video_id)
+        if stored and stored['transcript_id'] == transcript_version:
+            index_json = stored['search_index']
+        else:
+            index_json = transcript_view.build_index(segments)
+            services['db'].save_transcript_index(video_id, transcript_version, index_json)
+        return segments, transcript_view.load_index(index_json)
+
+SEARCH_HITS_SHOWN = 50
+
+def display_transcript_search(video, transcript_doc):
+    """Search box over the transcript; choosing a hit seeks the player there on the next render"""
+    video_id = str(video['_id'])
+    query = st.text_input("🔎 Search the transcript", placeholder="Find a word or phrase...",
+                          key=f"transcript_search_{video_id}")
+    if not query.strip():
+        return
+
+    segments, terms = load_search_index(video_id, str(transcript_doc['_id']), transcript_doc)
+    search_start = time.perf_counter()
+    # One extra hit tells whether there are more than are shown
+    hits = transcript_view.search(terms, segments, query, limit=SEARCH_HITS_SHOWN + 1)
+    search_ms = (time.perf_counter() - search_start) * 1000
+
+    if not hits:
+        st.caption(f"No matches ({search_ms:.1f} ms)")
+        return
+    if len(hits) > SEARCH_HITS_SHOWN:
+        st.caption(f"More than {SEARCH_HITS_SHOWN} matches in {search_ms:.1f} ms; showing the first {SEARCH_HITS_SHOWN}")
+    else:
+        st.caption(f"{len(hits)} match(es) in {search_ms:.1f} ms")
+    for hit in hits[:SEARCH_HITS_SHOWN]:
+        text = hit['text'] if len(hit['text']) <= 120 else hit['text'][:117] + "..."
+        if st.button(f"{hit['timestamp']} {text}", key=f"search_hit_{video_id}_{hit['segment']}"):
+            st.session_state.seek_to = {"video_id": video_id, "time": hit['time']}
+            st.rerun()
+
+def select_playback_source(video):
+    """Pick the rendition to play: adaptive HLS, a fast-start MP4, or the original upload"""
+    renditions = video.get('renditions') or {}
+    mp4_keys = renditions.get('mp4', {})
+    heights = sorted(mp4_keys, key=int, reverse=True)
+
+    options = (["Auto (adaptive)"] if renditions.get('hls') else []) + [f"{h}p" for h in heights] + ["Original"]
+    choice = options[0]
+    if len(options) > 1:
+        choice = st.selectbox("Quality", options, index=0, key="playback_quality")
+
+    if choice == "Original":
+        return {"url": services['s3'].get_video_url(video['filename']), "hls": None}
+    if choice == "Auto (adaptive)":
+        # Fast-start MP4 as the fallback for browsers without Media Source Extensions
+        fallback_key = mp4_keys[heights[0]] if heights else None
+        fallback_url = (services['s3'].get_presigned_url(fallback_key) if fallback_key
+                        else services['s3'].get_video_url(video['filename']))
+        return {"url": fallback_url,
+                "hls": services['s3'].get_signed_hls(renditions['hls'], duration=video.get('duration'))}
+    return {"url": services['s3'].get_presigned_url(mp4_keys[choice[:-1]]), "hls": None}
 
 def display_interactive_player_and_transcript(video):
     try:
-        video_url = services['s3'].get_video_url(video['filename'])
-        transcript_doc = services['db'].get_transcript(str(video['_id']))
+        source = select_playback_source(video)
+        video_url = source['url']
+        transcript_doc = video.get('transcript_doc')
 
         if not transcript_doc:
             st.warning("Transcript not available for this video.")
             st.video(video_url)
             return
 
-        transcript = transcript_doc['transcript']
-        lines = transcript.split('\n')
-
-        segments = []
-        for i, line in enumerate(lines):
-            if line.strip():
-                match = re.match(r'\[(.*?) - (.*?)\] (.*)', line)
-                if match:
-                    start_time_str, end_time_str, text = match.groups()
-                    start_seconds = _time_str_to_seconds(start_time_str)
-                    end_seconds = _time_str_to_seconds(end_time_str)
-                    segments.append({
-                        "id": f"segment-{i}",
-                        "start": start_seconds,
-                        "end": end_seconds,
-                        "text": text,
-                        "timestamp": f"[{start_time_str} - {end_time_str}]"
-                    })
-
-        transcript_html = ""
-        for seg in segments:
-            transcript_html += f"""
-            <div class="segment" id="{seg['id']}" data-start="{seg['start']}" data-end="{seg['end']}">
-                <a href="#" class="timestamp" onclick="seekTo({seg['start']}); return false;">{seg['timestamp']}</a>
-                <span>{seg['text']}</span>
-            </div>
-            """
+        segments_json = load_transcript_view(
+            str(video['_id']), str(transcript_doc['_id']), transcript_doc)
+        try:
+            captions = load_captions(video['filename'], str(transcript_doc['_id']), transcript_doc)
+        except Exception as e:
+            # Captions are an extra; the player and transcript panel work without them
+            print(f"⚠️ Captions unavailable: {e}")
+            captions = None
+        captions_vtt = json.dumps(captions['vtt'] if captions else None).replace("</", "<\\/")
+        # A seek applies to one render; later reruns must not jump back to it
+        seek_to = st.session_state.pop('seek_to', None) or {}
+        start_at = seek_to.get('time') if seek_to.get('video_id') == str(video['_id']) else None
+        hls_script = f'<script src="{config.HLS_JS_URL}"></script>'
+        if config.HLS_JS_INTEGRITY:
+            hls_script = (f'<script src="{config.HLS_JS_URL}" integrity="{config.HLS_JS_INTEGRITY}" '
+                          f'crossorigin="anonymous"></script>')
 
         # NOTE: We add a page-wide wrapper and CSS to let it fill available width inside the iframe.
         html_content = f"""
@@ -354,17 +423,26 @@ def display_interactive_player_and_transcript(video):
                     background-color: #f0f2f6;
                     border: 1px solid #ddd;
                     border-radius: 5px;
-                    padding: 15px;
+                    padding: 0 15px;
                     height: 400px;
                     overflow-y: auto;
                     font-family: monospace;
                     font-size: 14px;
                     line-height: 1.6;
                 }}
+                .transcript-spacer {{
+                    position: relative;
+                }}
+                .transcript-rows {{
+                    position: absolute;
+                    left: 0; right: 0;
+                }}
                 .segment {{
                     padding: 5px;
                     border-radius: 3px;
-                    margin-bottom: 5px;
+                    /* A transparent border rather than a margin, so measured row heights include the gap */
+                    border-bottom: 5px solid transparent;
+                    background-clip: padding-box;
                     transition: background-color 0.3s;
                 }}
                 .timestamp {{
@@ -376,55 +454,197 @@ def display_interactive_player_and_transcript(video):
                 .segment.highlight {{
                     background-color: #FFFF99;
                 }}
+                .ttff {{
+                    font-family: sans-serif;
+                    font-size: 12px;
+                    color: #888;
+                    margin-top: 4px;
+                }}
             </style>
+            {hls_script}
             
             <div class="page-wrap">
                 <div class="player-container">
                     <div class="video-wrapper">
-                        <video id="video-player" controls>
+                        <video id="video-player" controls playsinline preload="auto">
                             <source src="{video_url}" type="video/mp4">
                             Your browser does not support the video tag.
                         </video>
+                        <div class="ttff" id="ttff"></div>
                     </div>
                     <div class="transcript-wrapper">
                         <div class="transcript-box" id="transcript-container">
-                            {transcript_html}
+                            <div class="transcript-spacer" id="transcript-spacer">
+                                <div class="transcript-rows" id="transcript-rows"></div>
+                            </div>
                         </div>
                     </div>
                 </div>
             </div>
 
             <script>
+                const loadStart = performance.now();
                 const video = document.getElementById('video-player');
                 const transcriptContainer = document.getElementById('transcript-container');
-                const segments = document.querySelectorAll('.segment');
+                const spacer = document.getElementById('transcript-spacer');
+                const rowsBox = document.getElementById('transcript-rows');
+                // [start, end, timestamp, text] per segment, sorted by start
+                const rows = {segments_json};
+                const hlsLadder = {json.dumps(source['hls'])};
+                const captionsVtt = {captions_vtt};
+                const startAt = {json.dumps(start_at)};
+
+                // Opened from a transcript search hit: start at the matching moment
+                if (startAt !== null) {{
+                    video.addEventListener('loadedmetadata', function() {{
+                        video.currentTime = startAt;
+                        video.play().catch(() => {{}});
+                    }}, {{ once: true }});
+                }}
+
+                // Native caption track; served as a blob URL since the iframe cannot load
+                // a cross-origin track without CORS on the bucket
+                if (captionsVtt) {{
+                    const track = document.createElement('track');
+                    track.kind = 'captions';
+                    track.label = 'Transcript';
+                    track.src = URL.createObjectURL(new Blob([captionsVtt], {{ type: 'text/vtt' }}));
+                    video.appendChild(track);
+                }}
+
+                // Time to first frame: 'loadeddata' fires once the first frame can be shown
+                video.addEventListener('loadeddata', function() {{
+                    const ttff = performance.now() - loadStart;
+                    document.getElementById('ttff').textContent =
+                        `First frame in ${{Math.round(ttff)}} ms (${{hlsLadder && window.Hls && Hls.isSupported() ? 'HLS' : 'MP4'}})`;
+                    console.log('time-to-first-frame-ms', ttff);
+                }}, {{ once: true }});
+
+                if (hlsLadder && window.Hls && Hls.isSupported()) {{
+                    // Playlists carry presigned segment URLs; serve them to hls.js as blob URLs
+                    const toBlobUrl = text => URL.createObjectURL(
+                        new Blob([text], {{ type: 'application/vnd.apple.mpegurl' }}));
+                    const master = hlsLadder.master.split('\\n').map(
+                        line => hlsLadder.variants[line] !== undefined ? toBlobUrl(hlsLadder.variants[line]) : line
+                    ).join('\\n');
+                    const hls = new Hls();
+                    hls.loadSource(toBlobUrl(master));
+                    hls.attachMedia(video);
+                }}
 
                 function seekTo(time) {{
                     video.currentTime = time;
                     video.play();
                 }}
 
-                video.addEventListener('timeupdate', function() {{
-                    const currentTime = video.currentTime;
-                    let activeSegment = null;
+                // Virtualized panel: only rows in (or near) view are in the DOM. Row heights
+                // start as an estimate and are replaced by measurements once rendered.
+                const OVERSCAN = 10;
+                const ESTIMATED_ROW_HEIGHT = 42;
+                const heights = new Float64Array(rows.length).fill(ESTIMATED_ROW_HEIGHT);
+                const offsets = new Float64Array(rows.length + 1);
+                const rendered = new Map();
+                let firstRendered = -1, lastRendered = -1;
+                let activeIndex = -1;
+
+                function updateOffsets(from) {{
+                    for (let i = from; i < rows.length; i++) offsets[i + 1] = offsets[i] + heights[i];
+                    spacer.style.height = offsets[rows.length] + 'px';
+                }}
 
-                    segments.forEach(segment => {{
-                        const start = parseFloat(segment.dataset.start);
-                        const end = parseFloat(segment.dataset.end);
-                        
-                        if (currentTime >= start && currentTime < end) {{
-                            segment.classList.add('highlight');
-                            activeSegment = segment;
-                        }} else {{
-                            segment.classList.remove('highlight');
+                // Binary search: last index whose value is <= target (values ascending), or -1
+                function lastAtOrBefore(valueAt, target, length) {{
+                    let lo = 0, hi = length - 1, found = -1;
+                    while (lo <= hi) {{
+                        const mid = (lo + hi) >> 1;
+                        if (valueAt(mid) <= target) {{ found = mid; lo = mid + 1; }} else {{ hi = mid - 1; }}
+                    }}
+                    return found;
+                }}
+
+                function rowAtOffset(y) {{
+                    return Math.max(0, lastAtOrBefore(i => offsets[i], y, rows.length));
+                }}
+
+                function renderRows(force) {{
+                    if (!rows.length) return;
+                    const top = transcriptContainer.scrollTop;
+                    const first = Math.max(0, rowAtOffset(top) - OVERSCAN);
+                    const last = Math.min(rows.length - 1,
+                        rowAtOffset(top + transcriptContainer.clientHeight) + OVERSCAN);
+                    if (!force && first === firstRendered && last === lastRendered) return;
+
+                    const fragment = document.createDocumentFragment();
+                    rendered.clear();
+                    for (let i = first; i <= last; i++) {{
+                        const row = document.createElement('div');
+                        row.className = i === activeIndex ? 'segment highlight' : 'segment';
+                        row.dataset.index = i;
+                        const link = document.createElement('a');
+                        link.href = '#';
+                        link.className = 'timestamp';
+                        link.textContent = rows[i][2];
+                        const text = document.createElement('span');
+                        text.textContent = rows[i][3];
+                        row.append(link, text);
+                        fragment.appendChild(row);
+                        rendered.set(i, row);
+                    }}
+                    rowsBox.replaceChildren(fragment);
+                    firstRendered = first;
+                    lastRendered = last;
+
+                    // Swap estimates for measured heights, then place the rows
+                    let changedFrom = -1;
+                    rendered.forEach((row, i) => {{
+                        const height = row.offsetHeight;
+                        if (height && height !== heights[i]) {{
+                            heights[i] = height;
+                            if (changedFrom < 0) changedFrom = i;
                         }}
                     }});
+                    if (changedFrom >= 0) updateOffsets(changedFrom);
+                    rowsBox.style.top = offsets[first] + 'px';
+                }}
 
-                    if (activeSegment) {{
-                        const containerRect = transcriptContainer.getBoundingClientRect();
-                        const segmentRect = activeSegment.getBoundingClientRect();
-                        if (segmentRect.bottom > containerRect.bottom || segmentRect.top < containerRect.top) {{
-                            activeSegment.scrollIntoView({{ behavior: 'smooth', block: 'center' }});
+                rowsBox.addEventListener('click', function(event) {{
+                    const link = event.target.closest('.timestamp');
+                    if (!link) return;
+                    event.preventDefault();
+                    seekTo(rows[link.parentElement.dataset.index][0]);
+                }});
+
+                let scrollPending = false;
+                transcriptContainer.addEventListener('scroll', function() {{
+                    if (scrollPending) return;
+                    scrollPending = true;
+                    requestAnimationFrame(() => {{ scrollPending = false; renderRows(false); }});
+                }});
+
+                updateOffsets(0);
+                renderRows(true);
+
+                video.addEventListener('timeupdate', function() {{
+                    const currentTime = video.currentTime;
+                    let index = lastAtOrBefore(i => rows[i][0], currentTime, rows.length);
+                    if (index >= 0 && currentTime >= rows[index][1]) index = -1;
+                    if (index === activeIndex) return;
+
+                    // Only the previous and the new active rows change
+                    const previous = rendered.get(activeIndex);
+                    if (previous) previous.classList.remove('highlight');
+                    activeIndex = index;
+                    const current = rendered.get(index);
+                    if (current) current.classList.add('highlight');
+
+                    if (index >= 0) {{
+                        const viewTop = transcriptContainer.scrollTop;
+                        const viewBottom = viewTop + transcriptContainer.clientHeight;
+                        if (offsets[index] < viewTop || offsets[index + 1] > viewBottom) {{
+                            transcriptContainer.scrollTo({{
+                                top: offsets[index] - (transcriptContainer.clientHeight - heights[index]) / 2,
+                                behavior: 'smooth'
+                            }});
                         }}
                     }}
                 }});
@@ -441,16 +661,23 @@ def display_interactive_player_and_transcript(video):
                 width=1600,       # <-- important: wider than default (~700px)
                 scrolling=True
             )
+            if captions:
+                st.link_button("📥 Download subtitles (SRT)",
+                               services['s3'].get_presigned_url(captions['srt_key']))
+            display_transcript_search(video, transcript_doc)
 
     except Exception as e:
         st.error(f"An error occurred: {e}")
 
 def display_summary_tab(video):
     try:
-        summary_doc = services['db'].get_summary(str(video['_id']))
+        summary_doc = video.get('summary_doc')
         if summary_doc:
             summary = summary_doc['summary']
             st.subheader("📋 AI-Generated Summary")
+            if summary_doc.get('version', 1) > 1:
+                st.caption(f"Version {summary_doc['version']}"
+                           + (f" · {summary_doc['model']}" if summary_doc.get('model') else ""))
             st.markdown("---")
             st.markdown(summary)
             st.download_button(
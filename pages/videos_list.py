@@ -1,16 +1,15 @@
 import streamlit as st
+import hashlib
 import os
+import subprocess
+import sys
 import tempfile
-from datetime import datetime
-from database import Database
-from s3_storage import S3Storage
-from transcription import TranscriptionService
-from ai_services import AIServices
+from pipeline import VIDEO_STATUS_LABELS
+from metrics import span
+from services import get_services
+from transcript import time_str_to_seconds
 import config
 
-# Import PyTorch compatibility fix
-import utils
-
 # Page configuration
 st.set_page_config(
     page_title="Videos List - Video Transcriber",
@@ -19,20 +18,35 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Initialize services
 @st.cache_resource
-def init_services():
-    return {
-        'db': Database(),
-        's3': S3Storage(),
-        'transcription': TranscriptionService(),
-        'ai': AIServices()
-    }
+def start_embedded_workers():
+    """Start background worker processes alongside the app (once per server)"""
+    if config.EMBEDDED_WORKERS <= 0:
+        return None
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    return subprocess.Popen(
+        [sys.executable, os.path.join(root, "worker.py"), "--processes", str(config.EMBEDDED_WORKERS)],
+        cwd=root
+    )
 
-services = init_services()
+# Shared services, built on first use
+services = get_services()
+start_embedded_workers()
+
+# Copy uploads to disk in 8 MB blocks instead of materialising the whole file again
+UPLOAD_COPY_CHUNK = 8 * 1024 * 1024
+
+def _copy_upload_to_file(uploaded_file, dest):
+    """Copy the upload to dest in blocks, returning its SHA-256 digest"""
+    hasher = hashlib.sha256()
+    uploaded_file.seek(0)
+    for block in iter(lambda: uploaded_file.read(UPLOAD_COPY_CHUNK), b''):
+        hasher.update(block)
+        dest.write(block)
+    return hasher.hexdigest()
 
 def upload_video():
-    """Handle video upload and processing"""
+    """Handle video upload and queue it for background processing"""
     st.subheader("📤 Upload New Video")
     
     with st.form("upload_form"):
@@ -56,133 +70,208 @@ def upload_video():
                 return
             
             try:
-                # Show progress
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                # Save uploaded file temporarily
-                status_text.text("Saving uploaded file...")
-                progress_bar.progress(10)
-                
-                with tempfile.NamedTemporaryFile(delete=False, suffix=os.path.splitext(uploaded_file.name)[1]) as tmp_file:
-                    tmp_file.write(uploaded_file.getvalue())
-                    temp_path = tmp_file.name
-                
-                # Upload to S3
-                status_text.text("Uploading to cloud storage...")
-                progress_bar.progress(30)
-                
-                filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uploaded_file.name}"
-                s3_url = services['s3'].upload_video(temp_path, filename)
-                
-                # Get video duration
-                status_text.text("Getting video information...")
-                progress_bar.progress(50)
-                
-                duration = services['transcription'].get_video_duration(temp_path)
-                
-                # Save to database
-                status_text.text("Saving to database...")
-                progress_bar.progress(70)
-                
-                video_id = services['db'].save_video(title, filename, s3_url, duration)
-                
-                # Start transcription
-                status_text.text("Transcribing video (this may take a while)...")
-                progress_bar.progress(80)
-                
-                transcript_result = services['transcription'].transcribe_video(temp_path)
+                # Spool the upload where the workers can read it
+                os.makedirs(config.UPLOAD_SPOOL_DIR, exist_ok=True)
+                with tempfile.NamedTemporaryFile(
+                    delete=False,
+                    dir=config.UPLOAD_SPOOL_DIR,
+                    suffix=os.path.splitext(uploaded_file.name)[1]
+                ) as spool_file:
+                    digest = _copy_upload_to_file(uploaded_file, spool_file)
+                    spool_path = spool_file.name
                 
-                # Save transcript
-                services['db'].save_transcript(video_id, transcript_result)
+                services['jobs'].enqueue("ingest", {
+                    "title": title,
+                    "spool_path": spool_path,
+                    "original_name": uploaded_file.name,
+                    "digest": digest
+                })
                 
-                # Generate summary
-                status_text.text("Generating AI summary...")
-                progress_bar.progress(90)
-                
-                summary = services['ai'].generate_summary(transcript_result)
-                services['db'].save_summary(video_id, summary)
-                
-                # Update status
-                services['db'].update_video_status(video_id, 'processed')
-                
-                # Clean up temporary file (moved to after all processing)
-                if os.path.exists(temp_path):
-                    os.unlink(temp_path)
-                
-                progress_bar.progress(100)
-                status_text.text("✅ Video uploaded and processed successfully!")
-                
-                st.success(f"🎉 Video '{title}' has been uploaded and processed successfully!")
-                st.balloons()
-                
-                # Auto-refresh after 2 seconds
-                st.rerun()
+                st.success(f"🎉 Video '{title}' has been queued for processing. "
+                           f"You can follow its progress in the Video List tab.")
                 
             except Exception as e:
-                st.error(f"❌ Error processing video: {str(e)}")
-                # Clean up temp file if it exists
-                if 'temp_path' in locals():
+                st.error(f"❌ Error queuing video: {str(e)}")
+                # Clean up spool file if it exists
+                if 'spool_path' in locals():
                     try:
-                        os.unlink(temp_path)
+                        os.unlink(spool_path)
                     except:
                         pass
 
-def display_videos():
-    """Display list of uploaded videos"""
-    st.subheader("📺 Your Videos")
+def display_jobs():
+    """Show live status of queued and running processing jobs"""
+    try:
+        jobs = services['jobs'].list_jobs(limit=10, statuses=["queued", "running", "failed"])
+    except Exception as e:
+        st.caption(f"Job status unavailable: {e}")
+        return
+    
+    if not jobs:
+        return
     
+    st.markdown("#### ⚙️ Processing Jobs")
+    for job in jobs:
+        col1, col2 = st.columns([3, 2])
+        with col1:
+            st.write(f"**{job['payload']['title']}**")
+            if job['status'] == 'failed':
+                st.error(f"❌ Failed after {job['attempts']} attempt(s): {job.get('error')}")
+            elif job['status'] == 'queued' and job['attempts'] > 0:
+                st.warning(f"🔁 Retrying (attempt {job['attempts'] + 1}) — last error: {job.get('error')}")
+            else:
+                st.caption(job.get('stage') or "Queued")
+        with col2:
+            st.progress(min(int(job.get('progress') or 0), 100))
+
+# Re-render the job panel on a timer where the running Streamlit supports fragments
+if hasattr(st, "fragment"):
+    display_jobs = st.fragment(run_every=5)(display_jobs)
+
+def _videos_with_active_jobs(video_ids):
+    """Those of video_ids that a queued or running job is already working on"""
     try:
-        videos = services['db'].get_all_videos()
+        jobs = services['jobs'].list_jobs(limit=None, statuses=["queued", "running"], video_ids=video_ids)
+    except Exception:
+        return set()
+    return {
+        job['payload'].get('video_id') or (job.get('state') or {}).get('video_id')
+        for job in jobs
+    }
+
+def _video_row(video, active_video_ids):
+    """One row of the videos list; widget keys use the video id so they survive filtering and paging"""
+    video_id = str(video['_id'])
+    with st.container():
+        st.markdown("---")
+        col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
+        
+        with col1:
+            st.write(f"**{video['title']}**")
+            st.caption(f"📅 Uploaded: {video['upload_date'].strftime('%Y-%m-%d %H:%M')}")
+            if video.get('duration'):
+                st.caption(f"⏱️ Duration: {int(video['duration']//60)}:{int(video['duration']%60):02d}")
+        
+        with col2:
+            status = video.get('status', 'uploaded')
+            if status == 'processed':
+                st.success("✅ Processed")
+            elif video_id in active_video_ids:
+                st.warning(f"⏳ Processing ({VIDEO_STATUS_LABELS.get(status, status)})")
+            else:
+                st.warning(f"⏸️ Stopped at: {VIDEO_STATUS_LABELS.get(status, status)}")
+                if st.button("🔁 Resume", key=f"resume_{video_id}"):
+                    services['jobs'].enqueue("resume", {
+                        "title": video['title'],
+                        "video_id": video_id
+                    })
+                    st.rerun()
         
-        if not videos:
-            st.info("📝 No videos uploaded yet. Upload your first video above!")
-            return
+        with col3:
+            st.caption(f"📁 {video['filename']}")
         
+        with col4:
+            if st.button("▶️ Play", key=f"play_{video_id}"):
+                st.session_state.selected_video_id = video_id
+                st.switch_page("pages/play_video.py")
+
+TRANSCRIPT_HITS_SHOWN = 20
+
+def display_transcript_hits(query):
+    """Transcript lines across the library matching query; a hit opens the video at that line"""
+    with span("render.transcript_search") as record:
+        hits = services['db'].search_transcripts(query, limit=TRANSCRIPT_HITS_SHOWN)
+        record["hits"] = len(hits)
+    
+    st.markdown("#### 🔎 Transcript matches")
+    if not hits:
+        st.caption("No transcript lines match.")
+        return
+    
+    titles = {}
+    for i, hit in enumerate(hits):
+        video_id = hit['video_id']
+        if video_id not in titles:
+            video = services['db'].get_video_by_id(video_id)
+            titles[video_id] = video['title'] if video else None
+        if titles[video_id] is None:
+            continue
+        col1, col2 = st.columns([5, 1])
+        with col1:
+            st.markdown(f"**{titles[video_id]}** `{hit['timestamp']}` {hit['text']}")
+        with col2:
+            if st.button("▶️ Play here", key=f"transcript_hit_{i}_{video_id}"):
+                start = hit['timestamp'].strip('[]').split(' - ')[0]
+                st.session_state.selected_video_id = video_id
+                st.session_state.seek_to = {"video_id": video_id, "time": time_str_to_seconds(start)}
+                st.switch_page("pages/play_video.py")
+
+def display_videos():
+    """Display one page of uploaded videos"""
+    st.subheader("📺 Your Videos")
+    
+    display_jobs()
+    
+    try:
         # Search and filter
         col1, col2 = st.columns([3, 1])
         with col1:
             search_term = st.text_input("🔍 Search videos", placeholder="Search by title...")
         with col2:
-            status_filter = st.selectbox("Status", ["All", "Uploaded", "Processed"])
+            status_filter = st.selectbox("Status", ["All", "Processed", "Unfinished"])
+        search_transcripts = st.checkbox("Also search what is said in the videos")
         
-        # Filter videos
-        filtered_videos = videos
-        if search_term:
-            filtered_videos = [v for v in filtered_videos if search_term.lower() in v['title'].lower()]
-        if status_filter != "All":
-            filtered_videos = [v for v in filtered_videos if v.get('status', 'uploaded') == status_filter.lower()]
+        if search_transcripts and search_term.strip():
+            display_transcript_hits(search_term.strip())
         
-        if not filtered_videos:
-            st.info("No videos match your search criteria.")
-            return
+        # Back to the first page whenever the filters change
+        filters = (search_term.strip(), status_filter)
+        if st.session_state.get('video_list_filters') != filters:
+            st.session_state.video_list_filters = filters
+            st.session_state.video_list_page = 0
+        page = st.session_state.get('video_list_page', 0)
+        page_size = config.VIDEO_LIST_PAGE_SIZE
         
-        # Display videos
-        for i, video in enumerate(filtered_videos):
-            with st.container():
-                st.markdown("---")
-                col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
-                
-                with col1:
-                    st.write(f"**{video['title']}**")
-                    st.caption(f"📅 Uploaded: {video['upload_date'].strftime('%Y-%m-%d %H:%M')}")
-                    if video.get('duration'):
-                        st.caption(f"⏱️ Duration: {int(video['duration']//60)}:{int(video['duration']%60):02d}")
-                
-                with col2:
-                    status = video.get('status', 'uploaded')
-                    if status == 'processed':
-                        st.success("✅ Processed")
-                    else:
-                        st.warning("⏳ Processing")
-                
-                with col3:
-                    st.caption(f"📁 {video['filename']}")
-                
-                with col4:
-                    if st.button("▶️ Play", key=f"play_{i}"):
-                        st.session_state.selected_video_id = str(video['_id'])
-                        st.switch_page("pages/play_video.py")
+        with span("render.video_list", page=page) as record:
+            result = services['db'].list_videos(
+                search=filters[0] or None,
+                processed={"All": None, "Processed": True, "Unfinished": False}[status_filter],
+                offset=page * page_size,
+                limit=page_size
+            )
+            videos, total = result['videos'], result['total']
+            record["rows"] = len(videos)
+            
+            if not videos and page > 0:
+                # The list shrank under the current page
+                st.session_state.video_list_page = 0
+                st.rerun()
+            if not videos:
+                if filters == ("", "All"):
+                    st.info("📝 No videos uploaded yet. Upload your first video above!")
+                else:
+                    st.info("No videos match your search criteria.")
+                return
+            
+            active_video_ids = _videos_with_active_jobs([str(video['_id']) for video in videos])
+            for video in videos:
+                _video_row(video, active_video_ids)
+        
+        # Pagination
+        pages = (total + page_size - 1) // page_size
+        st.markdown("---")
+        col1, col2, col3 = st.columns([1, 3, 1])
+        with col1:
+            if st.button("◀ Previous", key="video_list_prev", disabled=page == 0):
+                st.session_state.video_list_page = page - 1
+                st.rerun()
+        with col2:
+            st.caption(f"Page {page + 1} of {pages} · {total} video(s) · "
+                       f"rendered in {record['seconds'] * 1000:.0f} ms")
+        with col3:
+            if st.button("Next ▶", key="video_list_next", disabled=page + 1 >= pages):
+                st.session_state.video_list_page = page + 1
+                st.rerun()
                         
     except Exception as e:
         st.error(f"❌ Error loading videos: {str(e)}")
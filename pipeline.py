@@ -0,0 +1,371 @@
+"""
+Video ingestion pipeline shared by the background workers and batch tools
+
+The pipeline is a small dependency graph of stages. StageExecutor starts
+every stage as soon as the stages it depends on have finished, so
+independent work overlaps: the S3 upload runs alongside audio extraction
+and Whisper, which only need the local file.
+
+Every stage records what it produced in a state dict through the checkpoint
+callback, so a retried job skips the stages that already finished. The video
+document's status also advances through VIDEO_STATUSES as work is persisted,
+and resume() rebuilds that state from the stored artifacts, so a video whose
+job gave up can be finished later without repeating completed work.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+
+import config
+import metrics
+from transcript import build_index, parse_segments
+
+# Checkpoint statuses of a video document, in pipeline order
+VIDEO_STATUSES = ("uploaded", "audio_extracted", "transcribed", "summarized", "processed")
+
+VIDEO_STATUS_LABELS = {
+    "uploaded": "Uploaded",
+    "audio_extracted": "Audio extracted",
+    "transcribed": "Transcribed",
+    "summarized": "Summarized",
+    "processed": "Processed",
+}
+
+
+class Stage:
+    def __init__(self, name, fn, deps=(), label=None):
+        self.name = name
+        self.fn = fn
+        self.deps = tuple(deps)
+        self.label = label or name
+
+
+class StageExecutor:
+    """Runs a DAG of stages on a thread pool, each as soon as its dependencies finish"""
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+
+    def run(self, stages, on_start=None, on_failure=None, results=None):
+        """Run all stages; returns (results, timings)
+
+        results maps stage name to the stage function's return value (pass a
+        dict to have it filled in place, e.g. to clean up after a failure), and
+        timings maps stage name to {"start": offset_s, "seconds": duration_s}.
+
+        After the first stage failure no further stage starts, including ones
+        already queued on the pool. on_failure(stage, error, running_stages)
+        is called straight away with the stages still executing, then the
+        failure is re-raised once those have returned, so none of them
+        outlives the attempt that started them.
+        """
+        by_name = {stage.name: stage for stage in stages}
+        for stage in stages:
+            missing = [dep for dep in stage.deps if dep not in by_name]
+            if missing:
+                raise Exception(f"Stage '{stage.name}' depends on unknown stage(s): {', '.join(missing)}")
+
+        results = {} if results is None else results
+        timings = {}
+        pending = dict(by_name)
+        running = {}
+        origin = time.perf_counter()
+        lock = threading.Lock()
+        stopping = threading.Event()
+        executing = set()
+
+        def _timed(stage):
+            with lock:
+                if stopping.is_set():
+                    # Queued before a failure; its result is never used
+                    return None
+                executing.add(stage.name)
+            start = time.perf_counter()
+            try:
+                return stage.fn(results)
+            except BaseException:
+                # Set here, before this pool thread can pick up a queued stage
+                stopping.set()
+                raise
+            finally:
+                with lock:
+                    executing.discard(stage.name)
+                    timings[stage.name] = {
+                        "start": start - origin,
+                        "seconds": time.perf_counter() - start
+                    }
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+            while pending or running:
+                ready = [s for s in pending.values() if all(dep in results for dep in s.deps)]
+                for stage in ready:
+                    del pending[stage.name]
+                    if on_start:
+                        on_start(stage, len(results), len(by_name))
+                    running[pool.submit(_timed, stage)] = stage
+
+                if not running:
+                    raise Exception(f"Stage graph has a cycle involving: {', '.join(pending)}")
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        if on_failure:
+                            with lock:
+                                in_flight = [by_name[name] for name in executing]
+                            on_failure(stage, error, in_flight)
+                        wait(running)
+                        raise error
+                    results[stage.name] = future.result()
+
+        return results, timings
+
+
+class IngestionPipeline:
+    def __init__(self, services):
+        self.db = services['db']
+        self.s3 = services['s3']
+        self.transcription = services['transcription']
+        self.transcode = services['transcode']
+        self.ai = services['ai']
+        self.executor = StageExecutor(max_workers=config.PIPELINE_MAX_PARALLEL_STAGES)
+
+    def advance_status(self, video_id, status):
+        """Move a video's status forward to status; a video already at or past it is left alone"""
+        return self.db.update_video_status(video_id, status, unless=VIDEO_STATUSES[VIDEO_STATUSES.index(status):])
+
+    def build_stages(self, title, source_path, original_name, digest, state, save, report):
+        """Describe the ingestion stages and their dependencies"""
+
+        def upload(results):
+            if 's3_url' in state:
+                return state['s3_url']
+            size = os.path.getsize(source_path)
+
+            def upload_progress(sent_bytes, total_bytes):
+                if total_bytes:
+                    report(f"Uploading to cloud storage... {sent_bytes * 100 // total_bytes}%", None)
+
+            with open(source_path, 'rb') as f:
+                if config.S3_CONTENT_ADDRESSED:
+                    filename = self.s3.content_addressed_filename(
+                        digest or self.s3.hash_file(source_path), original_name)
+                    s3_url, _ = self.s3.upload_video_deduplicated(
+                        f, filename, self.db, size=size, progress_callback=upload_progress)
+                else:
+                    filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{original_name}"
+                    s3_url = self.s3.upload_video_fileobj(
+                        f, filename, size=size, progress_callback=upload_progress)
+            save('filename', filename)
+            save('s3_url', s3_url)
+            return s3_url
+
+        def probe(results):
+            if 'video_id' in state:
+                return None
+            return self.transcription.get_video_duration(source_path)
+
+        def save_video(results):
+            if 'video_id' not in state:
+                save('video_id', self.db.save_video(
+                    title, state['filename'], state['s3_url'], results['probe'], digest=digest))
+            return state['video_id']
+
+        def extract_audio(results):
+            if 'audio_key' in state:
+                # Already stored; transcription reads it back from S3 if still needed
+                return None
+            return self.transcription.create_audio_derivative(source_path)
+
+        def store_audio(results):
+            if 'audio_key' not in state:
+                audio_key = self.s3.upload_audio(results['extract_audio'], state['filename'])
+                self.db.set_audio_key(results['save_video'], audio_key)
+                save('audio_key', audio_key)
+            self.advance_status(results['save_video'], 'audio_extracted')
+            return state['audio_key']
+
+        def transcribe(results):
+            if state.get('transcribed'):
+                return None
+            if results['extract_audio'] is None:
+                return self.transcription.transcribe_from_s3(self.s3, state['audio_key'])
+            return self.transcription.transcribe_audio(results['extract_audio'])
+
+        def save_transcript(results):
+            if not state.get('transcribed'):
+                transcript_id = self.db.save_transcript(results['save_video'], results['transcribe'])
+                save('transcribed', True)
+            else:
+                transcript_id = self.db.get_transcript(results['save_video'])['_id']
+            self.advance_status(results['save_video'], 'transcribed')
+            return str(transcript_id)
+
+        def index_transcript(results):
+            # Cheap to rebuild, so a resumed video always gets an index matching its transcript
+            index = self.db.get_transcript_index(results['save_video'])
+            if index and index['transcript_id'] == results['save_transcript']:
+                return
+            transcript = results['transcribe']
+            if transcript is None:
+                transcript = self.db.get_transcript(results['save_video'])['transcript']
+            self.db.save_transcript_index(
+                results['save_video'], results['save_transcript'], build_index(parse_segments(transcript)))
+
+        def summarize(results):
+            if state.get('summarized'):
+                return None
+            transcript = results['transcribe']
+            if transcript is None:
+                transcript = self.db.get_transcript(results['save_video'])['transcript']
+            return self.ai.generate_summary(transcript)
+
+        def save_summary(results):
+            if not state.get('summarized'):
+                self.db.save_summary(results['save_video'], results['summarize'], model=self.ai.model_name)
+                save('summarized', True)
+            self.advance_status(results['save_video'], 'summarized')
+
+        def renditions(results):
+            if not config.ENABLE_RENDITIONS or 'renditions' in state:
+                return state.get('renditions')
+            # Renditions only speed up playback, so a failure (e.g. an audio-only upload)
+            # leaves the video playing from the original file instead of failing the job
+            output = None
+            try:
+                output = self.transcode.create_renditions(source_path)
+                rendition_keys = self.s3.upload_renditions(state['filename'], output)
+                self.db.set_renditions(results['save_video'], rendition_keys)
+                save('renditions', rendition_keys)
+                return rendition_keys
+            except Exception as e:
+                print(f"⚠️ Renditions failed for '{title}', playing the original upload: {e}")
+                save('renditions_error', str(e))
+                return None
+            finally:
+                if output:
+                    self.transcode.cleanup(output['dir'])
+
+        return [
+            Stage('upload', upload, label="Uploading to cloud storage"),
+            Stage('probe', probe, label="Getting video information"),
+            Stage('extract_audio', extract_audio, label="Extracting audio"),
+            Stage('save_video', save_video, deps=['upload', 'probe'], label="Saving to database"),
+            Stage('store_audio', store_audio, deps=['extract_audio', 'save_video'], label="Storing audio"),
+            Stage('transcribe', transcribe, deps=['extract_audio'], label="Transcribing video"),
+            # After store_audio, so a fresh video passes through the statuses in order
+            Stage('save_transcript', save_transcript, deps=['transcribe', 'store_audio'], label="Saving transcript"),
+            Stage('index_transcript', index_transcript, deps=['save_transcript'], label="Indexing transcript"),
+            Stage('summarize', summarize, deps=['save_transcript'], label="Generating AI summary"),
+            Stage('save_summary', save_summary, deps=['summarize'], label="Saving summary"),
+            Stage('renditions', renditions, deps=['save_video'], label="Preparing playback renditions"),
+        ]
+
+    def run(self, title, source_path, original_name, digest=None,
+            state=None, checkpoint=None, progress=None):
+        """Process one video file and return its video id
+
+        state holds outputs of stages completed by an earlier attempt.
+        checkpoint(key, value) is called whenever a stage output should be
+        persisted, and progress(stage_text, percent) reports progress
+        (percent is None for updates within a stage).
+        """
+        state = dict(state or {})
+
+        def save(key, value):
+            state[key] = value
+            if checkpoint:
+                checkpoint(key, value)
+
+        def report(text, percent):
+            if progress:
+                progress(text, percent)
+
+        def on_start(stage, completed, total):
+            report(f"{stage.label}...", completed * 100 // total)
+
+        def on_failure(stage, error, running):
+            # Recorded now rather than after the running stages return, which can take minutes
+            save('failed_stage', {"stage": stage.name, "error": str(error)})
+            text = f"❌ {stage.label} failed: {error}"
+            if running:
+                text += f" (stopping after {', '.join(s.label.lower() for s in running)})"
+            report(text, len(results) * 100 // len(stages))
+
+        stages = self.build_stages(title, source_path, original_name, digest, state, save, report)
+        start = time.perf_counter()
+        results = {}
+        try:
+            _, timings = self.executor.run(stages, on_start=on_start, on_failure=on_failure, results=results)
+        finally:
+            audio_path = results.get('extract_audio')
+            if audio_path and os.path.exists(audio_path):
+                os.unlink(audio_path)
+
+        video_id = results['save_video']
+        self.advance_status(video_id, 'processed')
+
+        timings['total'] = {"start": 0.0, "seconds": time.perf_counter() - start}
+        save('stage_timings', timings)
+        if state.get('failed_stage'):
+            # Left by an earlier attempt that this one has recovered from
+            save('failed_stage', None)
+        # Stage spans, normalised by the video's length so long and short videos compare
+        duration = results.get('probe') or state.get('duration')
+        for name, timing in timings.items():
+            metrics.observe({
+                "name": f"pipeline.{name}",
+                "ts": time.time(),
+                "seconds": timing["seconds"],
+                "media_seconds": duration
+            })
+        print(f"⏱️ Processed '{title}' in {timings['total']['seconds']:.1f}s: " + ", ".join(
+            f"{name} {t['seconds']:.1f}s" for name, t in timings.items() if name != 'total'))
+        report("✅ Video processed successfully!", 100)
+        return video_id
+
+    def resume_state(self, video):
+        """Rebuild pipeline state for a stored video from its persisted artifacts"""
+        video_id = str(video['_id'])
+        state = {
+            'video_id': video_id,
+            'filename': video['filename'],
+            's3_url': video['s3_url'],
+            'duration': video.get('duration'),
+        }
+        if video.get('audio_key'):
+            state['audio_key'] = video['audio_key']
+        if video.get('renditions'):
+            state['renditions'] = video['renditions']
+        # Check the artifacts too: a stage may have saved its output and died before the status update
+        status = video.get('status', 'uploaded')
+        rank = VIDEO_STATUSES.index(status) if status in VIDEO_STATUSES else 0
+        if rank >= VIDEO_STATUSES.index('transcribed') or self.db.get_transcript(video_id):
+            state['transcribed'] = True
+        if rank >= VIDEO_STATUSES.index('summarized') or self.db.get_summary(video_id):
+            state['summarized'] = True
+        return state
+
+    def resume(self, video_id, checkpoint=None, progress=None):
+        """Finish processing a stored video from its last completed stage
+
+        The original upload is read back from S3 through a presigned URL, and
+        only for the stages that still need it (audio extraction, renditions).
+        """
+        video = self.db.get_video_by_id(video_id)
+        if not video:
+            raise Exception(f"Video {video_id} not found")
+        if video.get('status') == 'processed':
+            print(f"ℹ️ '{video['title']}' is already processed")
+            return str(video['_id'])
+
+        state = self.resume_state(video)
+        print(f"🔁 Resuming '{video['title']}' from status '{video.get('status', 'uploaded')}'")
+        source_url = self.s3.get_video_url(video['filename'])
+        return self.run(video['title'], source_url, video['filename'],
+                        state=state, checkpoint=checkpoint, progress=progress)
@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+"""
+Batch reprocessing of videos that are already stored
+
+Usage:
+    python reprocess.py retranscribe --all
+    python reprocess.py retranscribe --video-id <id> [--video-id <id> ...]
+    python reprocess.py resume --all
+    python reprocess.py resume --video-id <id> [--video-id <id> ...]
+    python reprocess.py resummarize --all [--model <groq model>] [--label <name>] [--concurrency N]
+    python reprocess.py reindex --all
+
+Re-transcription streams each video from S3 with ranged GETs straight into
+the ffmpeg audio decoder, so neither local disk nor a full copy of the
+video is needed. The transcript search index is rebuilt with it. Resume finishes videos whose processing stopped part way,
+starting after the last stage recorded in their status.
+
+Re-summarization regenerates summaries from the stored transcripts, e.g.
+after a model or prompt change. New summaries are saved as a new version
+tagged with --label (the model name by default); videos that already have
+a summary with that label are skipped, so an interrupted run is resumed by
+running the same command again.
+
+Reindexing rebuilds the search indexes of stored transcripts without
+re-running Whisper: the per-video index used by the play page and the
+segments searched across the library. Run it once for transcripts stored
+before transcript search covered them.
+"""
+
+import argparse
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import config
+from database import create_database
+from pipeline import IngestionPipeline
+from s3_storage import S3Storage
+from transcript import build_index, parse_segments
+from transcription import TranscriptionService
+from worker import build_services
+
+
+def _select_videos(db, video_ids=None):
+    if video_ids:
+        videos = [db.get_video_by_id(video_id) for video_id in video_ids]
+        return [video for video in videos if video]
+    return db.get_all_videos()
+
+
+def retranscribe_videos(db, s3, transcription, video_ids=None):
+    """Re-transcribe stored videos from S3 and replace their transcripts"""
+    videos = _select_videos(db, video_ids)
+    done, failed = 0, 0
+    start = time.perf_counter()
+
+    for video in videos:
+        video_id = str(video['_id'])
+        try:
+            print(f"🎧 Re-transcribing '{video['title']}' ({video_id})...")
+            # Prefer the small audio derivative over demuxing the full video
+            key = video.get('audio_key') or f"videos/{video['filename']}"
+            transcript = transcription.transcribe_from_s3(s3, key)
+            transcript_id = db.replace_transcript(video_id, transcript)
+            db.save_transcript_index(video_id, transcript_id, build_index(parse_segments(transcript)))
+            done += 1
+        except Exception as e:
+            print(f"❌ {video_id}: {e}")
+            failed += 1
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Re-transcribed {done} video(s), {failed} failed, in {elapsed:.1f}s")
+    return done, failed
+
+
+def reindex_videos(db, video_ids=None):
+    """Rebuild the search indexes of stored transcripts"""
+    videos = _select_videos(db, video_ids)
+    done, failed = 0, 0
+    start = time.perf_counter()
+
+    for video in videos:
+        video_id = str(video['_id'])
+        try:
+            transcript_doc = db.get_transcript(video_id)
+            if not transcript_doc:
+                continue
+            db.index_transcript_segments(video_id, transcript_doc['transcript'])
+            db.save_transcript_index(video_id, transcript_doc['_id'],
+                                     build_index(parse_segments(transcript_doc['transcript'])))
+            done += 1
+        except Exception as e:
+            print(f"❌ {video_id}: {e}")
+            failed += 1
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Reindexed {done} transcript(s), {failed} failed, in {elapsed:.1f}s")
+    return done, failed
+
+
+def resume_videos(pipeline, db, video_ids=None):
+    """Finish processing of videos that stopped before reaching 'processed'"""
+    videos = [video for video in _select_videos(db, video_ids) if video.get('status') != 'processed']
+    done, failed = 0, 0
+    start = time.perf_counter()
+
+    for video in videos:
+        video_id = str(video['_id'])
+        try:
+            pipeline.resume(video_id)
+            done += 1
+        except Exception as e:
+            print(f"❌ {video_id}: {e}")
+            failed += 1
+
+    elapsed = time.perf_counter() - start
+    print(f"✅ Resumed {done} video(s), {failed} failed, in {elapsed:.1f}s")
+    return done, failed
+
+
+def resummarize_videos(db, ai, video_ids=None, label=None, concurrency=None):
+    """Regenerate summaries from stored transcripts as new summary versions"""
+    label = label or ai.model_name
+    videos = _select_videos(db, video_ids)
+    already_done = db.get_summarized_video_ids(label)
+    todo = [video for video in videos if str(video['_id']) not in already_done]
+    concurrency = concurrency or config.INGEST_LLM_CONCURRENCY
+    print(f"📝 Re-summarizing {len(todo)} video(s) as '{label}' "
+          f"({len(videos) - len(todo)} already done), {concurrency} at a time")
+
+    def resummarize(video):
+        # Transcripts are loaded inside the workers, so at most `concurrency` are held at once
+        video_id = str(video['_id'])
+        transcript_doc = db.get_transcript(video_id)
+        if not transcript_doc:
+            return None
+        summary = ai.generate_summary(transcript_doc['transcript'])
+        db.save_summary(video_id, summary, model=ai.model_name, label=label)
+        return len(transcript_doc['transcript'])
+
+    counts = {"done": 0, "failed": 0, "no_transcript": 0}
+    usage_before = ai.usage_snapshot()
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        futures = {pool.submit(resummarize, video): video for video in todo}
+        for future in as_completed(futures):
+            video = futures[future]
+            try:
+                outcome = "done" if future.result() is not None else "no_transcript"
+            except Exception as e:
+                outcome = "failed"
+                print(f"❌ {video['_id']}: {e}")
+            counts[outcome] += 1
+            if outcome == "done":
+                print(f"✅ [{sum(counts.values())}/{len(todo)}] {video['title']}")
+
+    elapsed = time.perf_counter() - start
+    usage = {key: value - usage_before.get(key, 0) for key, value in ai.usage_snapshot().items()}
+    report_resummarize(counts, usage, elapsed)
+    return counts
+
+
+def report_resummarize(counts, usage, elapsed):
+    hours = max(elapsed, 1e-9) / 3600
+    tokens = usage["input_tokens"] + usage["output_tokens"]
+    print(f"📊 {counts['done']} re-summarized, {counts['no_transcript']} without transcript, "
+          f"{counts['failed']} failed in {elapsed / 60:.1f} min ({counts['done'] / hours:.1f} videos/hour)")
+    print(f"   Tokens: {usage['input_tokens']} in + {usage['output_tokens']} out = {tokens} "
+          f"over {usage['calls']} call(s)"
+          + (f", {tokens / counts['done']:.0f} per video" if counts['done'] else ""))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reprocess stored videos")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    retranscribe = commands.add_parser("retranscribe", help="Re-run Whisper on stored videos")
+    target = retranscribe.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Reprocess every video")
+    target.add_argument("--video-id", action="append", dest="video_ids", help="Video to reprocess (repeatable)")
+
+    resume = commands.add_parser("resume", help="Finish videos whose processing stopped part way")
+    target = resume.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Resume every unfinished video")
+    target.add_argument("--video-id", action="append", dest="video_ids", help="Video to resume (repeatable)")
+
+    resummarize = commands.add_parser("resummarize", help="Regenerate summaries from stored transcripts")
+    target = resummarize.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Re-summarize every video")
+    target.add_argument("--video-id", action="append", dest="video_ids", help="Video to re-summarize (repeatable)")
+    resummarize.add_argument("--model", help="Groq model to switch to before summarizing")
+    resummarize.add_argument("--label", help="Version label for the new summaries (default: model name)")
+    resummarize.add_argument("--concurrency", type=int,
+                             help=f"Concurrent summary requests (default {config.INGEST_LLM_CONCURRENCY})")
+
+    reindex = commands.add_parser("reindex", help="Rebuild transcript search indexes from stored transcripts")
+    target = reindex.add_mutually_exclusive_group(required=True)
+    target.add_argument("--all", action="store_true", help="Reindex every video")
+    target.add_argument("--video-id", action="append", dest="video_ids", help="Video to reindex (repeatable)")
+
+    args = parser.parse_args()
+
+    if args.command == "resummarize":
+        from ai_services import AIServices
+        ai = AIServices()
+        if args.model and not ai.switch_groq_model(args.model):
+            sys.exit(1)
+        counts = resummarize_videos(create_database(), ai, args.video_ids, args.label, args.concurrency)
+        sys.exit(1 if counts["failed"] else 0)
+
+    if args.command == "resume":
+        services = build_services()
+        _, failed = resume_videos(IngestionPipeline(services), services['db'], args.video_ids)
+        sys.exit(1 if failed else 0)
+
+    db = create_database()
+    if args.command == "retranscribe":
+        _, failed = retranscribe_videos(db, S3Storage(), TranscriptionService(), args.video_ids)
+        sys.exit(1 if failed else 0)
+
+    if args.command == "reindex":
+        _, failed = reindex_videos(db, args.video_ids)
+        sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,33 @@
 import boto3
+import hashlib
 import os
+import queue
+import threading
+from boto3.s3.transfer import TransferConfig
 from botocore.exceptions import NoCredentialsError, ClientError
 import config
+from cache import TTLCache
+from metrics import span
+
+# Longest expiry S3 accepts for a SigV4 presigned URL
+MAX_PRESIGN_EXPIRY = 7 * 24 * 3600
+
+
+class _ProgressTracker:
+    """Accumulates boto3 transfer callbacks (called from several threads) into byte totals"""
+    
+    def __init__(self, total_bytes, callback):
+        self.total_bytes = total_bytes
+        self.callback = callback
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+    
+    def __call__(self, bytes_amount):
+        with self._lock:
+            self.sent_bytes += bytes_amount
+            sent = self.sent_bytes
+        self.callback(sent, self.total_bytes)
+
 
 class S3Storage:
     def __init__(self):
@@ -12,42 +38,376 @@ class S3Storage:
             region_name=config.AWS_REGION
         )
         self.bucket_name = config.S3_BUCKET_NAME
+        # Multipart settings for large uploads: parts are sent concurrently
+        self.transfer_config = TransferConfig(
+            multipart_threshold=config.S3_MULTIPART_PART_SIZE,
+            multipart_chunksize=config.S3_MULTIPART_PART_SIZE,
+            max_concurrency=config.S3_MAX_CONCURRENCY,
+            use_threads=True
+        )
+        # Presigned URLs are reused until S3_PRESIGN_SAFETY_MARGIN before they expire,
+        # so the browser sees a stable URL and can keep its cached video bytes
+        self.url_cache = TTLCache(
+            maxsize=config.S3_PRESIGN_CACHE_SIZE,
+            ttl=max(config.S3_PRESIGN_EXPIRY - config.S3_PRESIGN_SAFETY_MARGIN, 0)
+        )
+        self.sign_calls = 0
+        # HLS playlists rewritten with presigned segment URLs. Segments are signed for the
+        # video's duration plus S3_PRESIGN_EXPIRY, so a playlist served from here still has
+        # at least the whole video plus the safety margin left to play
+        self.playlist_cache = TTLCache(maxsize=64, ttl=self.url_cache.ttl)
     
-    def upload_video(self, file_path, filename):
+    def _video_url(self, filename):
+        return f"https://{self.bucket_name}.s3.{config.AWS_REGION}.amazonaws.com/videos/{filename}"
+    
+    def upload_video(self, file_path, filename, progress_callback=None):
         """Upload video file to S3"""
         try:
+            size = os.path.getsize(file_path)
+            callback = None
+            if progress_callback:
+                callback = _ProgressTracker(size, progress_callback)
+            with span("s3.upload_video", bytes=size):
+                self.s3_client.upload_file(
+                    file_path,
+                    self.bucket_name,
+                    f"videos/{filename}",
+                    ExtraArgs={'ContentType': 'video/mp4'},
+                    Config=self.transfer_config,
+                    Callback=callback
+                )
+            return self._video_url(filename)
+        except NoCredentialsError:
+            raise Exception("AWS credentials not found")
+        except ClientError as e:
+            raise Exception(f"Error uploading to S3: {e}")
+    
+    def upload_audio(self, file_path, video_filename):
+        """Upload the audio derivative of a video next to it; returns the object key"""
+        ext = os.path.splitext(file_path)[1]
+        key = f"audio/{os.path.splitext(video_filename)[0]}{ext}"
+        content_type = {'.ogg': 'audio/ogg', '.flac': 'audio/flac'}.get(ext, 'application/octet-stream')
+        try:
+            with span("s3.upload_audio", bytes=os.path.getsize(file_path)):
+                self.s3_client.upload_file(
+                    file_path,
+                    self.bucket_name,
+                    key,
+                    ExtraArgs={'ContentType': content_type},
+                    Config=self.transfer_config
+                )
+            return key
+        except NoCredentialsError:
+            raise Exception("AWS credentials not found")
+        except ClientError as e:
+            raise Exception(f"Error uploading audio to S3: {e}")
+    
+    def upload_renditions(self, video_filename, renditions):
+        """Upload the output of TranscodeService.create_renditions() next to the video
+        
+        Returns {"mp4": {"<height>": key}, "hls": master playlist key}.
+        """
+        prefix = f"renditions/{os.path.splitext(video_filename)[0]}"
+        content_types = {
+            '.mp4': 'video/mp4',
+            '.m3u8': 'application/vnd.apple.mpegurl',
+            '.ts': 'video/mp2t',
+        }
+        
+        def _upload(path, key, record):
+            content_type = content_types.get(os.path.splitext(path)[1], 'application/octet-stream')
             self.s3_client.upload_file(
-                file_path,
-                self.bucket_name,
-                f"videos/{filename}",
-                ExtraArgs={'ContentType': 'video/mp4'}
+                path, self.bucket_name, key,
+                ExtraArgs={'ContentType': content_type},
+                Config=self.transfer_config
             )
-            s3_url = f"https://{self.bucket_name}.s3.{config.AWS_REGION}.amazonaws.com/videos/{filename}"
-            return s3_url
+            record["bytes"] += os.path.getsize(path)
+        
+        try:
+            keys = {"mp4": {}, "hls": None}
+            with span("s3.upload_renditions", bytes=0) as record:
+                for height, path in renditions["mp4"].items():
+                    key = f"{prefix}/{height}p.mp4"
+                    _upload(path, key, record)
+                    keys["mp4"][str(height)] = key
+                
+                hls_dir = os.path.dirname(renditions["hls_master"])
+                for root, _, files in os.walk(hls_dir):
+                    for name in files:
+                        path = os.path.join(root, name)
+                        _upload(path, f"{prefix}/hls/{os.path.relpath(path, hls_dir).replace(os.sep, '/')}", record)
+            keys["hls"] = f"{prefix}/hls/master.m3u8"
+            return keys
+        except NoCredentialsError:
+            raise Exception("AWS credentials not found")
+        except ClientError as e:
+            raise Exception(f"Error uploading renditions to S3: {e}")
+    
+    def get_signed_hls(self, master_key, duration=None):
+        """Get an HLS ladder whose segment URIs are presigned
+        
+        S3 cannot sign relative playlist URIs, so the playlists are fetched and
+        rewritten here. Returns {"master": text, "variants": {uri: text}}; the
+        player turns these into blob URLs for hls.js. The player never reloads
+        these playlists, so segment URLs must outlive a full viewing: they are
+        signed for duration (seconds) on top of S3_PRESIGN_EXPIRY, or for the
+        longest expiry S3 allows when the duration is unknown.
+        """
+        cached = self.playlist_cache.get(master_key)
+        if cached is not None:
+            return cached
+        
+        def _read(key):
+            return self.s3_client.get_object(Bucket=self.bucket_name, Key=key)['Body'].read().decode('utf-8')
+        
+        expires = MAX_PRESIGN_EXPIRY
+        if duration:
+            expires = min(int(duration) + config.S3_PRESIGN_EXPIRY, MAX_PRESIGN_EXPIRY)
+        base = master_key.rsplit('/', 1)[0]
+        try:
+            master = _read(master_key)
+            variants = {}
+            for line in master.splitlines():
+                if line and not line.startswith('#'):
+                    variant_dir = f"{base}/{line.rsplit('/', 1)[0]}"
+                    rewritten = []
+                    for entry in _read(f"{base}/{line}").splitlines():
+                        if entry and not entry.startswith('#'):
+                            # Signed fresh and kept out of url_cache: a long video has
+                            # thousands of segments, which would evict every cached video URL
+                            entry = self._sign(f"{variant_dir}/{entry}", expires)
+                        rewritten.append(entry)
+                    variants[line] = "\n".join(rewritten)
+        except ClientError as e:
+            raise Exception(f"Error reading HLS playlists: {e}")
+        
+        signed = {"master": master, "variants": variants}
+        self.playlist_cache.set(master_key, signed)
+        return signed
+    
+    def get_captions(self, video_filename, version, build):
+        """Get a video's caption files for one transcript version, generating them on first use
+
+        Captions are stored under captions/<video>/<version>.vtt and .srt.
+        build() returns (vtt_text, srt_text) and is only called when they are
+        not stored yet. Returns {"vtt": text, "srt_key": key}.
+        """
+        prefix = f"captions/{os.path.splitext(video_filename)[0]}/{version}"
+        vtt_key, srt_key = f"{prefix}.vtt", f"{prefix}.srt"
+        try:
+            # The SRT is written last, so its presence means both files are complete
+            if self.object_exists(srt_key):
+                with span("s3.get_captions"):
+                    vtt = self.s3_client.get_object(
+                        Bucket=self.bucket_name, Key=vtt_key)['Body'].read().decode('utf-8')
+                return {"vtt": vtt, "srt_key": srt_key}
+
+            vtt, srt = build()
+            with span("s3.upload_captions", bytes=len(vtt) + len(srt)):
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name, Key=vtt_key, Body=vtt.encode('utf-8'),
+                    ContentType='text/vtt; charset=utf-8')
+                self.s3_client.put_object(
+                    Bucket=self.bucket_name, Key=srt_key, Body=srt.encode('utf-8'),
+                    ContentType='application/x-subrip; charset=utf-8',
+                    ContentDisposition=f'attachment; filename="{os.path.splitext(os.path.basename(video_filename))[0]}.srt"')
+            return {"vtt": vtt, "srt_key": srt_key}
+        except NoCredentialsError:
+            raise Exception("AWS credentials not found")
+        except ClientError as e:
+            raise Exception(f"Error storing captions in S3: {e}")
+
+    def upload_video_fileobj(self, fileobj, filename, size=None, progress_callback=None):
+        """Stream a file-like object to S3 as a parallel multipart upload
+        
+        progress_callback, if given, is called as progress_callback(sent_bytes, total_bytes)
+        from the transfer threads.
+        """
+        try:
+            callback = None
+            if progress_callback:
+                callback = _ProgressTracker(size, progress_callback)
+            with span("s3.upload_video", bytes=size):
+                self.s3_client.upload_fileobj(
+                    fileobj,
+                    self.bucket_name,
+                    f"videos/{filename}",
+                    ExtraArgs={'ContentType': 'video/mp4'},
+                    Config=self.transfer_config,
+                    Callback=callback
+                )
+            return self._video_url(filename)
         except NoCredentialsError:
             raise Exception("AWS credentials not found")
         except ClientError as e:
             raise Exception(f"Error uploading to S3: {e}")
     
-    def get_video_url(self, filename):
-        """Get presigned URL for video streaming"""
+    @staticmethod
+    def content_addressed_filename(digest, original_name):
+        """Filename (under videos/) for content-addressed storage of a file with this SHA-256"""
+        ext = os.path.splitext(original_name)[1].lower()
+        return f"sha256/{digest}{ext}"
+    
+    @staticmethod
+    def hash_file(file_path, chunk_size=8 * 1024 * 1024):
+        """SHA-256 hex digest of a file, read in chunks"""
+        hasher = hashlib.sha256()
+        with open(file_path, 'rb') as f:
+            for block in iter(lambda: f.read(chunk_size), b''):
+                hasher.update(block)
+        return hasher.hexdigest()
+    
+    def object_exists(self, key):
+        """Check whether an object exists with a HEAD request"""
+        try:
+            self.s3_client.head_object(Bucket=self.bucket_name, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in ('404', 'NoSuchKey', 'NotFound'):
+                return False
+            raise Exception(f"Error checking S3 object: {e}")
+    
+    def upload_video_deduplicated(self, fileobj, filename, references, size=None, progress_callback=None):
+        """Upload a content-addressed video unless an identical object is already stored
+        
+        filename should come from content_addressed_filename(). references is
+        the database, which keeps an atomic reference count per object. Returns
+        (s3_url, uploaded), where uploaded is False when the transfer was skipped
+        because the object already exists.
+        """
+        key = f"videos/{filename}"
+        # Count the reference before uploading, so a concurrent delete_video() keeps the object
+        references_now = references.add_object_reference(key)
+        try:
+            try:
+                if references_now > 1 and self.object_exists(key):
+                    if progress_callback and size:
+                        progress_callback(size, size)
+                    return self._video_url(filename), False
+                
+                # First reference, or an earlier upload of the same bytes is still in
+                # flight or failed: writing identical content again is harmless
+                callback = _ProgressTracker(size, progress_callback) if progress_callback else None
+                with span("s3.upload_video", bytes=size):
+                    self.s3_client.upload_fileobj(
+                        fileobj,
+                        self.bucket_name,
+                        key,
+                        ExtraArgs={'ContentType': 'video/mp4'},
+                        Config=self.transfer_config,
+                        Callback=callback
+                    )
+            except Exception:
+                references.release_object_reference(key)
+                raise
+            return self._video_url(filename), True
+        except NoCredentialsError:
+            raise Exception("AWS credentials not found")
+        except ClientError as e:
+            raise Exception(f"Error uploading to S3: {e}")
+    
+    def _sign(self, key, expires=None):
         try:
             url = self.s3_client.generate_presigned_url(
                 'get_object',
-                Params={'Bucket': self.bucket_name, 'Key': f"videos/{filename}"},
-                ExpiresIn=3600  # 1 hour
+                Params={'Bucket': self.bucket_name, 'Key': key},
+                ExpiresIn=expires or config.S3_PRESIGN_EXPIRY
             )
-            return url
         except Exception as e:
             raise Exception(f"Error generating presigned URL: {e}")
+        self.sign_calls += 1
+        return url
+    
+    def get_presigned_url(self, key):
+        """Get a presigned GET URL for an object key, reusing a cached one while it is fresh"""
+        url = self.url_cache.get(key)
+        if url is not None:
+            return url
+        url = self._sign(key)
+        self.url_cache.set(key, url)
+        return url
+    
+    def get_video_url(self, filename):
+        """Get presigned URL for video streaming"""
+        return self.get_presigned_url(f"videos/{filename}")
+    
+    def url_cache_stats(self):
+        """Get presigned URL cache counters and the number of signing calls made"""
+        return {**self.url_cache.stats(), "sign_calls": self.sign_calls}
+    
+    def iter_object_ranges(self, key, chunk_size=None, read_ahead=None):
+        """Yield an object's bytes in order using ranged GETs
+        
+        A background thread fetches up to read_ahead chunks ahead of the consumer,
+        so at most (read_ahead + 1) * chunk_size bytes are buffered at any time.
+        """
+        chunk_size = chunk_size or config.S3_STREAM_CHUNK_SIZE
+        read_ahead = read_ahead or config.S3_STREAM_READ_AHEAD
+        try:
+            size = self.s3_client.head_object(Bucket=self.bucket_name, Key=key)['ContentLength']
+        except ClientError as e:
+            raise Exception(f"Error reading S3 object {key}: {e}")
+        
+        buffer = queue.Queue(maxsize=read_ahead)
+        stop = threading.Event()
+        
+        def _put(item):
+            # Give up if the consumer has stopped reading
+            while not stop.is_set():
+                try:
+                    buffer.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def _fetch():
+            try:
+                for start in range(0, size, chunk_size):
+                    end = min(start + chunk_size, size) - 1
+                    with span("s3.get_range", bytes=end - start + 1):
+                        body = self.s3_client.get_object(
+                            Bucket=self.bucket_name,
+                            Key=key,
+                            Range=f"bytes={start}-{end}"
+                        )['Body'].read()
+                    if not _put(body):
+                        return
+                _put(None)
+            except Exception as e:
+                _put(e)
+        
+        fetcher = threading.Thread(target=_fetch, daemon=True)
+        fetcher.start()
+        try:
+            while True:
+                item = buffer.get()
+                if item is None:
+                    return
+                if isinstance(item, Exception):
+                    raise Exception(f"Error streaming S3 object {key}: {item}")
+                yield item
+        finally:
+            stop.set()
     
-    def delete_video(self, filename):
-        """Delete video from S3"""
+    def delete_video(self, filename, references=None):
+        """Delete video from S3
+        
+        Content-addressed objects are shared, so they are only removed once
+        their reference count in references (the database) drops to zero.
+        """
         try:
+            key = f"videos/{filename}"
+            if filename.startswith("sha256/"):
+                if references is None:
+                    raise Exception("content-addressed videos need the database to check references")
+                if references.release_object_reference(key) > 0:
+                    return True
             self.s3_client.delete_object(
                 Bucket=self.bucket_name,
-                Key=f"videos/{filename}"
+                Key=key
             )
+            self.url_cache.delete(key)
             return True
         except Exception as e:
             raise Exception(f"Error deleting from S3: {e}")
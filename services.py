@@ -0,0 +1,101 @@
+"""
+Process-wide registry of the app's services
+
+Every page gets its services from get_services(), so all pages in a Streamlit
+server share one database client, one S3 client and one AI agent. Each
+service is constructed on first access, and the module behind it (boto3,
+pymongo, langchain, Whisper and torch) is only imported then, so a page
+pays only for the services it actually uses.
+"""
+
+import threading
+import time
+
+from metrics import span
+
+
+def _db():
+    from cache import CachedDatabase
+    from database import create_database
+    return CachedDatabase(create_database())
+
+
+def _jobs(services):
+    from job_queue import create_job_queue
+    return create_job_queue(services['db'])
+
+
+def _s3():
+    from s3_storage import S3Storage
+    return S3Storage()
+
+
+def _transcription():
+    from transcription import TranscriptionService
+    return TranscriptionService()
+
+
+def _transcode():
+    from transcode import TranscodeService
+    return TranscodeService()
+
+
+def _ai():
+    from ai_services import AIServices
+    return AIServices()
+
+
+class ServiceRegistry:
+    """Builds each service the first time it is looked up, then shares it"""
+
+    FACTORIES = {
+        'db': _db,
+        'jobs': _jobs,
+        's3': _s3,
+        'transcription': _transcription,
+        'transcode': _transcode,
+        'ai': _ai,
+    }
+    # Factories that need other services
+    DEPENDENT = {'jobs'}
+
+    def __init__(self):
+        self._services = {}
+        self._lock = threading.RLock()
+
+    def __getitem__(self, name):
+        service = self._services.get(name)
+        if service is not None:
+            return service
+        if name not in self.FACTORIES:
+            raise KeyError(name)
+        # Reentrant, since a dependent factory looks up other services while holding it
+        with self._lock:
+            if name not in self._services:
+                factory = self.FACTORIES[name]
+                start = time.perf_counter()
+                with span("services.init", service=name):
+                    self._services[name] = factory(self) if name in self.DEPENDENT else factory()
+                print(f"🔌 Service '{name}' ready in {(time.perf_counter() - start) * 1000:.0f} ms")
+            return self._services[name]
+
+    def __contains__(self, name):
+        return name in self.FACTORIES
+
+    def loaded(self):
+        """Names of the services constructed so far"""
+        return list(self._services)
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_services():
+    """The registry shared by every page and session in this process"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ServiceRegistry()
+    return _registry
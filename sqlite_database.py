@@ -0,0 +1,508 @@
+"""
+Embedded SQLite storage backend
+
+Implements the same interface as database.Database, so pages and services
+can use either backend (see database.create_database). Runs in WAL mode so
+readers never block the writer, and keeps an FTS5 index of transcript
+segments for full-text search.
+"""
+
+import json
+import secrets
+import sqlite3
+import threading
+from datetime import datetime
+
+from cache import TTLCache
+from compression import encode_field, expand_projection, wrap_document
+from metrics import timed
+from transcript import parse_segments
+
+# How long the dashboard stats stay cached before the query is re-run
+STATS_CACHE_TTL = 30  # seconds
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS videos (
+    id TEXT PRIMARY KEY,
+    title TEXT NOT NULL,
+    filename TEXT NOT NULL,
+    s3_url TEXT,
+    duration REAL,
+    upload_date TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'uploaded',
+    audio_key TEXT,
+    renditions TEXT,
+    revision INTEGER NOT NULL DEFAULT 0,
+    digest TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_videos_upload_date_id ON videos (upload_date DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_videos_status ON videos (status);
+
+CREATE TABLE IF NOT EXISTS transcripts (
+    id TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL REFERENCES videos (id),
+    transcript TEXT,
+    transcript_blob BLOB,
+    transcript_codec TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_transcripts_video_id ON transcripts (video_id);
+
+CREATE TABLE IF NOT EXISTS transcript_indexes (
+    video_id TEXT PRIMARY KEY REFERENCES videos (id),
+    transcript_id TEXT NOT NULL,
+    search_index TEXT,
+    search_index_blob BLOB,
+    search_index_codec TEXT,
+    created_at TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS summaries (
+    id TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL REFERENCES videos (id),
+    summary TEXT,
+    summary_blob BLOB,
+    summary_codec TEXT,
+    version INTEGER NOT NULL DEFAULT 1,
+    model TEXT,
+    label TEXT,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_summaries_video_id ON summaries (video_id);
+
+CREATE TABLE IF NOT EXISTS object_refs (
+    key TEXT PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS mcqs (
+    id TEXT PRIMARY KEY,
+    video_id TEXT NOT NULL REFERENCES videos (id),
+    question TEXT NOT NULL,
+    created_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_mcqs_video_id ON mcqs (video_id);
+"""
+
+# Columns added after the first release, applied to existing databases on open
+_MIGRATIONS = {
+    "videos": {
+        "audio_key": "TEXT",
+        "renditions": "TEXT",
+        "revision": "INTEGER NOT NULL DEFAULT 0",
+        "digest": "TEXT",
+    },
+    "summaries": {
+        "version": "INTEGER NOT NULL DEFAULT 1",
+        "model": "TEXT",
+        "label": "TEXT",
+    },
+}
+
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS transcript_segments USING fts5 (
+    video_id UNINDEXED,
+    timestamp UNINDEXED,
+    text
+);
+"""
+
+
+def _new_id():
+    # Same shape as a Mongo ObjectId string so ids look alike across backends
+    return secrets.token_hex(12)
+
+
+def _project(doc, projection):
+    """Apply a Mongo-style inclusion projection to a document"""
+    if not doc or not projection:
+        return doc
+    keep = {key for key, include in projection.items() if include}
+    return {k: v for k, v in doc.items() if k in keep or k == "_id"}
+
+
+class SQLiteDatabase:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.RLock()
+        self._stats_cache = TTLCache(maxsize=1, ttl=STATS_CACHE_TTL)
+        # Streamlit runs sessions on separate threads; access is serialised by _lock
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.executescript(_SCHEMA)
+        self._migrate()
+        # On a migrated column, so created after _migrate()
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_videos_digest ON videos (digest)")
+        self._ensure_unique_summary_versions()
+        try:
+            self.conn.executescript(_FTS_SCHEMA)
+            self.has_fts = True
+        except sqlite3.OperationalError:
+            print("⚠️  SQLite was built without FTS5; transcript search will use LIKE")
+            self.has_fts = False
+        self.conn.commit()
+        # Kept for parity with Database, whose pages check `db.client`
+        self.client = self.conn
+        print(f"✅ SQLite database ready at {path}")
+
+    def _migrate(self):
+        for table, columns in _MIGRATIONS.items():
+            existing = {row["name"] for row in self.conn.execute(f"PRAGMA table_info({table})")}
+            for column, column_type in columns.items():
+                if column not in existing:
+                    self.conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+    def _ensure_unique_summary_versions(self):
+        """Make (video_id, version) unique, renumbering versions that concurrent saves duplicated"""
+        try:
+            self.conn.execute(
+                "CREATE UNIQUE INDEX IF NOT EXISTS idx_summaries_video_version ON summaries (video_id, version)")
+        except sqlite3.IntegrityError:
+            self.conn.execute(
+                "UPDATE summaries SET version = (SELECT ranked.version FROM ("
+                "SELECT id, ROW_NUMBER() OVER (PARTITION BY video_id ORDER BY version, created_at) AS version "
+                "FROM summaries) AS ranked WHERE ranked.id = summaries.id)")
+            self.conn.execute(
+                "CREATE UNIQUE INDEX idx_summaries_video_version ON summaries (video_id, version)")
+
+    def _execute(self, sql, params=()):
+        with self._lock:
+            cur = self.conn.execute(sql, params)
+            self.conn.commit()
+            return cur
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def _video_from_row(self, row):
+        if row is None:
+            return None
+        video = dict(row)
+        video["_id"] = video.pop("id")
+        video["upload_date"] = datetime.fromisoformat(video["upload_date"])
+        if video.get("renditions"):
+            video["renditions"] = json.loads(video["renditions"])
+        return video
+
+    def _payload_from_row(self, row, field, projection=None):
+        if row is None:
+            return None
+        doc = {k: v for k, v in dict(row).items() if v is not None}
+        doc["_id"] = doc.pop("id")
+        doc["created_at"] = datetime.fromisoformat(doc["created_at"])
+        return wrap_document(_project(doc, expand_projection(projection, field)), field)
+
+    @timed("sqlite")
+    def save_video(self, title, filename, s3_url, duration=None, digest=None):
+        """Save video metadata; digest is the SHA-256 of the uploaded file"""
+        video_id = _new_id()
+        self._execute(
+            "INSERT INTO videos (id, title, filename, s3_url, duration, upload_date, status, digest) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (video_id, title, filename, s3_url, duration, datetime.now().isoformat(), "uploaded", digest)
+        )
+        self._stats_cache.clear()
+        return video_id
+
+    @timed("sqlite")
+    def get_all_videos(self):
+        """Get all videos"""
+        rows = self._query("SELECT * FROM videos ORDER BY upload_date DESC")
+        return [self._video_from_row(row) for row in rows]
+
+    @timed("sqlite")
+    def list_videos(self, search=None, processed=None, offset=0, limit=20):
+        """Get one page of videos, newest first, with the total number matching
+
+        search matches titles case-insensitively; processed=True/False keeps only
+        processed/unfinished videos. Returns {"videos": [...], "total": n}.
+        """
+        clauses, params = [], []
+        if search:
+            escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("title LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        if processed is True:
+            clauses.append("status = 'processed'")
+        elif processed is False:
+            clauses.append("status != 'processed'")
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+
+        # id breaks ties between equal upload dates, so pages never overlap
+        rows = self._query(
+            f"SELECT * FROM videos{where} ORDER BY upload_date DESC, id DESC LIMIT ? OFFSET ?",
+            (*params, limit, offset))
+        total = self._query(f"SELECT COUNT(*) FROM videos{where}", tuple(params))[0][0]
+        return {"videos": [self._video_from_row(row) for row in rows], "total": total}
+
+    def _touch(self, video_id):
+        # Bumped by every write that changes what the play page shows for the video
+        self.conn.execute("UPDATE videos SET revision = revision + 1 WHERE id = ?", (str(video_id),))
+
+    @timed("sqlite")
+    def get_video_revision(self, video_id):
+        """Get the video's revision, which every write to it or its content increments
+
+        Returns None if the video doesn't exist.
+        """
+        rows = self._query("SELECT revision FROM videos WHERE id = ?", (str(video_id),))
+        return rows[0]["revision"] if rows else None
+
+    @timed("sqlite")
+    def get_video_by_id(self, video_id):
+        """Get video by ID"""
+        rows = self._query("SELECT * FROM videos WHERE id = ?", (str(video_id),))
+        return self._video_from_row(rows[0]) if rows else None
+
+    @timed("sqlite")
+    def get_dashboard_stats(self, recent_limit=3):
+        """Get video counts by status, total duration and latest uploads"""
+        cached = self._stats_cache.get(recent_limit)
+        if cached is not None:
+            return cached
+
+        rows = self._query(
+            "SELECT status, COUNT(*) AS count, COALESCE(SUM(duration), 0) AS duration "
+            "FROM videos GROUP BY status"
+        )
+        latest = self._query(
+            "SELECT id, title, upload_date, status FROM videos ORDER BY upload_date DESC LIMIT ?",
+            (recent_limit,)
+        )
+        status_counts = {row["status"]: row["count"] for row in rows}
+        stats = {
+            "total_videos": sum(status_counts.values()),
+            "status_counts": status_counts,
+            "processed_videos": status_counts.get("processed", 0),
+            "total_duration": sum(row["duration"] for row in rows),
+            "latest_videos": [self._video_from_row(row) for row in latest]
+        }
+        self._stats_cache.set(recent_limit, stats)
+        return stats
+
+    @timed("sqlite")
+    def get_video_with_content(self, video_id, video_projection=None,
+                               transcript_projection=None, summary_projection=None):
+        """Get a video joined with its transcript and summary"""
+        with self._lock:
+            video = self._video_from_row(self.conn.execute(
+                "SELECT * FROM videos WHERE id = ?", (str(video_id),)).fetchone())
+            if video is None:
+                return None
+            transcript_row = self.conn.execute(
+                "SELECT * FROM transcripts WHERE video_id = ? ORDER BY created_at LIMIT 1",
+                (str(video_id),)).fetchone()
+            summary_row = self.conn.execute(
+                "SELECT * FROM summaries WHERE video_id = ? ORDER BY version DESC, created_at DESC LIMIT 1",
+                (str(video_id),)).fetchone()
+
+        video = _project(video, video_projection)
+        video["transcript_doc"] = self._payload_from_row(
+            transcript_row, "transcript", transcript_projection)
+        video["summary_doc"] = self._payload_from_row(
+            summary_row, "summary", summary_projection)
+        return video
+
+    @timed("sqlite")
+    def save_transcript(self, video_id, transcript_data):
+        """Save transcript with timestamps"""
+        transcript_id = _new_id()
+        encoded = encode_field("transcript", transcript_data)
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO transcripts (id, video_id, transcript, transcript_blob, transcript_codec, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (transcript_id, str(video_id), encoded.get("transcript"), encoded.get("transcript_blob"),
+                 encoded.get("transcript_codec"), datetime.now().isoformat())
+            )
+            self._index_segments(video_id, transcript_data)
+            self._touch(video_id)
+            self.conn.commit()
+        return transcript_id
+
+    def _index_segments(self, video_id, transcript_data):
+        if not self.has_fts:
+            return
+        self.conn.execute("DELETE FROM transcript_segments WHERE video_id = ?", (str(video_id),))
+        self.conn.executemany(
+            "INSERT INTO transcript_segments (video_id, timestamp, text) VALUES (?, ?, ?)",
+            ((str(video_id), seg["timestamp"], seg["text"]) for seg in parse_segments(transcript_data))
+        )
+
+    @timed("sqlite")
+    def index_transcript_segments(self, video_id, transcript_data):
+        """Replace a video's searchable transcript segments"""
+        with self._lock:
+            self._index_segments(video_id, transcript_data)
+            self.conn.commit()
+
+    @timed("sqlite")
+    def replace_transcript(self, video_id, transcript_data):
+        """Replace a video's transcript, e.g. after re-transcription"""
+        with self._lock:
+            self.conn.execute("DELETE FROM transcripts WHERE video_id = ?", (str(video_id),))
+            return self.save_transcript(video_id, transcript_data)
+
+    @timed("sqlite")
+    def save_transcript_index(self, video_id, transcript_id, index_data):
+        """Store the search index built from a transcript, replacing the video's previous one"""
+        encoded = encode_field("search_index", index_data)
+        self._execute(
+            "INSERT OR REPLACE INTO transcript_indexes "
+            "(video_id, transcript_id, search_index, search_index_blob, search_index_codec, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (str(video_id), str(transcript_id), encoded.get("search_index"), encoded.get("search_index_blob"),
+             encoded.get("search_index_codec"), datetime.now().isoformat())
+        )
+
+    @timed("sqlite")
+    def get_transcript_index(self, video_id):
+        """Get a video's transcript search index and the id of the transcript it was built from"""
+        rows = self._query("SELECT * FROM transcript_indexes WHERE video_id = ?", (str(video_id),))
+        if not rows:
+            return None
+        return wrap_document({k: v for k, v in dict(rows[0]).items() if v is not None}, "search_index")
+
+    @timed("sqlite")
+    def get_transcript(self, video_id):
+        """Get transcript for a video"""
+        rows = self._query(
+            "SELECT * FROM transcripts WHERE video_id = ? ORDER BY created_at LIMIT 1", (str(video_id),))
+        return self._payload_from_row(rows[0], "transcript") if rows else None
+
+    @timed("sqlite")
+    def search_transcripts(self, query, limit=20):
+        """Full-text search over transcript segments"""
+        if self.has_fts:
+            # Quote each term so user input can't inject FTS5 query syntax
+            terms = " ".join('"' + term.replace('"', '""') + '"' for term in query.split())
+            if not terms:
+                return []
+            rows = self._query(
+                "SELECT video_id, timestamp, snippet(transcript_segments, 2, '**', '**', '…', 12) AS text "
+                "FROM transcript_segments WHERE transcript_segments MATCH ? ORDER BY rank LIMIT ?",
+                (terms, limit)
+            )
+        else:
+            # Match % and _ in the query literally rather than as wildcards
+            pattern = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            rows = self._query(
+                "SELECT video_id, transcript AS text, '' AS timestamp FROM transcripts "
+                "WHERE transcript LIKE ? ESCAPE '\\' LIMIT ?",
+                (f"%{pattern}%", limit)
+            )
+        return [dict(row) for row in rows]
+
+    @timed("sqlite")
+    def save_summary(self, video_id, summary_data, model=None, label=None):
+        """Save AI-generated summary as the video's next summary version"""
+        summary_id = _new_id()
+        encoded = encode_field("summary", summary_data)
+        with self._lock:
+            # One statement, so the version is read and taken under SQLite's write lock,
+            # even when another process (a worker, reprocess.py) saves at the same time
+            self.conn.execute(
+                "INSERT INTO summaries (id, video_id, summary, summary_blob, summary_codec, "
+                "version, model, label, created_at) "
+                "SELECT ?, ?, ?, ?, ?, COALESCE(MAX(version), 0) + 1, ?, ?, ? "
+                "FROM summaries WHERE video_id = ?",
+                (summary_id, str(video_id), encoded.get("summary"), encoded.get("summary_blob"),
+                 encoded.get("summary_codec"), model, label, datetime.now().isoformat(), str(video_id))
+            )
+            self._touch(video_id)
+            self.conn.commit()
+        return summary_id
+
+    @timed("sqlite")
+    def get_summary(self, video_id):
+        """Get the latest summary version for a video"""
+        rows = self._query(
+            "SELECT * FROM summaries WHERE video_id = ? ORDER BY version DESC, created_at DESC LIMIT 1",
+            (str(video_id),))
+        return self._payload_from_row(rows[0], "summary") if rows else None
+
+    @timed("sqlite")
+    def get_summarized_video_ids(self, label):
+        """Ids of videos that already have a summary saved under label"""
+        rows = self._query("SELECT DISTINCT video_id FROM summaries WHERE label = ?", (label,))
+        return {row["video_id"] for row in rows}
+
+    @timed("sqlite")
+    def save_mcq(self, video_id, question_data):
+        """Save MCQ question"""
+        mcq_id = _new_id()
+        with self._lock:
+            self.conn.execute(
+                "INSERT INTO mcqs (id, video_id, question, created_at) VALUES (?, ?, ?, ?)",
+                (mcq_id, str(video_id), json.dumps(question_data), datetime.now().isoformat())
+            )
+            self._touch(video_id)
+            self.conn.commit()
+        return mcq_id
+
+    @timed("sqlite")
+    def get_mcqs(self, video_id):
+        """Get all MCQs for a video"""
+        rows = self._query("SELECT * FROM mcqs WHERE video_id = ? ORDER BY created_at", (str(video_id),))
+        return [
+            {
+                "_id": row["id"],
+                "video_id": row["video_id"],
+                "question": json.loads(row["question"]),
+                "created_at": datetime.fromisoformat(row["created_at"])
+            }
+            for row in rows
+        ]
+
+    @timed("sqlite")
+    def set_audio_key(self, video_id, audio_key):
+        """Record the S3 key of the video's audio derivative"""
+        self._execute("UPDATE videos SET audio_key = ?, revision = revision + 1 WHERE id = ?", (audio_key, str(video_id)))
+
+    @timed("sqlite")
+    def set_renditions(self, video_id, renditions):
+        """Record the S3 keys of the video's playback renditions"""
+        self._execute("UPDATE videos SET renditions = ?, revision = revision + 1 WHERE id = ?", (json.dumps(renditions), str(video_id)))
+
+    @timed("sqlite")
+    def add_object_reference(self, key):
+        """Atomically count one more reference to a shared S3 object; returns the new count"""
+        with self._lock:
+            # The upsert takes the write lock, so the read sees this process's own increment
+            self.conn.execute(
+                "INSERT INTO object_refs (key, count) VALUES (?, 1) "
+                "ON CONFLICT (key) DO UPDATE SET count = count + 1", (key,))
+            count = self.conn.execute("SELECT count FROM object_refs WHERE key = ?", (key,)).fetchone()[0]
+            self.conn.commit()
+        return count
+
+    @timed("sqlite")
+    def release_object_reference(self, key):
+        """Atomically drop one reference to a shared S3 object; returns how many remain"""
+        with self._lock:
+            self.conn.execute("UPDATE object_refs SET count = count - 1 WHERE key = ?", (key,))
+            row = self.conn.execute("SELECT count FROM object_refs WHERE key = ?", (key,)).fetchone()
+            remaining = max(row[0], 0) if row else 0
+            if row and remaining == 0:
+                self.conn.execute("DELETE FROM object_refs WHERE key = ?", (key,))
+            self.conn.commit()
+        return remaining
+
+    @timed("sqlite")
+    def update_video_status(self, video_id, status, unless=()):
+        """Update video processing status, unless it is currently one of `unless`
+
+        The check and the write are a single conditional update. Returns whether
+        the status was written.
+        """
+        condition = f" AND status NOT IN ({', '.join('?' * len(unless))})" if unless else ""
+        cur = self._execute(
+            f"UPDATE videos SET status = ?, revision = revision + 1 WHERE id = ?{condition}",
+            (status, str(video_id), *unless))
+        if cur.rowcount:
+            self._stats_cache.clear()
+        return cur.rowcount > 0
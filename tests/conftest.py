@@ -0,0 +1,24 @@
+"""
+Shared setup for the test suite
+
+config reads its settings at import time, so the environment points it at
+local, disposable resources before any application module is imported:
+SQLite, moto's S3 and dummy credentials.
+"""
+
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.update({
+    "DATABASE_BACKEND": "sqlite",
+    "AWS_ACCESS_KEY_ID": "testing",
+    "AWS_SECRET_ACCESS_KEY": "testing",
+    "AWS_REGION": "us-east-1",
+    "S3_BUCKET_NAME": "video-transcriber-test",
+    "GROQ_API_KEY": "testing",
+    "METRICS_PATH": "",
+    "EMBEDDED_WORKERS": "0",
+})
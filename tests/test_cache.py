@@ -0,0 +1,139 @@
+import mongomock
+import mongomock.gridfs
+import pytest
+
+import cache
+import config
+from cache import CachedDatabase, TTLCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "monotonic", clock)
+    return clock
+
+
+def test_ttl_expiry(clock):
+    c = TTLCache(maxsize=4, ttl=10)
+    c.set("a", 1)
+    clock.now += 9
+    assert c.get("a") == 1
+    clock.now += 1
+    assert c.get("a") is None
+    assert "a" not in c
+    assert c.stats()["hits"] == 1 and c.stats()["misses"] == 1
+
+
+def test_lru_eviction(clock):
+    c = TTLCache(maxsize=2, ttl=10)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")  # "b" is now the least recently used
+    c.set("c", 3)
+    assert c.get("b") is None
+    assert c.get("a") == 1 and c.get("c") == 3
+    assert c.stats()["evictions"] == 1
+    assert c.stats()["size"] == 2
+
+
+@pytest.fixture(params=["sqlite", "mongomock"])
+def raw_db(request, tmp_path, monkeypatch):
+    if request.param == "sqlite":
+        from sqlite_database import SQLiteDatabase
+        return SQLiteDatabase(str(tmp_path / "test.db"))
+
+    mongomock.gridfs.enable_gridfs_integration()
+    monkeypatch.setattr("pymongo.MongoClient", mongomock.MongoClient)
+    monkeypatch.setattr(config, "MONGO_DB", f"test_{tmp_path.name}")
+    from database import Database
+    return Database()
+
+
+@pytest.fixture
+def video_id(raw_db):
+    video_id = raw_db.save_video("Lecture", "lecture.mp4", "s3://lecture.mp4", duration=60)
+    raw_db.save_transcript(video_id, "[00:00 - 00:04] first version")
+    raw_db.save_summary(video_id, "first summary")
+    return video_id
+
+
+def _cached_twice(db, method, video_id):
+    """Read twice, asserting the second read is a cache hit; returns the value"""
+    value = getattr(db, method)(video_id)
+    hits = db.cache_stats()["hits"]
+    assert getattr(db, method)(video_id) == value
+    assert db.cache_stats()["hits"] == hits + 1
+    return value
+
+
+def test_status_change_by_another_process_invalidates(raw_db, video_id):
+    db = CachedDatabase(raw_db)
+    assert _cached_twice(db, "get_video_by_id", video_id)["status"] == "uploaded"
+
+    # Written past the cache, as a worker process would
+    raw_db.update_video_status(video_id, "transcribed")
+    assert db.get_video_by_id(video_id)["status"] == "transcribed"
+
+
+def test_transcript_saved_by_another_process_invalidates(raw_db):
+    video_id = raw_db.save_video("Lecture", "lecture.mp4", "s3://lecture.mp4", duration=60)
+    db = CachedDatabase(raw_db)
+    revision = _cached_twice(db, "get_video_by_id", video_id)["revision"]
+    assert db.get_transcript(video_id) is None
+
+    raw_db.save_transcript(video_id, "[00:00 - 00:04] first version")
+    assert db.get_video_by_id(video_id)["revision"] > revision
+    assert "first version" in db.get_transcript(video_id)["transcript"]
+
+
+def test_transcript_replaced_by_another_process_invalidates(raw_db, video_id):
+    db = CachedDatabase(raw_db)
+    assert "first version" in _cached_twice(db, "get_transcript", video_id)["transcript"]
+
+    raw_db.replace_transcript(video_id, "[00:00 - 00:04] second version")
+    assert "second version" in db.get_transcript(video_id)["transcript"]
+
+
+def test_new_summary_by_another_process_invalidates(raw_db, video_id):
+    db = CachedDatabase(raw_db)
+    assert _cached_twice(db, "get_summary", video_id)["summary"] == "first summary"
+
+    raw_db.save_summary(video_id, "second summary")
+    assert db.get_summary(video_id)["summary"] == "second summary"
+
+
+def test_writes_through_the_cache_invalidate(raw_db, video_id):
+    db = CachedDatabase(raw_db)
+    _cached_twice(db, "get_video_by_id", video_id)
+    _cached_twice(db, "get_summary", video_id)
+
+    db.update_video_status(video_id, "processed")
+    db.save_summary(video_id, "second summary")
+    assert db.get_video_by_id(video_id)["status"] == "processed"
+    assert db.get_summary(video_id)["summary"] == "second summary"
+
+
+def test_cached_entries_expire(raw_db, video_id, clock):
+    db = CachedDatabase(raw_db, ttl=30)
+    _cached_twice(db, "get_video_by_id", video_id)
+
+    clock.now += 30
+    misses = db.cache_stats()["misses"]
+    db.get_video_by_id(video_id)
+    assert db.cache_stats()["misses"] == misses + 1
+
+
+def test_missing_video_is_not_cached(raw_db):
+    db = CachedDatabase(raw_db)
+    missing = "0123456789abcdef01234567"
+    assert db.get_video_by_id(missing) is None
+    assert db.cache_stats()["size"] == 0
@@ -0,0 +1,68 @@
+import threading
+import time
+
+import pytest
+
+from pipeline import Stage, StageExecutor
+
+
+def test_failure_stops_new_stages_and_is_reported_before_waiting():
+    ran = []
+    started = threading.Event()
+    release = threading.Event()
+    reported = []
+
+    def fail(results):
+        started.wait(5)
+        raise Exception("boom")
+
+    def slow(results):
+        started.set()
+        # Still running when the failure is reported
+        release.wait(5)
+        ran.append('slow')
+
+    def queued(results):
+        ran.append('queued')
+
+    def dependent(results):
+        ran.append('dependent')
+
+    def on_failure(stage, error, running):
+        reported.append((stage.name, str(error), [s.name for s in running], release.is_set()))
+        release.set()
+
+    stages = [
+        Stage('fail', fail),
+        Stage('slow', slow),
+        Stage('queued', queued),
+        Stage('dependent', dependent, deps=['fail']),
+    ]
+    with pytest.raises(Exception, match="boom"):
+        StageExecutor(max_workers=2).run(stages, on_failure=on_failure)
+
+    assert reported == [('fail', 'boom', ['slow'], False)]
+    # The stage in flight finishes; nothing else starts
+    assert ran == ['slow']
+
+
+def test_stages_run_after_their_dependencies():
+    order = []
+
+    def stage(name, delay=0):
+        def fn(results):
+            time.sleep(delay)
+            order.append(name)
+            return name
+        return fn
+
+    stages = [
+        Stage('b', stage('b'), deps=['a']),
+        Stage('a', stage('a', 0.05)),
+        Stage('c', stage('c'), deps=['a', 'b']),
+    ]
+    results, timings = StageExecutor(max_workers=2).run(stages)
+
+    assert order == ['a', 'b', 'c']
+    assert results == {'a': 'a', 'b': 'b', 'c': 'c'}
+    assert set(timings) == {'a', 'b', 'c'}
@@ -0,0 +1,60 @@
+import io
+import threading
+
+import boto3
+import pytest
+
+import config
+
+try:
+    from moto import mock_aws  # moto >= 5
+except ImportError:
+    from moto import mock_s3 as mock_aws
+
+# S3 rejects multipart parts below 5 MB, except the last one
+PART_SIZE = 5 * 1024 * 1024
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    monkeypatch.setattr(config, "S3_MULTIPART_PART_SIZE", PART_SIZE)
+    with mock_aws():
+        boto3.client("s3", region_name=config.AWS_REGION).create_bucket(Bucket=config.S3_BUCKET_NAME)
+        from s3_storage import S3Storage
+        yield S3Storage()
+
+
+def test_multipart_upload_with_progress(s3):
+    size = 2 * PART_SIZE + 123
+    data = bytes(range(256)) * (size // 256) + b"x" * (size % 256)
+    calls = []
+    lock = threading.Lock()
+
+    def progress(sent, total):
+        with lock:
+            calls.append((sent, total))
+
+    url = s3.upload_video_fileobj(io.BytesIO(data), "lecture.mp4", size=size, progress_callback=progress)
+
+    assert url == f"https://{config.S3_BUCKET_NAME}.s3.{config.AWS_REGION}.amazonaws.com/videos/lecture.mp4"
+    stored = s3.s3_client.get_object(Bucket=config.S3_BUCKET_NAME, Key="videos/lecture.mp4")
+    assert stored["Body"].read() == data
+    assert stored["ContentType"] == "video/mp4"
+    # A multipart ETag ends in the number of parts
+    assert stored["ETag"].strip('"').endswith("-3")
+
+    assert calls and all(total == size for _, total in calls)
+    # Reports are running totals, so the increments add up to the file size
+    sent = sorted(sent for sent, _ in calls)
+    assert all(b > a for a, b in zip(sent, sent[1:]))
+    assert sent[-1] == size
+
+
+def test_small_upload_is_a_single_put(s3):
+    data = b"small video"
+    url = s3.upload_video_fileobj(io.BytesIO(data), "short.mp4", size=len(data))
+
+    assert url.endswith("/videos/short.mp4")
+    stored = s3.s3_client.get_object(Bucket=config.S3_BUCKET_NAME, Key="videos/short.mp4")
+    assert stored["Body"].read() == data
+    assert "-" not in stored["ETag"]
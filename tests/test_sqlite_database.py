@@ -0,0 +1,37 @@
+import pytest
+
+from sqlite_database import SQLiteDatabase
+
+
+@pytest.fixture
+def like_db(tmp_path):
+    db = SQLiteDatabase(str(tmp_path / "test.db"))
+    # Search as on an SQLite build without FTS5
+    db.has_fts = False
+    return db
+
+
+def _save(db, title, transcript):
+    video_id = db.save_video(title, f"{title}.mp4", f"s3://{title}.mp4")
+    db.save_transcript(video_id, transcript)
+    return video_id
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("100%", "percent"),
+    ("snake_case", "underscore"),
+    ("C:\\temp", "backslash"),
+])
+def test_like_search_matches_wildcards_literally(like_db, query, expected):
+    ids = {
+        "percent": _save(like_db, "percent", "[00:00 - 00:04] we are 100% sure"),
+        "digits": _save(like_db, "digits", "[00:00 - 00:04] over 1000 users"),
+        "underscore": _save(like_db, "underscore", "[00:00 - 00:04] name it snake_case"),
+        "dash": _save(like_db, "dash", "[00:00 - 00:04] not snake-case"),
+        "backslash": _save(like_db, "backslash", "[00:00 - 00:04] saved in C:\\temp"),
+        "slash": _save(like_db, "slash", "[00:00 - 00:04] saved in C:/temp"),
+    }
+
+    hits = like_db.search_transcripts(query)
+
+    assert [hit["video_id"] for hit in hits] == [ids[expected]]
@@ -0,0 +1,113 @@
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import config
+from metrics import span
+
+# Video and audio bitrate for each rendition height
+BITRATE_LADDER = {
+    240: ("400k", "64k"),
+    360: ("800k", "96k"),
+    480: ("1400k", "128k"),
+    720: ("2800k", "128k"),
+    1080: ("5000k", "160k"),
+}
+
+class TranscodeService:
+    """Produces fast-start MP4 renditions and an HLS ladder with ffmpeg"""
+
+    def __init__(self):
+        self.heights = sorted(
+            int(h) for h in str(config.RENDITION_HEIGHTS).split(",") if h.strip()
+        )
+        self.segment_seconds = config.HLS_SEGMENT_SECONDS
+
+    def probe_height(self, video_path):
+        """Get the height of the first video stream"""
+        result = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "v:0",
+             "-show_entries", "stream=height", "-of", "json", video_path],
+            capture_output=True
+        )
+        if result.returncode != 0:
+            raise Exception(f"Error probing video: {result.stderr.decode(errors='replace').strip()}")
+        streams = json.loads(result.stdout or b"{}").get("streams", [])
+        return streams[0]["height"] if streams else None
+
+    def _target_heights(self, source_height):
+        if not source_height:
+            return self.heights[:1]
+        # Never upscale, but always produce at least the smallest rung
+        heights = [h for h in self.heights if h <= source_height]
+        return heights or self.heights[:1]
+
+    def _run(self, args, what):
+        result = subprocess.run(["ffmpeg", "-loglevel", "error", "-y", *args], capture_output=True)
+        if result.returncode != 0:
+            raise Exception(f"Error {what}: {result.stderr.decode(errors='replace').strip()}")
+
+    def create_faststart_mp4(self, video_path, height, output_path):
+        """Encode an H.264/AAC MP4 at the given height with the moov atom up front"""
+        video_bitrate, audio_bitrate = BITRATE_LADDER.get(height, ("1500k", "128k"))
+        self._run([
+            "-i", video_path,
+            "-map", "0:v:0", "-map", "0:a:0?",
+            "-vf", f"scale=-2:{height}",
+            "-c:v", "libx264", "-preset", "veryfast", "-profile:v", "main",
+            "-b:v", video_bitrate, "-maxrate", video_bitrate, "-bufsize", video_bitrate,
+            # Keyframes on segment boundaries so the HLS remux can cut without re-encoding
+            "-force_key_frames", f"expr:gte(t,n_forced*{self.segment_seconds})",
+            "-c:a", "aac", "-b:a", audio_bitrate, "-ac", "2",
+            "-movflags", "+faststart",
+            output_path
+        ], f"encoding {height}p rendition")
+
+    def segment_hls(self, mp4_path, output_dir):
+        """Remux a rendition into HLS segments without re-encoding"""
+        os.makedirs(output_dir, exist_ok=True)
+        self._run([
+            "-i", mp4_path,
+            "-c", "copy",
+            "-f", "hls",
+            "-hls_time", str(self.segment_seconds),
+            "-hls_playlist_type", "vod",
+            "-hls_segment_filename", os.path.join(output_dir, "segment_%05d.ts"),
+            os.path.join(output_dir, "index.m3u8")
+        ], "segmenting HLS")
+
+    def create_renditions(self, video_path):
+        """Build the rendition ladder for a video in a temporary directory
+
+        Returns {"dir": work_dir, "mp4": {height: path}, "hls_master": path}.
+        The caller removes work_dir with cleanup() once everything is uploaded.
+        """
+        work_dir = tempfile.mkdtemp(prefix="renditions_")
+        try:
+            heights = self._target_heights(self.probe_height(video_path))
+            mp4s = {}
+            master = ["#EXTM3U", "#EXT-X-VERSION:3"]
+            for height in heights:
+                mp4_path = os.path.join(work_dir, f"{height}p.mp4")
+                with span("ffmpeg.encode_rendition", height=height):
+                    self.create_faststart_mp4(video_path, height, mp4_path)
+                mp4s[height] = mp4_path
+
+                with span("ffmpeg.segment_hls", height=height):
+                    self.segment_hls(mp4_path, os.path.join(work_dir, "hls", f"{height}p"))
+                video_bitrate, audio_bitrate = BITRATE_LADDER.get(height, ("1500k", "128k"))
+                bandwidth = (int(video_bitrate[:-1]) + int(audio_bitrate[:-1])) * 1000
+                master.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth}")
+                master.append(f"{height}p/index.m3u8")
+
+            master_path = os.path.join(work_dir, "hls", "master.m3u8")
+            with open(master_path, "w") as f:
+                f.write("\n".join(master) + "\n")
+            return {"dir": work_dir, "mp4": mp4s, "hls_master": master_path}
+        except Exception:
+            self.cleanup(work_dir)
+            raise
+
+    def cleanup(self, work_dir):
+        shutil.rmtree(work_dir, ignore_errors=True)
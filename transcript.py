@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Parsing and encoding of timestamped transcripts for the player
+
+Transcripts are stored as lines of "[start - end] text". The play page parses
+them into segments and encodes them as a compact JSON array for the player's
+virtualized transcript panel, and as WebVTT and SRT caption files. This is
+cached per video and transcript version, so it runs once per transcript
+rather than on every Streamlit rerun.
+
+build_index() turns the segments into a compact inverted index. The
+ingestion pipeline stores one per video, and the play page's transcript
+search looks words up in it with search().
+
+Measure the parse and encode cost for a transcript of a given size with:
+
+    python transcript.py report [--segments 20000]
+"""
+
+import argparse
+import json
+import re
+import time
+
+SEGMENT_RE = re.compile(r'\[(.*?) - (.*?)\] (.*)')
+
+
+def time_str_to_seconds(time_str):
+    parts = list(map(int, time_str.split(':')))
+    if len(parts) == 3:
+        return parts[0] * 3600 + parts[1] * 60 + parts[2]
+    elif len(parts) == 2:
+        return parts[0] * 60 + parts[1]
+    return 0
+
+
+def parse_segments(transcript):
+    """Split a transcript into segments with start/end seconds"""
+    segments = []
+    for i, line in enumerate(transcript.split('\n')):
+        match = SEGMENT_RE.match(line)
+        if match:
+            start_time_str, end_time_str, text = match.groups()
+            segments.append({
+                "id": f"segment-{i}",
+                "start": time_str_to_seconds(start_time_str),
+                "end": time_str_to_seconds(end_time_str),
+                "text": text,
+                "timestamp": f"[{start_time_str} - {end_time_str}]"
+            })
+    return segments
+
+
+def segments_json(segments):
+    """Encode segments as a compact JSON array of [start, end, timestamp, text] rows
+
+    The player's transcript panel renders rows from this array as they scroll
+    into view. The output is safe to embed in a <script> block.
+    """
+    rows = [[seg["start"], seg["end"], seg["timestamp"], seg["text"]] for seg in segments]
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":")).replace("</", "<\\/")
+
+
+def _cue_time(seconds, separator):
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}{separator}000"
+
+
+def _cues(segments):
+    # Stored timestamps have whole-second precision, so a short segment can end
+    # in the second it started; cues must end after they start
+    for seg in segments:
+        yield seg["start"], max(seg["end"], seg["start"] + 1), seg["text"].strip()
+
+
+def to_webvtt(segments):
+    """Render segments as a WebVTT caption file"""
+    lines = ["WEBVTT", ""]
+    for i, (start, end, text) in enumerate(_cues(segments), 1):
+        text = text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        lines += [str(i), f"{_cue_time(start, '.')} --> {_cue_time(end, '.')}", text, ""]
+    return "\n".join(lines)
+
+
+def to_srt(segments):
+    """Render segments as an SRT subtitle file"""
+    lines = []
+    for i, (start, end, text) in enumerate(_cues(segments), 1):
+        lines += [str(i), f"{_cue_time(start, ',')} --> {_cue_time(end, ',')}", text, ""]
+    return "\n".join(lines)
+
+
+TOKEN_RE = re.compile(r"\w+")
+INDEX_FORMAT = 1
+
+
+def tokenize(text):
+    """Lower-cased words of text with their character offsets"""
+    return [(match.group().lower(), match.start()) for match in TOKEN_RE.finditer(text)]
+
+
+def build_index(segments):
+    """Build a segment-level inverted index as compact JSON
+
+    Each term maps to a flat list of (segment, offset) pairs: the segment
+    number is delta-encoded against the previous pair and offset is the
+    term's character position in the segment text, which search() uses to
+    place a hit inside the segment. Only the first occurrence per segment is
+    kept.
+    """
+    postings, last_segment = {}, {}
+    for number, seg in enumerate(segments):
+        for match in TOKEN_RE.finditer(seg["text"]):
+            term = match.group().lower()
+            previous = last_segment.get(term)
+            if previous == number:
+                continue
+            flat = postings.get(term)
+            if flat is None:
+                flat = postings[term] = []
+            flat.append(number if previous is None else number - previous)
+            flat.append(match.start())
+            last_segment[term] = number
+    return json.dumps({"format": INDEX_FORMAT, "segments": len(segments), "terms": postings},
+                      ensure_ascii=False, separators=(",", ":"))
+
+
+def load_index(index_json):
+    """Decode build_index() output to {term: {segment: offset}}"""
+    index = json.loads(index_json)
+    if index.get("format") != INDEX_FORMAT:
+        raise Exception(f"Unsupported transcript index format: {index.get('format')}")
+    terms = {}
+    for term, flat in index["terms"].items():
+        occurrences, number = {}, 0
+        for i in range(0, len(flat), 2):
+            number += flat[i]
+            occurrences[number] = flat[i + 1]
+        terms[term] = occurrences
+    return terms
+
+
+def search(terms, segments, query, limit=50):
+    """Find segments containing every word of query, in playback order
+
+    The last word also matches as a prefix, so results appear while a word is
+    still being typed. Each hit carries the moment to seek to: the segment
+    start plus the first matched word's position, interpolated across the
+    segment (stored timestamps are per segment, not per word).
+    """
+    words = [term for term, _ in tokenize(query)]
+    if not words:
+        return []
+
+    def occurrences(word, prefix):
+        if not prefix:
+            return terms.get(word, {})
+        merged = {}
+        for term, found in terms.items():
+            if term.startswith(word):
+                for number, offset in found.items():
+                    merged[number] = min(offset, merged.get(number, offset))
+        return merged
+
+    matches = [occurrences(word, i == len(words) - 1) for i, word in enumerate(words)]
+    # Intersect starting from the rarest word
+    candidates = set(min(matches, key=len))
+    for found in matches:
+        candidates.intersection_update(found)
+
+    hits = []
+    for number in sorted(candidates)[:limit]:
+        seg = segments[number]
+        offset = matches[0][number]
+        fraction = offset / max(len(seg["text"]), 1)
+        hits.append({
+            "segment": number,
+            "time": seg["start"] + fraction * max(seg["end"] - seg["start"], 0),
+            "timestamp": seg["timestamp"],
+            "text": seg["text"],
+        })
+    return hits
+
+
+def synthetic_transcript(segment_count, seconds_per_segment=4):
+    """A transcript of segment_count lines, for measuring render cost"""
+    def stamp(seconds):
+        return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return "\n".join(
+        f"[{stamp(i * seconds_per_segment)} - {stamp((i + 1) * seconds_per_segment)}] "
+        f"Segment {i} of the lecture, with a sentence of typical length to render."
+        for i in range(segment_count)
+    )
+
+
+def _render_by_concatenation(transcript):
+    """The play page's original per-rerun HTML rendering, kept only for the report"""
+    segments = parse_segments(transcript)
+    transcript_html = ""
+    for seg in segments:
+        transcript_html += f"""
+            <div class="segment" id="{seg['id']}" data-start="{seg['start']}" data-end="{seg['end']}">
+                <a href="#" class="timestamp" onclick="seekTo({seg['start']}); return false;">{seg['timestamp']}</a>
+                <span>{seg['text']}</span>
+            </div>
+            """
+    return transcript_html
+
+
+def render_report(segment_count=20000, repeat=3):
+    """Time parsing and encoding a transcript of segment_count segments"""
+    transcript = synthetic_transcript(segment_count)
+
+    def best_ms(fn):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    segments = parse_segments(transcript)
+    return {
+        "segments": len(segments),
+        "transcript_bytes": len(transcript.encode("utf-8")),
+        "html_bytes": len(_render_by_concatenation(transcript).encode("utf-8")),
+        "json_bytes": len(segments_json(segments).encode("utf-8")),
+        "concatenation_ms": best_ms(lambda: _render_by_concatenation(transcript)),
+        "parse_ms": best_ms(lambda: parse_segments(transcript)),
+        "encode_ms": best_ms(lambda: segments_json(segments)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transcript parsing and rendering tools")
+    commands = parser.add_subparsers(dest="command", required=True)
+    report = commands.add_parser("report", help="Time parsing and encoding of a synthetic transcript")
+    report.add_argument("--segments", type=int, nargs="+", default=[1000, 10000, 50000])
+    args = parser.parse_args()
+
+    print(f"{'segments':>9} {'HTML KB':>9} {'JSON KB':>9} {'old ms':>9} {'parse ms':>9} {'encode ms':>10}")
+    for count in args.segments:
+        r = render_report(count)
+        print(f"{r['segments']:>9} {r['html_bytes'] / 1024:>9.0f} {r['json_bytes'] / 1024:>9.0f} "
+              f"{r['concatenation_ms']:>9.1f} {r['parse_ms']:>9.1f} {r['encode_ms']:>10.1f}")
+    print("Cached reruns skip parsing and encoding; 'old ms' is the former cost of every rerun.")
+
+
+if __name__ == "__main__":
+    main()
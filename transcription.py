@@ -1,8 +1,28 @@
-import whisper
 import tempfile
 import os
-from moviepy.editor import VideoFileClip
+import subprocess
+import threading
+import numpy as np
 import config
+from metrics import span
+
+# Whisper expects 16 kHz mono audio
+SAMPLE_RATE = 16000
+
+# Read size when spilling decoded PCM from ffmpeg to disk
+PCM_BLOCK_SIZE = 1024 * 1024
+
+# Chunked transcription cuts each window at its quietest 100 ms frame within the last 30 seconds
+SILENCE_SEARCH_SECONDS = 30
+SILENCE_FRAME_SECONDS = 0.1
+# Characters of the previous window's text passed to Whisper as the next window's prompt
+CHUNK_PROMPT_CHARS = 200
+
+# ffmpeg encoder settings and file extension for each audio derivative format
+AUDIO_DERIVATIVE_CODECS = {
+    "opus": (["-c:a", "libopus", "-b:a", config.AUDIO_DERIVATIVE_BITRATE, "-application", "voip"], ".ogg"),
+    "flac": (["-c:a", "flac"], ".flac"),
+}
 
 class TranscriptionService:
     def __init__(self):
@@ -12,6 +32,10 @@ class TranscriptionService:
     def _load_model(self):
         """Load Whisper model lazily when first needed"""
         if self.model is None:
+            # Whisper pulls in torch; import it only in processes that transcribe
+            import whisper
+            import utils
+            utils.fix_pytorch_streamlit_compatibility()
             try:
                 self.model = whisper.load_model("base")
             except Exception as e:
@@ -31,6 +55,7 @@ class TranscriptionService:
     def extract_audio_from_video(self, video_path):
         """Extract audio from video file"""
         try:
+            from moviepy.editor import VideoFileClip
             video = VideoFileClip(video_path)
             # Create temporary audio file
             temp_audio = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
@@ -45,23 +70,259 @@ class TranscriptionService:
         except Exception as e:
             raise Exception(f"Error extracting audio: {e}")
 
+    def create_audio_derivative(self, video_path):
+        """Encode a small 16 kHz mono audio file (Opus or FLAC) from a video
+        
+        Reprocessing jobs read this instead of demuxing the full video again.
+        Returns the path of the temporary audio file; the caller removes it.
+        """
+        fmt = config.AUDIO_DERIVATIVE_FORMAT.lower()
+        if fmt not in AUDIO_DERIVATIVE_CODECS:
+            raise Exception(f"Unsupported AUDIO_DERIVATIVE_FORMAT '{fmt}'. Use 'opus' or 'flac'.")
+        codec_args, suffix = AUDIO_DERIVATIVE_CODECS[fmt]
+
+        temp_audio = tempfile.NamedTemporaryFile(suffix=suffix, delete=False)
+        audio_path = temp_audio.name
+        temp_audio.close()
+
+        with span("ffmpeg.extract_audio", format=fmt):
+            result = subprocess.run(
+                ["ffmpeg", "-loglevel", "error", "-y", "-i", video_path,
+                 "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), *codec_args, audio_path],
+                capture_output=True
+            )
+        if result.returncode != 0:
+            os.unlink(audio_path)
+            raise Exception(f"Error creating audio derivative: {result.stderr.decode(errors='replace').strip()}")
+        return audio_path
+
+    def _ffmpeg_audio_command(self, source):
+        return [
+            "ffmpeg", "-loglevel", "error",
+            "-i", source,
+            "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE),
+            "-f", "s16le", "pipe:1"
+        ]
+
+    def _pcm_to_float(self, pcm):
+        return np.frombuffer(pcm, np.int16).astype(np.float32) / 32768.0
+
+    def decode_audio_stream(self, chunks, output=None):
+        """Decode audio from an iterable of container bytes into 16 kHz mono float32 samples
+        
+        The container bytes are piped straight into ffmpeg, so only the decoded
+        audio is ever held in memory and nothing is written to disk. If output
+        (a binary file) is given, the raw s16le PCM is spilled there in blocks
+        instead and None is returned.
+        """
+        proc = subprocess.Popen(
+            self._ffmpeg_audio_command("pipe:0"),
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE
+        )
+        stderr = []
+
+        def _feed():
+            try:
+                for chunk in chunks:
+                    proc.stdin.write(chunk)
+            except (BrokenPipeError, OSError):
+                # ffmpeg exited early; its return code reports why
+                pass
+            finally:
+                if hasattr(chunks, "close"):
+                    chunks.close()
+                try:
+                    proc.stdin.close()
+                except OSError:
+                    pass
+
+        feeder = threading.Thread(target=_feed, daemon=True)
+        errors = threading.Thread(target=lambda: stderr.append(proc.stderr.read()), daemon=True)
+        feeder.start()
+        errors.start()
+        if output is None:
+            pcm = proc.stdout.read()
+        else:
+            for block in iter(lambda: proc.stdout.read(PCM_BLOCK_SIZE), b''):
+                output.write(block)
+        proc.wait()
+        feeder.join()
+        errors.join()
+
+        if proc.returncode != 0:
+            message = b"".join(stderr).decode(errors="replace").strip()
+            raise Exception(f"ffmpeg could not decode audio stream: {message}")
+        return None if output is not None else self._pcm_to_float(pcm)
+
+    def decode_audio_url(self, url):
+        """Decode audio from a URL; ffmpeg issues its own HTTP range requests"""
+        result = subprocess.run(self._ffmpeg_audio_command(url), capture_output=True)
+        if result.returncode != 0:
+            raise Exception(f"ffmpeg could not decode audio from URL: {result.stderr.decode(errors='replace').strip()}")
+        return self._pcm_to_float(result.stdout)
+
+    def decode_audio_to_file(self, source):
+        """Decode a file or URL to a temporary raw s16le PCM file; the caller removes it"""
+        pcm_file = tempfile.NamedTemporaryFile(suffix=".pcm", delete=False)
+        with pcm_file:
+            result = subprocess.run(self._ffmpeg_audio_command(source), stdout=pcm_file, stderr=subprocess.PIPE)
+        if result.returncode != 0:
+            os.unlink(pcm_file.name)
+            raise Exception(f"ffmpeg could not decode audio: {result.stderr.decode(errors='replace').strip()}")
+        return pcm_file.name
+
+    def _transcribe_samples(self, samples, prompt=None):
+        """Run Whisper on float32 samples and return its raw result"""
+        model = self._load_model()
+        with span("whisper.transcribe", media_seconds=len(samples) / SAMPLE_RATE):
+            return model.transcribe(samples, word_timestamps=True, initial_prompt=prompt)
+
+    def _quietest_cut(self, samples):
+        """Sample index of the quietest frame near the end of a window, to cut it there"""
+        frame = int(SILENCE_FRAME_SECONDS * SAMPLE_RATE)
+        search = min(int(SILENCE_SEARCH_SECONDS * SAMPLE_RATE), samples.size // 2) // frame * frame
+        if search == 0:
+            return samples.size
+        start = samples.size - search
+        tail = samples[start:].astype(np.float32).reshape(-1, frame)
+        return start + int(np.argmin((tail ** 2).mean(axis=1))) * frame + frame // 2
+
+    def _shift_segment(self, segment, offset):
+        """A Whisper segment with its own and its words' timestamps moved by offset seconds"""
+        shifted = {**segment, 'start': segment['start'] + offset, 'end': segment['end'] + offset}
+        if segment.get('words'):
+            shifted['words'] = [
+                {**word, 'start': word['start'] + offset, 'end': word['end'] + offset}
+                for word in segment['words']
+            ]
+        return shifted
+
+    def _after(self, segment, committed):
+        """The part of a segment from committed seconds on, or None if nothing is left
+        
+        With word timestamps, words starting before committed are dropped and
+        the segment is rebuilt from the rest; without them, the segment is
+        kept whole if most of it lies after committed.
+        """
+        words = segment.get('words')
+        if not words:
+            return segment if (segment['start'] + segment['end']) / 2 >= committed else None
+        kept = [word for word in words if word['start'] >= committed]
+        if len(kept) == len(words):
+            return segment
+        if not kept:
+            return None
+        return {**segment, 'start': kept[0]['start'], 'text': "".join(word['word'] for word in kept), 'words': kept}
+
+    def transcribe_pcm_file(self, pcm_path):
+        """Transcribe spilled s16le PCM in windows of up to WHISPER_CHUNK_SECONDS
+        
+        Only one window of samples (and its mel spectrogram) is in memory at a
+        time. Each window ends at its quietest moment near the limit, so cuts
+        fall between words, and the next window starts
+        WHISPER_CHUNK_OVERLAP_SECONDS earlier so speech at the cut is heard
+        whole. Words the overlap repeats (those starting before the last kept
+        word ends) are dropped, and the end of the previous window's text is
+        passed on as Whisper's prompt. Segment and word timestamps are shifted
+        back to the full recording.
+        """
+        window = int(config.WHISPER_CHUNK_SECONDS * SAMPLE_RATE)
+        # Kept well below the window so every window moves forward
+        overlap = min(int(config.WHISPER_CHUNK_OVERLAP_SECONDS * SAMPLE_RATE), window // 4)
+        segments = []
+        buffered = np.empty(0, dtype=np.int16)
+        buffered_start = 0  # Sample position of buffered[0] in the recording
+        committed = 0.0  # End of the last word kept
+        prompt = None
+        with open(pcm_path, 'rb') as f:
+            while True:
+                read = np.fromfile(f, dtype=np.int16, count=window - buffered.size)
+                finished = buffered.size + read.size < window
+                buffered = np.concatenate([buffered, read])
+                if buffered.size == 0:
+                    break
+                cut = buffered.size if finished else self._quietest_cut(buffered)
+                offset = buffered_start / SAMPLE_RATE
+                result = self._transcribe_samples(buffered[:cut].astype(np.float32) / 32768.0, prompt)
+                for segment in result['segments']:
+                    # Drops what the previous window already transcribed
+                    segment = self._after(self._shift_segment(segment, offset), committed)
+                    if segment is None:
+                        continue
+                    segments.append(segment)
+                    committed = max(committed, segment['words'][-1]['end'] if segment.get('words') else segment['end'])
+                if finished:
+                    break
+                prompt = " ".join(segment['text'].strip() for segment in segments[-5:])[-CHUNK_PROMPT_CHARS:] or None
+                next_start = cut - overlap
+                buffered_start += next_start
+                buffered = buffered[next_start:]
+        return {'segments': segments}
+
+    def transcribe_audio(self, audio):
+        """Transcribe an audio file path or 16 kHz mono float32 array with timestamps"""
+        if isinstance(audio, np.ndarray):
+            return self.format_transcript(self._transcribe_samples(audio))
+        if not config.WHISPER_CHUNK_SECONDS:
+            model = self._load_model()
+            with span("whisper.transcribe") as record:
+                result = model.transcribe(audio, word_timestamps=True)
+                if result['segments']:
+                    # Whisper doesn't report the input length; the last segment end is close
+                    record["media_seconds"] = result['segments'][-1]['end']
+            return self.format_transcript(result)
+
+        # Bounded memory: spill the decoded audio to disk and transcribe it window by window
+        pcm_path = self.decode_audio_to_file(audio)
+        try:
+            return self.format_transcript(self.transcribe_pcm_file(pcm_path))
+        finally:
+            os.unlink(pcm_path)
+
+    def transcribe_from_s3(self, s3, key):
+        """Transcribe a stored object without downloading it to disk"""
+        try:
+            if config.WHISPER_CHUNK_SECONDS:
+                return self._transcribe_from_s3_spilled(s3, key)
+            try:
+                with span("ffmpeg.decode_stream"):
+                    audio = self.decode_audio_stream(s3.iter_object_ranges(key))
+            except Exception as e:
+                # Containers with their index at the end (non-faststart MP4/MOV) cannot be
+                # demuxed from a pipe; let ffmpeg seek over HTTP range requests instead
+                print(f"⚠️  Streaming decode failed for {key}, retrying via presigned URL: {e}")
+                audio = self.decode_audio_url(s3.get_presigned_url(key))
+            return self.transcribe_audio(audio)
+        except Exception as e:
+            raise Exception(f"Error transcribing {key} from S3: {e}")
+
+    def _transcribe_from_s3_spilled(self, s3, key):
+        """Like transcribe_from_s3, but decoded audio goes to a PCM file rather than memory"""
+        pcm_file = tempfile.NamedTemporaryFile(suffix=".pcm", delete=False)
+        pcm_path = pcm_file.name
+        try:
+            try:
+                with pcm_file, span("ffmpeg.decode_stream"):
+                    self.decode_audio_stream(s3.iter_object_ranges(key), output=pcm_file)
+            except Exception as e:
+                print(f"⚠️  Streaming decode failed for {key}, retrying via presigned URL: {e}")
+                os.unlink(pcm_path)
+                pcm_path = self.decode_audio_to_file(s3.get_presigned_url(key))
+            return self.format_transcript(self.transcribe_pcm_file(pcm_path))
+        finally:
+            if os.path.exists(pcm_path):
+                os.unlink(pcm_path)
+
     def transcribe_video(self, video_path):
         """Transcribe video with timestamps"""
         try:
-            # Load model when needed
-            model = self._load_model()
-            
             # Extract audio first
             audio_path = self.extract_audio_from_video(video_path)
             
             try:
-                # Transcribe with timestamps
-                result = model.transcribe(audio_path, word_timestamps=True)
-                
-                # Format transcript
-                formatted_transcript = self.format_transcript(result)
-                
-                return formatted_transcript
+                return self.transcribe_audio(audio_path)
                 
             finally:
                 # Clean up temporary audio file
@@ -98,9 +359,20 @@ class TranscriptionService:
     def get_video_duration(self, video_path):
         """Get video duration in seconds"""
         try:
-            video = VideoFileClip(video_path)
-            duration = video.duration
-            video.close()
+            # ffprobe reads only the container header; MoviePy opens a decoder too
+            with span("ffprobe.duration"):
+                result = subprocess.run(
+                    ["ffprobe", "-v", "error", "-show_entries", "format=duration",
+                     "-of", "default=noprint_wrappers=1:nokey=1", video_path],
+                    capture_output=True
+                )
+            if result.returncode == 0 and result.stdout.strip() not in (b"", b"N/A"):
+                return float(result.stdout)
+            with span("moviepy.duration"):
+                from moviepy.editor import VideoFileClip
+                video = VideoFileClip(video_path)
+                duration = video.duration
+                video.close()
             return duration
         except Exception as e:
             raise Exception(f"Error getting video duration: {e}") 
\ No newline at end of file
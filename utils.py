@@ -2,21 +2,26 @@
 Utility functions and fixes for the Video Transcriber application
 """
 
+import sys
+
 def fix_pytorch_streamlit_compatibility():
     """
     Fix for PyTorch/Streamlit compatibility issue.
     This prevents the 'torch.classes.__path__' error that occurs
     when Streamlit tries to watch PyTorch files.
+
+    Only needed once torch is loaded, so it never imports torch itself;
+    TranscriptionService applies it right after loading Whisper.
     """
+    torch = sys.modules.get("torch")
+    if torch is None:
+        return
     try:
-        import torch
         if hasattr(torch.classes, '__path__'):
             torch.classes.__path__ = []
         print("✅ PyTorch/Streamlit compatibility fix applied")
-    except ImportError:
-        print("ℹ️  PyTorch not installed, skipping compatibility fix")
     except Exception as e:
         print(f"⚠️  PyTorch compatibility fix failed: {e}")
 
-# Apply the fix when this module is imported
-fix_pytorch_streamlit_compatibility() 
\ No newline at end of file
+# Apply the fix when this module is imported, in case torch is already loaded
+fix_pytorch_streamlit_compatibility()
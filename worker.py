@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Background worker processes for video ingestion
+
+Usage:
+    python worker.py [--processes N]
+
+Each process claims jobs from the durable job queue, runs the ingestion
+pipeline, heartbeats while it works and reports stage progress back to the
+queue, where the videos list page picks it up.
+"""
+
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+
+import config
+from job_queue import create_job_queue
+from memory import MB, MemoryBudget, RssSampler
+from pipeline import IngestionPipeline
+
+
+def build_services():
+    """Construct the services a worker needs (one set per process)"""
+    from database import create_database
+    from s3_storage import S3Storage
+    from transcription import TranscriptionService
+    from transcode import TranscodeService
+    from ai_services import AIServices
+
+    return {
+        'db': create_database(),
+        's3': S3Storage(),
+        'transcription': TranscriptionService(),
+        'transcode': TranscodeService(),
+        'ai': AIServices()
+    }
+
+
+class _Heartbeat:
+    """Keeps a claimed job's lease alive and forwards pipeline progress to the queue"""
+
+    # Minimum seconds between progress-only writes (new stages are sent at once)
+    PROGRESS_INTERVAL = 2.0
+
+    def __init__(self, queue, job_id, worker_id):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self._stage = None
+        self._last_write = 0.0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(config.JOB_HEARTBEAT_SECONDS):
+            self.queue.heartbeat(self.job_id, self.worker_id)
+
+    def update(self, stage, progress):
+        now = time.monotonic()
+        if (stage == self._stage or progress is None) and now - self._last_write < self.PROGRESS_INTERVAL:
+            return
+        self._stage = stage
+        self._last_write = now
+        self.queue.heartbeat(self.job_id, self.worker_id, stage=stage, progress=progress)
+
+
+def process_job(queue, pipeline, job, worker_id):
+    """Run one claimed ingestion or resume job and record the outcome"""
+    job_id = job['_id']
+    payload = job['payload']
+
+    if job['attempts'] > job['max_attempts']:
+        # Reclaimed after its worker died too many times
+        queue.fail(job_id, "Worker stopped responding while processing this job")
+        _remove_spool_file(payload)
+        return
+
+    print(f"🎬 [{worker_id}] Processing '{payload['title']}' (attempt {job['attempts']})")
+    try:
+        checkpoint = lambda key, value: queue.save_state(job_id, key, value)
+        with _Heartbeat(queue, job_id, worker_id) as heartbeat, RssSampler() as rss:
+            if job['kind'] == 'resume':
+                # State is rebuilt from the stored video, so retries need nothing from the job
+                pipeline.resume(payload['video_id'], checkpoint=checkpoint, progress=heartbeat.update)
+            else:
+                pipeline.run(
+                    payload['title'],
+                    payload['spool_path'],
+                    payload['original_name'],
+                    digest=payload.get('digest'),
+                    state=job.get('state'),
+                    checkpoint=checkpoint,
+                    progress=heartbeat.update
+                )
+        queue.save_state(job_id, 'peak_rss_mb', round(rss.peak_bytes / MB, 1))
+        queue.complete(job_id)
+        _remove_spool_file(payload)
+        print(f"✅ [{worker_id}] Finished '{payload['title']}' "
+              f"(peak RSS {rss.peak_bytes / MB:.0f} MB, +{(rss.peak_bytes - rss.start_bytes) / MB:.0f} MB)")
+    except Exception as e:
+        retrying = queue.fail(job_id, e)
+        print(f"❌ [{worker_id}] '{payload['title']}' failed: {e}" + (" (will retry)" if retrying else ""))
+        if not retrying:
+            _remove_spool_file(payload)
+
+
+def _remove_spool_file(payload):
+    path = payload.get('spool_path')
+    if path and os.path.exists(path):
+        os.unlink(path)
+
+
+def run_worker():
+    """Claim and process jobs until interrupted"""
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    services = build_services()
+    queue = create_job_queue(services['db'])
+    pipeline = IngestionPipeline(services)
+    budget = MemoryBudget()
+    print(f"👷 Worker {worker_id} started"
+          + (f" (memory budget {budget.budget_bytes // MB} MB, {budget.job_bytes // MB} MB per job)"
+             if budget.enabled else ""))
+
+    try:
+        waiting_for_memory = False
+        while True:
+            # Admit a job only while its memory reservation fits in the host-wide budget
+            reservation = budget.reserve(worker_id)
+            if reservation is None:
+                if not waiting_for_memory:
+                    print(f"⏳ [{worker_id}] Waiting for memory budget before claiming more work")
+                    waiting_for_memory = True
+                time.sleep(config.JOB_POLL_SECONDS)
+                continue
+            waiting_for_memory = False
+            try:
+                job = queue.claim(worker_id)
+                if job is None:
+                    time.sleep(config.JOB_POLL_SECONDS)
+                    continue
+                process_job(queue, pipeline, job, worker_id)
+            finally:
+                budget.release(reservation)
+    except KeyboardInterrupt:
+        print(f"👋 Worker {worker_id} stopping")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run video ingestion workers")
+    parser.add_argument("--processes", type=int, default=1, help="Number of worker processes")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker()
+        return
+
+    processes = [multiprocessing.Process(target=run_worker) for _ in range(args.processes)]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+
+
+if __name__ == "__main__":
+    main()